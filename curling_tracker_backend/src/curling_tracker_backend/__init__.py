@@ -1,9 +1,35 @@
 import os
 import logging.config
+import threading
+from typing import Callable
 from flask import Flask
 import yaml
 
 
+def before_first_request(app: Flask, func: Callable[[], None]):
+    """Run a function once, before the first request the app handles.
+
+    Startup work that only belongs in the process serving requests goes here rather than in create_app, which also
+    runs for every flask command and in the reloader's file watching process.
+
+    Args:
+        app (Flask): The flask app.
+        func (Callable[[], None]): The function to run, with the app context of the first request.
+    """
+    lock = threading.Lock()
+    done = False
+
+    @app.before_request
+    def run_before_first_request():
+        nonlocal done
+        if done:
+            return
+        with lock:
+            if not done:
+                done = True
+                func()
+
+
 def create_app():
     # create and configure the app
     app = Flask(__name__, instance_relative_config=True)
@@ -19,6 +45,12 @@ def create_app():
         UPLOAD_FOLDER=os.path.join(app.instance_path, "uploads"),
         YOUTUBE_DOWNLOADS_FOLDER=os.path.join(app.instance_path,
                                               "youtube_downloads"),
+        MODEL_FOLDER=os.path.join(app.root_path, "model"),
+        TRACKING_RESULTS_FOLDER=os.path.join(app.instance_path,
+                                             "tracking_results"),
+        IMAGE_STORE_FOLDER=os.path.join(app.instance_path, "images"),
+        DETECTION_CACHE_FOLDER=os.path.join(app.instance_path,
+                                            "detection_cache"),
         DATASETS_DATABASE="/datasets/datasets_database.db")
 
     app.config.from_pyfile(os.path.join(app.root_path, "config.py"))
@@ -38,15 +70,23 @@ def create_app():
 
     db.init_app(app)
 
+    ###
+    # Setup the video tracking jobs
+    ###
+    from . import tracking_jobs
+
+    tracking_jobs.init_app(app)
+
     ###
     # Setup the commands
     ###
-    from .commands import init_db_command, clear_db_command, clear_videos_command, rebuild_datasets_command
+    from .commands import init_db_command, clear_db_command, clear_videos_command, rebuild_datasets_command, export_detectors_command
 
     app.cli.add_command(clear_db_command)
     app.cli.add_command(init_db_command)
     app.cli.add_command(clear_videos_command)
     app.cli.add_command(rebuild_datasets_command)
+    app.cli.add_command(export_detectors_command)
 
     ###
     # Setup blueprints
@@ -57,6 +97,25 @@ def create_app():
     app.register_blueprint(api.bp)
     app.register_blueprint(calibration_api.bp)
 
+    ###
+    # Load the stone detectors
+    ###
+    if app.config["DETECTOR_WARMUP_ON_STARTUP"]:
+        from .util.detector_registry import registry
+
+        def warm_up_stone_detectors():
+            try:
+                registry.get_configured_stone_detectors(app.config)
+            except FileNotFoundError as e:
+                logger.warning(f"Could not load stone detectors at startup: {e}")
+
+        # On a background thread so the first request does not wait for it, requests that need a detector wait
+        # for the registry instead
+        before_first_request(
+            app, lambda: threading.Thread(target=warm_up_stone_detectors,
+                                          name="detector-warm-up",
+                                          daemon=True).start())
+
     ###
     # Output flask app endpoint info
     ###
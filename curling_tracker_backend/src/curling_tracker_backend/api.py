@@ -7,6 +7,10 @@ from flask import (
     flash,
     app,
     url_for,
+    send_file,
+    send_from_directory,
+    Response,
+    stream_with_context,
 )
 
 import uuid
@@ -17,9 +21,11 @@ import numpy as np
 import logging
 import hashlib
 import curling_tracker_backend.db_helper as db_helper
-import curling_tracker_backend.util.async_yt_dlp as async_yt_dlp
+import curling_tracker_backend.tracking_jobs as tracking_jobs
 from curling_tracker_backend.db import query_db
 import curling_tracker_backend.util.curling_shot_tracker as shot_tracker
+from curling_tracker_backend.util.detector_registry import registry
+from curling_tracker_backend.util.image_store import IMAGE_NAME_PATTERN
 from curling_tracker_backend.util.sheet_coordinates import SHEET_COORDINATES
 
 logger = logging.getLogger(__name__)
@@ -45,7 +51,7 @@ def video_tracking_headers():
 
 
 @bp.route("/request_video_tracking", methods=["POST"])
-async def request_video_tracking():
+def request_video_tracking():
     url = request.json.get("url", None)
     start_seconds = request.json.get("start_seconds", None)
     duration = request.json.get("duration", None)
@@ -62,46 +68,186 @@ async def request_video_tracking():
             "url, start_seconds, duration, and setup_id is required"
         }), 400
 
-    db_video = query_db(
-        "SELECT filename FROM Videos WHERE url = ? AND start_seconds = ? AND duration = ?",
-        [url, start_seconds, duration],
+    setup = query_db("SELECT setup_id FROM CameraSetups WHERE setup_id = ?",
+                     [setup_id],
+                     one=True)
+    if setup is None:
+        return jsonify({"error": "Camera Setup not found"}), 404
+
+    job_queue = tracking_jobs.get_job_queue()
+    tracking_id = str(uuid.uuid4())
+    query_db(
+        "INSERT INTO VideoTracking (tracking_id, link, start_seconds, duration, setup_id, status, percent_complete, worker_id, worker_pid, worker_started) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            tracking_id, url, start_seconds, duration, setup_id,
+            tracking_jobs.TrackingStatus.QUEUED, 0, job_queue.worker_id,
+            job_queue.worker_pid, job_queue.worker_started
+        ])
+
+    try:
+        job_queue.submit(tracking_id, url, start_seconds, duration, setup_id)
+    except tracking_jobs.TrackingQueueFull:
+        query_db("DELETE FROM VideoTracking WHERE tracking_id = ?",
+                 [tracking_id])
+        return jsonify({"error":
+                        "Too many video tracking requests queued"}), 503
+
+    logger.info(f"Queued video tracking job: {tracking_id=}")
+
+    return jsonify({"tracking_id": tracking_id}), 202
+
+
+@bp.route("/video_tracking_status", methods=["GET"])
+def video_tracking_status():
+    tracking_id = request.args.get("tracking_id", None)
+    if tracking_id is None:
+        return jsonify({"error": "tracking_id is required"}), 400
+
+    tracking = query_db(
+        "SELECT status, percent_complete, error FROM VideoTracking WHERE tracking_id = ?",
+        [tracking_id],
         one=True)
+    if tracking is None:
+        return jsonify({"error": "tracking_id not found"}), 404
+
+    return jsonify({
+        "tracking_id": tracking_id,
+        "status": tracking[0],
+        "percent_complete": tracking[1],
+        "error": tracking[2],
+    })
+
+
+@bp.route("/video_tracking_results", methods=["GET"])
+def video_tracking_results():
+    tracking_id = request.args.get("tracking_id", None)
+    if tracking_id is None:
+        return jsonify({"error": "tracking_id is required"}), 400
+
+    tracking = query_db(
+        "SELECT status FROM VideoTracking WHERE tracking_id = ?",
+        [tracking_id],
+        one=True)
+    if tracking is None:
+        return jsonify({"error": "tracking_id not found"}), 404
+    if tracking[0] != tracking_jobs.TrackingStatus.COMPLETE:
+        return jsonify({
+            "error": "Video tracking is not complete",
+            "status": tracking[0]
+        }), 409
+
+    # JSON unless the client asks for the binary columnar .npz layout
+    mimetype = request.accept_mimetypes.best_match(list(
+        tracking_jobs.RESULTS_FILE_EXTENSIONS),
+                                                   default="application/json")
+    results_path = tracking_jobs.tracking_results_path(tracking_id, mimetype)
+    if not os.path.exists(results_path):
+        return jsonify({
+            "error":
+            f"Video tracking results are not available as {mimetype}"
+        }), 404
 
-    if db_video is not None:
-        output_file = os.path.join(
-            current_app.config["YOUTUBE_DOWNLOADS_FOLDER"], db_video[0])
-        logger.info(f"Using cached video {db_video[0]} for tracking.")
-    else:
-        logger.info(f"Downloading video for tracking.")
-        if not os.path.exists(current_app.config["YOUTUBE_DOWNLOADS_FOLDER"]):
-            os.makedirs(current_app.config["YOUTUBE_DOWNLOADS_FOLDER"])
-
-        video_id = str(uuid.uuid4())
-        output_file = os.path.join(
-            current_app.config["YOUTUBE_DOWNLOADS_FOLDER"], video_id + ".mp4")
-        await async_yt_dlp.download_video(url,
-                                          output_file,
-                                          start_time=start_seconds,
-                                          end_time=start_seconds + duration)
-        query_db(
-            "INSERT INTO Videos (video_id, url, start_seconds, duration, filename) VALUES (?, ?, ?, ?, ?)",
-            [video_id, url, start_seconds, duration, video_id + ".mp4"])
+    return send_file(results_path, mimetype=mimetype)
 
-        logger.info(f"Inserted video record into database: {video_id=}")
 
-    camera_setup = db_helper.get_setup_from_db(setup_id)
+@bp.route("/images/<name>", methods=["GET"])
+def images(name):
+    if IMAGE_NAME_PATTERN.match(name) is None:
+        return jsonify({"error": "Invalid image name"}), 404
+
+    # Images are named by the hash of their contents so they never change and can be cached indefinitely
+    response = send_from_directory(current_app.config["IMAGE_STORE_FOLDER"],
+                                   os.path.join(name[0:2], name),
+                                   max_age=31536000)
+    response.cache_control.immutable = True
+    return response
 
-    stone_detectors = shot_tracker.get_stone_detectors(
-        os.path.join(current_app.root_path, "model/"))
-    video = shot_tracker.CurlingVideo(output_file)
 
-    logger.info(f"Starting video stone tracking...")
-    tracking_results = shot_tracker.video_stone_tracker(
-        camera_setup, video, stone_detectors, image_save_interval=1.0)
+@bp.route("/stream_video_tracking", methods=["POST"])
+def stream_video_tracking():
+    url = request.json.get("url", None)
+    start_seconds = request.json.get("start_seconds", None)
+    duration = request.json.get("duration", None)
+    setup_id = request.json.get("setup_id", None)
+
+    logger.info(
+        f"Processing stream video tracking request: {url=} {start_seconds=} {duration=} {setup_id=}"
+    )
 
-    logger.info(f"Finished video stone tracking.")
+    if url is None or start_seconds is None or duration is None or setup_id is None:
+        return jsonify({
+            "error":
+            "url, start_seconds, duration, and setup_id is required"
+        }), 400
 
-    return jsonify(tracking_results.dict_for_json())
+    setup = query_db("SELECT setup_id FROM CameraSetups WHERE setup_id = ?",
+                     [setup_id],
+                     one=True)
+    if setup is None:
+        return jsonify({"error": "Camera Setup not found"}), 404
+
+    # The tracking runs on this request's thread, but counts towards the same limit as the queued tracking jobs
+    job_queue = tracking_jobs.get_job_queue()
+    try:
+        job_queue.reserve_slot()
+    except tracking_jobs.TrackingQueueFull:
+        return jsonify({"error":
+                        "Too many video tracking requests queued"}), 503
+
+    # Server-Sent Events when the client asks for them, newline delimited JSON otherwise
+    use_sse = request.accept_mimetypes.best_match(
+        ["application/x-ndjson", "text/event-stream"]) == "text/event-stream"
+
+    def format_event(event: str, data: dict) -> str:
+        if use_sse:
+            return f"event: {event}\ndata: {current_app.json.dumps(data)}\n\n"
+        return current_app.json.dumps({"event": event, "data": data}) + "\n"
+
+    def generate():
+        try:
+            camera_setup = db_helper.get_setup_from_db(setup_id)
+            stone_detectors = registry.get_configured_stone_detectors(
+                current_app.config)
+            options = tracking_jobs.video_tracking_options()
+
+            with tracking_jobs.open_video(url, start_seconds,
+                                          duration) as video:
+                stream = shot_tracker.video_stone_tracker_stream(
+                    camera_setup,
+                    video,
+                    stone_detectors,
+                    detection_cache=tracking_jobs.raw_detection_cache(video),
+                    **options)
+                while True:
+                    try:
+                        update = next(stream)
+                    except StopIteration as stop:
+                        state = stop.value
+                        break
+                    yield format_event("update", update.dict_for_json())
+
+            motion_gate = options["motion_gate"]
+            adaptive_sampler = options["adaptive_sampler"]
+            yield format_event(
+                "complete", {
+                    "state":
+                    state.dict_for_json(),
+                    "motion_gate": (motion_gate.dict_for_json()
+                                    if motion_gate is not None else None),
+                    "adaptive_sampling":
+                    (adaptive_sampler.dict_for_json()
+                     if adaptive_sampler is not None else None),
+                })
+        except Exception as e:
+            logger.exception("Stream video tracking failed")
+            yield format_event("error", {"error": str(e)})
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream" if use_sse else "application/x-ndjson")
+    # Called by the server once the stream has finished or the client has disconnected
+    response.call_on_close(job_queue.release_slot)
+    return response
 
 
 @bp.route("/detect_stones", methods=["POST"])
@@ -131,12 +277,11 @@ def detect_stones():
 
     image = cv.imread(full_path)
 
-    stone_detector = shot_tracker.StoneDetector(
-        os.path.join(current_app.root_path,
-                     "model/top_down_stone_detector.pt"))
+    stone_detectors = registry.get_configured_stone_detectors(
+        current_app.config)
 
     all_detections = shot_tracker.mosaic_image_detect_stones(
-        camera_setup, image, stone_detector)
+        camera_setup, image, stone_detectors)
 
     stones = []
     for _, detections in all_detections.detections.items():
@@ -8,7 +8,7 @@ import uuid
 import numpy as np
 import logging
 import curling_tracker_backend.db_helper as db_helper
-from curling_tracker_backend.db import query_db
+from curling_tracker_backend.db import query_db, transaction
 import curling_tracker_backend.util.camera_utilities as camera_utilities
 from curling_tracker_backend.util.sheet_coordinates import SHEET_COORDINATES
 
@@ -16,6 +16,32 @@ logger = logging.getLogger(__name__)
 bp = Blueprint("calibration_api", __name__, url_prefix="/api")
 
 
+def parse_inference_profile(data: dict) -> camera_utilities.InferenceProfile:
+    """Read a camera's inference profile from request json.
+
+    Args:
+        data (dict): The json with the optional imgsz, resize_width and confidence of the profile.
+
+    Raises:
+        ValueError: If a value of the profile is out of range.
+
+    Returns:
+        camera_utilities.InferenceProfile: The inference profile.
+    """
+    imgsz = data.get("imgsz", None)
+    resize_width = data.get("resize_width", None)
+    confidence = data.get("confidence", None)
+
+    for name, value in (("imgsz", imgsz), ("resize_width", resize_width)):
+        if value is not None and (not isinstance(value, int) or value <= 0):
+            raise ValueError(f"{name} must be a positive integer")
+    if confidence is not None and (not isinstance(confidence, (int, float))
+                                   or not 0 < confidence < 1):
+        raise ValueError("confidence must be between 0 and 1")
+
+    return camera_utilities.InferenceProfile(imgsz, resize_width, confidence)
+
+
 @bp.route("/camera_setup_headers", methods=["GET"])
 def camera_setup_headers():
     logger.info(f"Processing camera setup headers request.")
@@ -48,7 +74,7 @@ def camera_setup():
             return jsonify({"error": "Camera Setup not found"}), 404
 
         cameras = query_db(
-            "SELECT camera_id, camera_name, camera_type, corner1, corner2, camera_matrix, distortion_coefficients, rotation_vectors, translation_vectors FROM Cameras WHERE setup_id = ?",
+            "SELECT camera_id, camera_name, camera_type, corner1, corner2, camera_matrix, distortion_coefficients, rotation_vectors, translation_vectors, inference_imgsz, inference_resize_width, inference_confidence FROM Cameras WHERE setup_id = ?",
             [setup_id],
         )
         camera_list = []
@@ -72,6 +98,9 @@ def camera_setup():
                 (camera[7].tolist() if camera[7] is not None else None),
                 "translation_vectors":
                 (camera[8].tolist() if camera[8] is not None else None),
+                "inference_profile":
+                camera_utilities.InferenceProfile(camera[9], camera[10],
+                                                  camera[11]).dict_for_json(),
             })
         return jsonify({
             "setup_id": setup[0],
@@ -87,36 +116,85 @@ def camera_setup():
         logger.info(
             f"Processing camera_setup POST request: {setup_id=} {setup_name=}")
 
-        if setup_id is None:
-            setup_id = str(uuid.uuid4())
-            query_db(
-                "INSERT INTO CameraSetups (setup_id, setup_name) VALUES (?, ?)",
-                [setup_id, setup_name],
-            )
-        else:
-            query_db(
-                "UPDATE CameraSetups SET setup_name = ? WHERE setup_id = ?",
-                [setup_name, setup_id],
-            )
-
-        # Replace existing cameras for this setup
-        query_db("DELETE FROM Cameras WHERE setup_id = ?", [setup_id])
+        inference_profiles = []
         for camera in data.get("cameras", []):
-            camera_id = str(uuid.uuid4())
-            camera_name = camera.get("camera_name", "Unnamed Camera")
-            corner1 = np.array(camera.get("corner1", [0, 0]))
-            corner2 = np.array(camera.get("corner2", [0, 0]))
-            camera_type = camera.get("camera_type", "unknown")
-            query_db(
-                "INSERT INTO Cameras (camera_id, setup_id, camera_name, camera_type, corner1, corner2) VALUES (?, ?, ?, ?, ?, ?)",
-                [
-                    camera_id, setup_id, camera_name, camera_type, corner1,
-                    corner2
-                ],
-            )
+            try:
+                inference_profiles.append(
+                    parse_inference_profile(
+                        camera.get("inference_profile", None) or {}))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+        # The setup and its cameras are replaced together, a failure part way leaves the old setup
+        with transaction():
+            if setup_id is None:
+                setup_id = str(uuid.uuid4())
+                query_db(
+                    "INSERT INTO CameraSetups (setup_id, setup_name) VALUES (?, ?)",
+                    [setup_id, setup_name],
+                )
+            else:
+                query_db(
+                    "UPDATE CameraSetups SET setup_name = ? WHERE setup_id = ?",
+                    [setup_name, setup_id],
+                )
+
+            # Replace existing cameras for this setup
+            query_db("DELETE FROM Cameras WHERE setup_id = ?", [setup_id])
+            for camera, inference_profile in zip(data.get("cameras", []),
+                                                 inference_profiles):
+                camera_id = str(uuid.uuid4())
+                camera_name = camera.get("camera_name", "Unnamed Camera")
+                corner1 = np.array(camera.get("corner1", [0, 0]))
+                corner2 = np.array(camera.get("corner2", [0, 0]))
+                camera_type = camera.get("camera_type", "unknown")
+                query_db(
+                    "INSERT INTO Cameras (camera_id, setup_id, camera_name, camera_type, corner1, corner2, inference_imgsz, inference_resize_width, inference_confidence) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        camera_id, setup_id, camera_name, camera_type, corner1,
+                        corner2, inference_profile.imgsz,
+                        inference_profile.resize_width,
+                        inference_profile.confidence
+                    ],
+                )
         return jsonify({"setup_id": setup_id})
 
 
+@bp.route("/camera_inference_profile", methods=["POST"])
+def camera_inference_profile():
+    camera_id = request.json.get("camera_id", None)
+
+    logger.info(
+        f"Processing camera_inference_profile POST request: {camera_id=}")
+
+    if camera_id is None:
+        return jsonify({"error": "camera_id is required"}), 400
+
+    try:
+        inference_profile = parse_inference_profile(request.json)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    db_camera = query_db("SELECT camera_id FROM Cameras WHERE camera_id = ?",
+                         [camera_id],
+                         one=True)
+    if db_camera is None:
+        return jsonify({"error": "camera_id not found"}), 400
+
+    query_db(
+        "UPDATE Cameras SET inference_imgsz = ?, inference_resize_width = ?, inference_confidence = ? WHERE camera_id = ?",
+        [
+            inference_profile.imgsz, inference_profile.resize_width,
+            inference_profile.confidence, camera_id
+        ],
+    )
+
+    return jsonify({
+        "camera_id": camera_id,
+        "inference_profile": inference_profile.dict_for_json()
+    })
+
+
 @bp.route("/camera_calibration", methods=["POST"])
 def camera_calibration():
     return_data = {}
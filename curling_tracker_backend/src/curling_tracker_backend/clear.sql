@@ -1,3 +1,5 @@
 DROP TABLE IF EXISTS Cameras;
 DROP TABLE IF EXISTS CameraSetups;
-DROP TABLE IF EXISTS Videos;
\ No newline at end of file
+DROP TABLE IF EXISTS Videos;
+DROP TABLE IF EXISTS VideoTracking;
+DROP TABLE IF EXISTS TrackingResultsCache;
\ No newline at end of file
@@ -56,3 +56,56 @@ def rebuild_datasets_command():
                     f"INSERT INTO {dataset['dataset_table']} (file_hash, file_path) VALUES (?, ?)",
                     (file_hash, file_path),
                     db_name="datasets")
+
+
+@click.command("export_detectors")
+@click.option("--backend",
+              type=click.Choice(["onnx", "openvino"]),
+              default="onnx",
+              help="The inference backend to export the stone detectors to.")
+@click.option(
+    "--parity-images",
+    type=click.Path(exists=True, file_okay=False),
+    default=None,
+    help=
+    "A folder of camera images to check the exported models against the PyTorch models on."
+)
+@click.option("--tolerance",
+              type=float,
+              default=2.0,
+              help="The largest allowed box difference in pixels.")
+def export_detectors_command(backend, parity_images, tolerance):
+    """A command to export the stone detectors to ONNX or OpenVINO and check they match the PyTorch models"""
+    import cv2 as cv
+    import curling_tracker_backend.util.curling_shot_tracker as shot_tracker
+    import curling_tracker_backend.util.detector_export as detector_export
+
+    backend = shot_tracker.DetectorBackend(backend)
+    model_dir = current_app.config["MODEL_FOLDER"]
+    exported_paths = detector_export.export_stone_detectors(model_dir, backend)
+
+    if parity_images is None:
+        return
+
+    images = []
+    for file_name in sorted(os.listdir(parity_images)):
+        image = cv.imread(os.path.join(parity_images, file_name))
+        if image is not None:
+            images.append(image)
+
+    failed = False
+    for camera_type, exported_path in exported_paths.items():
+        report = detector_export.compare_stone_detectors(
+            shot_tracker.StoneDetector(
+                shot_tracker.stone_detector_model_path(
+                    model_dir, camera_type,
+                    shot_tracker.DetectorBackend.PYTORCH)),
+            shot_tracker.StoneDetector(exported_path), images, tolerance)
+        logger.info(
+            f"{camera_type.value} {backend.value} parity: {report.num_mismatched_images}/{report.num_images} images mismatched, max box difference {report.max_box_difference:.2f}px"
+        )
+        failed = failed or not report.passed
+
+    if failed:
+        raise click.ClickException(
+            "Exported detectors do not match the PyTorch detectors.")
\ No newline at end of file
@@ -9,3 +9,78 @@ DATASETS = {
         "dataset_table": "CurlingStoneAngledDataset",
     }
 }
+
+# Seconds a database query waits for another connection's write lock before failing.
+DATABASE_TIMEOUT = 10.0
+
+# Number of decoded frames to queue ahead of the stone detector during video tracking. 0 disables prefetching.
+VIDEO_TRACKING_PREFETCH_DEPTH = 8
+
+# Number of consecutive frames whose camera images are run through the stone detectors together.
+VIDEO_TRACKING_FRAME_BATCH_SIZE = 4
+# Number of worker processes that each decode and detect the stones in one time shard of a tracked video. 0 detects
+# on the tracking thread. Each worker loads its own copy of the stone detector models.
+TRACKING_PROCESSES = 0
+# Maximum number of images in a single stone detector forward pass. None puts every image in one pass.
+DETECTOR_MAX_BATCH_SIZE = 16
+
+# Load and warm up the stone detector models in the background as soon as the server handles its first request, instead
+# of when a request first needs them. flask commands and the reloader's file watching process never load them.
+DETECTOR_WARMUP_ON_STARTUP = True
+
+# Inference backend for the stone detectors: "pytorch", "onnx", or "openvino". The exported models are created with
+# `flask export_detectors`.
+DETECTOR_BACKEND = "pytorch"
+# Backends overriding DETECTOR_BACKEND for specific camera types, e.g. {"angled": "openvino"}.
+DETECTOR_CAMERA_TYPE_BACKENDS = {}
+
+# Intersection over union above which two stone detections in a camera image count as overlapping. Overlapping
+# detections are left out of the tracking. 0 counts any two boxes that touch as overlapping.
+STONE_OVERLAP_IOU_THRESHOLD = 0.0
+
+# Number of video tracking jobs that run at once, and how many more can wait for a worker before requests are rejected.
+TRACKING_WORKERS = 1
+TRACKING_MAX_QUEUED_JOBS = 8
+# Number of videos downloaded at once. Tracking jobs for a clip that is already downloading wait for that download.
+DOWNLOAD_WORKERS = 2
+# Track clips that have not been downloaded before while they download, decoding the video stream straight from its
+# url with ffmpeg. Streamed clips are not saved, so their detections and tracking results are not cached.
+STREAMING_INGEST = False
+# Most disk space the downloaded clips can take up, the least recently used clips are deleted beyond it. None keeps
+# every clip.
+VIDEO_CACHE_MAX_BYTES = 20 * 1024**3
+
+# Encoding of the camera images saved during video tracking: "png", "jpeg", or "webp". Images are stored on disk and
+# served from /api/images. PNG keeps them lossless so they can be added to datasets.
+IMAGE_STORE_FORMAT = "png"
+# JPEG or WebP quality from 0 to 100.
+IMAGE_STORE_QUALITY = 90
+# Width of the JPEG thumbnails stored alongside each image. 0 stores no thumbnails.
+IMAGE_STORE_THUMBNAIL_WIDTH = 320
+# Number of threads encoding saved images.
+IMAGE_STORE_WORKERS = 2
+
+# Reuse the results of an earlier tracking job with the same video, camera calibration, detector models and tracker
+# parameters instead of tracking the video again.
+TRACKING_RESULTS_CACHE = True
+
+# Keep the raw stone detector boxes of every tracked frame, so re-tracking a video after recalibrating a camera only
+# redoes the conversion to sheet coordinates and the tracking.
+DETECTION_CACHE = True
+
+# Skip the stone detector for camera images that have not changed since the camera's last detected image, reusing
+# its detections. An image is unchanged when no pixel of a 64 pixel wide grayscale thumbnail has changed by more than
+# MOTION_GATE_THRESHOLD gray levels. Each camera is detected again after at most MOTION_GATE_REFRESH_INTERVAL skipped
+# images, 0 never forces a refresh. Off by default: a skipped image reuses boxes that can be up to
+# MOTION_GATE_REFRESH_INTERVAL images old, so the tracks are not exactly those of detecting every image.
+MOTION_GATE = False
+MOTION_GATE_THRESHOLD = 8.0
+MOTION_GATE_REFRESH_INTERVAL = 30
+
+# Only detect one frame every ADAPTIVE_SAMPLING_IDLE_INTERVAL seconds while no stone is moving, and track every frame
+# from just before any motion until ADAPTIVE_SAMPLING_HOLD_TIME seconds after it stops. The idle interval should not
+# be more than 1 second, the time a stone stays tracked without being detected. Off by default: the tracked histories
+# have fewer samples and different velocities than tracking every frame, see scripts/benchmark_adaptive_sampling.py.
+ADAPTIVE_SAMPLING = False
+ADAPTIVE_SAMPLING_IDLE_INTERVAL = 1.0
+ADAPTIVE_SAMPLING_HOLD_TIME = 2.0
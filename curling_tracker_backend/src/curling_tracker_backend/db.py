@@ -1,5 +1,6 @@
 import sqlite3
-from typing import Any, List, Union, Tuple
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Union, Tuple
 from flask import Flask, current_app, g
 import numpy as np
 import io
@@ -7,6 +8,21 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Columns added to the tables of the original schema, which databases created with it are missing. CREATE TABLE IF
+# NOT EXISTS does not add them. Tables added since then are created with every column by schemas.sql.
+_ADDED_COLUMNS = {
+    "Cameras": {
+        "inference_imgsz": "INTEGER",
+        "inference_resize_width": "INTEGER",
+        "inference_confidence": "REAL",
+    },
+    "Videos": {
+        "size": "INTEGER",
+        "last_accessed": "REAL",
+        "content_hash": "TEXT",
+    },
+}
+
 
 def adapt_matrix(arr: np.ndarray) -> sqlite3.Binary:
     """Converts a numpy array into binary for storing in a database
@@ -38,7 +54,7 @@ def convert_matrix(text: str):
 
 
 def get_db(db_name="primary") -> sqlite3.Connection:
-    """Connect to the database
+    """Open a new connection to the database, which the caller has to close
 
     Returns:
         sqlite3.Connection: The connection to the database
@@ -48,22 +64,51 @@ def get_db(db_name="primary") -> sqlite3.Connection:
         logger.debug(
             f"Connecting to database... {current_app.config['DATABASE']}")
         db = sqlite3.connect(current_app.config["DATABASE"],
-                             detect_types=sqlite3.PARSE_DECLTYPES)
+                             detect_types=sqlite3.PARSE_DECLTYPES,
+                             timeout=current_app.config["DATABASE_TIMEOUT"])
+        # Readers do not block the writer and the writer does not block readers. Only the primary database is
+        # written to while the app runs.
+        db.execute("PRAGMA journal_mode=WAL")
     elif db_name == "datasets":
         logger.debug(
             f"Connecting to database... {current_app.config['DATASETS_DATABASE']}"
         )
         db = sqlite3.connect(current_app.config["DATASETS_DATABASE"],
-                             detect_types=sqlite3.PARSE_DECLTYPES)
+                             detect_types=sqlite3.PARSE_DECLTYPES,
+                             timeout=current_app.config["DATABASE_TIMEOUT"])
     db.row_factory = sqlite3.Row
     return db
 
 
+def context_db(db_name="primary") -> sqlite3.Connection:
+    """Get the connection to the database for the current app context, connecting on first use.
+
+    The connection is closed when the app context ends, see close_context_dbs.
+
+    Returns:
+        sqlite3.Connection: The connection to the database
+    """
+    if "dbs" not in g:
+        g.dbs = {}
+    if db_name not in g.dbs:
+        g.dbs[db_name] = get_db(db_name)
+    return g.dbs[db_name]
+
+
+def close_context_dbs(e=None):
+    """Close the connections opened by context_db in the current app context."""
+    for db in g.pop("dbs", {}).values():
+        db.close()
+    g.pop("db_transactions", None)
+
+
 def query_db(query: str,
              args=(),
              one: bool = False,
              db_name="primary") -> Union[sqlite3.Row, List[sqlite3.Row]]:
-    """Query the database, commit to the database, and get the results back
+    """Query the database and get the results back
+
+    Changes are committed straight away, unless the query runs inside a transaction block.
 
     Args:   
         query (str): The query to use
@@ -73,17 +118,53 @@ def query_db(query: str,
     Returns:
         Union[sqlite3.Row, List[sqlite3.Row]]: The rows containing the results of the query
     """
-    conn = get_db(db_name)
-    cur = conn.execute(query, args)
-    conn.commit()
-    rv = cur.fetchall()
-    cur.close()
-
-    conn.close()
+    conn = context_db(db_name)
+    autocommit = db_name not in g.get("db_transactions", ())
+    try:
+        cur = conn.execute(query, args)
+        rv = cur.fetchall()
+        cur.close()
+    except sqlite3.Error:
+        # Do not leave a failed write open on the shared connection for the next query to commit
+        if autocommit and conn.in_transaction:
+            conn.rollback()
+        raise
+
+    # Only statements that change the database open a transaction, reads have nothing to commit
+    if autocommit and conn.in_transaction:
+        conn.commit()
 
     return (rv[0] if rv else None) if one else rv
 
 
+@contextmanager
+def transaction(db_name="primary") -> Iterator[sqlite3.Connection]:
+    """Run the queries in a block as a single transaction, committed when the block exits and rolled back if it
+    raises. A transaction block inside another joins the outer transaction.
+
+    Yields:
+        sqlite3.Connection: The connection the transaction runs on
+    """
+    conn = context_db(db_name)
+    if "db_transactions" not in g:
+        g.db_transactions = set()
+    if db_name in g.db_transactions:
+        yield conn
+        return
+
+    # Take the write lock up front so the transaction does not fail part way through on a busy database
+    conn.execute("BEGIN IMMEDIATE")
+    g.db_transactions.add(db_name)
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        g.db_transactions.discard(db_name)
+
+
 def init_db():
     """Initialize the database using the schemas.sql script"""
     db = get_db()
@@ -91,9 +172,32 @@ def init_db():
     with current_app.open_resource("schemas.sql") as f:
         db.executescript(f.read().decode("utf8"))
 
+    add_missing_columns(db)
     db.close()
 
 
+def add_missing_columns(db: sqlite3.Connection):
+    """Add the columns in _ADDED_COLUMNS to tables of a database created before they existed.
+
+    Args:
+        db (sqlite3.Connection): The connection to the database.
+    """
+    for table, columns in _ADDED_COLUMNS.items():
+        existing_columns = {
+            row["name"]
+            for row in db.execute(f"PRAGMA table_info({table})")
+        }
+        if not existing_columns:
+            # The table does not exist yet, init_db creates it with every column
+            continue
+        for column, column_type in columns.items():
+            if column not in existing_columns:
+                logger.info(f"Adding column {column} to table {table}")
+                db.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+    db.commit()
+
+
 def clear_db():
     """Clear the database using the clear.sql script and reinitalize with schemas.sql"""
     db = get_db()
@@ -115,3 +219,10 @@ def init_app(app: Flask):
     """
     sqlite3.register_adapter(np.ndarray, adapt_matrix)
     sqlite3.register_converter("matrix", convert_matrix)
+
+    app.teardown_appcontext(close_context_dbs)
+
+    with app.app_context():
+        db = get_db()
+        add_missing_columns(db)
+        db.close()
@@ -14,14 +14,45 @@ CREATE TABLE IF NOT EXISTS Cameras (
     distortion_coefficients MATRIX,
     rotation_vectors MATRIX,
     translation_vectors MATRIX,
+    inference_imgsz INTEGER,
+    inference_resize_width INTEGER,
+    inference_confidence REAL,
 
     FOREIGN KEY (setup_id) REFERENCES CameraSetups(setup_id)
 );
 
+CREATE TABLE IF NOT EXISTS VideoTracking (
+    tracking_id TEXT PRIMARY KEY,
+    link TEXT,
+    stream_date TEXT,
+    start_seconds INTEGER,
+    duration INTEGER,
+    setup_id TEXT,
+    status TEXT,
+    percent_complete REAL,
+    error TEXT,
+    worker_id TEXT,
+    worker_pid INTEGER,
+    worker_started INTEGER,
+
+    FOREIGN KEY (setup_id) REFERENCES CameraSetups(setup_id)
+);
+
+CREATE TABLE IF NOT EXISTS TrackingResultsCache (
+    cache_key TEXT PRIMARY KEY,
+    tracking_id TEXT,
+    video_hash TEXT,
+
+    FOREIGN KEY (tracking_id) REFERENCES VideoTracking(tracking_id)
+);
+
 CREATE TABLE IF NOT EXISTS Videos (
     video_id TEXT PRIMARY KEY,
     url TEXT,
     filename TEXT,
     start_seconds INTEGER,
-    duration INTEGER
+    duration INTEGER,
+    size INTEGER,
+    last_accessed REAL,
+    content_hash TEXT
 );
\ No newline at end of file
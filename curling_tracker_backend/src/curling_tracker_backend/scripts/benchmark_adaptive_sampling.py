@@ -0,0 +1,95 @@
+import argparse
+import time
+import numpy as np
+import curling_tracker_backend.util.camera_utilities as camera_utilities
+import curling_tracker_backend.util.curling_shot_tracker as shot_tracker
+from curling_tracker_backend.scripts.benchmark_sharded_tracking import full_frame_camera_setup
+
+
+def time_tracking(camera_setup, video, stone_detectors, args,
+                  adaptive_sampler):
+    start = time.perf_counter()
+    results = shot_tracker.video_stone_tracker(
+        camera_setup,
+        video,
+        stone_detectors,
+        args.image_save_interval,
+        adaptive_sampler=adaptive_sampler,
+        frame_batch_size=args.frame_batch_size,
+        max_batch_size=args.max_batch_size)
+    return results, time.perf_counter() - start
+
+
+def velocity_differences(dense_stone, adaptive_stone) -> np.ndarray:
+    """How far apart the velocities of two tracks of a stone are, at the times both have a sample for."""
+    _, dense_indexes, adaptive_indexes = np.intersect1d(
+        dense_stone.time_history,
+        adaptive_stone.time_history,
+        return_indices=True)
+    return np.linalg.norm(dense_stone.velocity_history[dense_indexes] -
+                          adaptive_stone.velocity_history[adaptive_indexes],
+                          axis=1)
+
+
+def main(args):
+    video = shot_tracker.CurlingVideo(args.video)
+    camera_type = camera_utilities.CameraType(args.camera_type)
+    camera_setup = full_frame_camera_setup(video, camera_type)
+    detector = shot_tracker.StoneDetector(args.model)
+    stone_detectors = {camera_type: detector}
+
+    num_frames = len(video.sampled_frame_indexes(0.1))
+    print(f"Tracking {num_frames} frames of {args.video}")
+
+    # The dense run is the baseline the adaptive run is compared with
+    dense, dense_elapsed = time_tracking(camera_setup, video, stone_detectors,
+                                         args, None)
+    sampler = shot_tracker.AdaptiveSampler(args.idle_interval,
+                                           hold_time=args.hold_time)
+    adaptive, adaptive_elapsed = time_tracking(camera_setup, video,
+                                               stone_detectors, args, sampler)
+
+    print(f"     dense: {dense_elapsed:6.2f}s, {num_frames} frames detected")
+    print(
+        f"  adaptive: {adaptive_elapsed:6.2f}s, {sampler.detected_frames} frames detected, "
+        f"{sampler.skipped_frames} skipped, {sampler.backfills} backfills")
+
+    dense_stones = dense.state.stones
+    adaptive_stones = adaptive.state.stones
+    print(
+        f"  {len(dense_stones)} stones tracked densely, {len(adaptive_stones)} adaptively"
+    )
+
+    # Stones are matched by creation order, which only lines up when both runs found the same stones
+    for stone_id, (dense_stone, adaptive_stone) in enumerate(
+            zip(dense_stones, adaptive_stones)):
+        differences = velocity_differences(dense_stone, adaptive_stone)
+        largest_difference = (f"{differences.max():.2f}"
+                              if len(differences) != 0 else "n/a")
+        print(
+            f"  stone {stone_id:>2} ({dense_stone.color.name.lower()}): "
+            f"{len(dense_stone.time_history)} -> {len(adaptive_stone.time_history)} samples, "
+            f"max speed {dense_stone.get_max_velocity():.2f} -> {adaptive_stone.get_max_velocity():.2f} ft/s, "
+            f"largest velocity difference {largest_difference} ft/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=
+        "Benchmark tracking a video with adaptive sampling against tracking every sampled frame, and compare the tracks."
+    )
+    parser.add_argument("--video", required=True, help="The video to track")
+    parser.add_argument("--model",
+                        required=True,
+                        help="The stone detector model to track with")
+    parser.add_argument("--camera-type",
+                        default=camera_utilities.CameraType.TOP_DOWN.value,
+                        choices=[t.value for t in camera_utilities.CameraType])
+    parser.add_argument("--idle-interval", type=float, default=1.0)
+    parser.add_argument("--hold-time", type=float, default=2.0)
+    parser.add_argument("--frame-batch-size", type=int, default=4)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--image-save-interval", type=float, default=1.0)
+
+    args = parser.parse_args()
+    main(args)
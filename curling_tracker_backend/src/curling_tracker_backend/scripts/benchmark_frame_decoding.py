@@ -0,0 +1,131 @@
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import cv2 as cv
+import numpy as np
+import curling_tracker_backend.util.curling_shot_tracker as shot_tracker
+
+
+def create_synthetic_video(output_path: str, width: int, height: int, fps: int,
+                           seconds: int, gop_size: int) -> str:
+    """Write a synthetic clip with a moving pattern so frames do not compress to nothing.
+
+    Encodes H.264 through ffmpeg when it is available and falls back to OpenCV's mp4v
+    otherwise; returns the name of the codec that was actually used.
+    """
+    frames_dir = tempfile.mkdtemp()
+    writer = cv.VideoWriter(os.path.join(frames_dir, "raw.avi"),
+                            cv.VideoWriter_fourcc(*"MJPG"), fps,
+                            (width, height))
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    for i in range(fps * seconds):
+        frame = np.roll(background, i * 4, axis=1)
+        cv.circle(frame, ((i * 7) % width, height // 2), 40, (0, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+    if shutil.which("ffmpeg") is not None:
+        subprocess.run([
+            "ffmpeg", "-y", "-loglevel", "error", "-i",
+            os.path.join(frames_dir, "raw.avi"), "-c:v", "libx264", "-g",
+            str(gop_size), "-pix_fmt", "yuv420p", output_path
+        ],
+                       check=True)
+        codec = "H.264"
+    else:
+        print("ffmpeg not found, falling back to OpenCV mp4v encoding.")
+        cap = cv.VideoCapture(os.path.join(frames_dir, "raw.avi"))
+        writer = cv.VideoWriter(output_path, cv.VideoWriter_fourcc(*"mp4v"),
+                                fps, (width, height))
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            writer.write(frame)
+        writer.release()
+        cap.release()
+        codec = "mp4v"
+
+    shutil.rmtree(frames_dir)
+    return codec
+
+
+def time_decode_mode(video: shot_tracker.CurlingVideo,
+                     decode_mode: shot_tracker.DecodeMode,
+                     second_interval: float):
+    start = time.perf_counter()
+    num_frames = 0
+    for _ in video.frame_generator(second_interval=second_interval,
+                                   decode_mode=decode_mode):
+        num_frames += 1
+    elapsed = time.perf_counter() - start
+    return num_frames, elapsed
+
+
+def main(args):
+    output_dir = tempfile.mkdtemp()
+    video_path = os.path.join(output_dir, "synthetic.mp4")
+
+    print(
+        f"Creating synthetic {args.width}x{args.height} clip, {args.seconds}s at {args.fps}fps, gop={args.gop_size}..."
+    )
+    codec = create_synthetic_video(video_path, args.width, args.height,
+                                   args.fps, args.seconds, args.gop_size)
+    if codec != "H.264" and args.require_h264:
+        raise SystemExit(
+            f"Synthetic clip was encoded as {codec}, not H.264; install ffmpeg or drop --require-h264."
+        )
+    print(f"Benchmarking a {codec} clip.")
+
+    video = shot_tracker.CurlingVideo(video_path, gop_size=args.gop_size)
+    for second_interval in args.intervals:
+        frame_interval = max(int(video.fps * second_interval), 1)
+        auto_mode = video.select_decode_mode(frame_interval)
+        print(
+            f"\nInterval {second_interval}s (auto selects {auto_mode.value})")
+        for decode_mode in [
+                shot_tracker.DecodeMode.SEEK,
+                shot_tracker.DecodeMode.SEQUENTIAL
+        ]:
+            num_frames, elapsed = time_decode_mode(video, decode_mode,
+                                                   second_interval)
+            print(
+                f"  {decode_mode.value:>10}: {num_frames} frames in {elapsed:.2f}s, {num_frames / elapsed:.1f} frames/sec"
+            )
+
+    shutil.rmtree(output_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=
+        "Benchmark seek and sequential decoding in CurlingVideo.frame_generator on a synthetic clip (H.264 when ffmpeg is available)."
+    )
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--seconds",
+                        type=int,
+                        default=60,
+                        help="Length of the synthetic clip in seconds")
+    parser.add_argument("--gop-size",
+                        type=int,
+                        default=60,
+                        help="Keyframe interval of the synthetic clip")
+    parser.add_argument("--intervals",
+                        type=float,
+                        nargs="+",
+                        default=[0.1, 1.0, 5.0],
+                        help="Sample intervals in seconds to benchmark")
+    parser.add_argument(
+        "--require-h264",
+        action="store_true",
+        help="Fail instead of benchmarking an mp4v clip when ffmpeg is missing"
+    )
+
+    args = parser.parse_args()
+    main(args)
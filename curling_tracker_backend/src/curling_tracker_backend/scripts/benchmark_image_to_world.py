@@ -0,0 +1,92 @@
+import argparse
+import timeit
+import cv2 as cv
+import numpy as np
+import curling_tracker_backend.util.camera_utilities as camera_utilities
+
+
+def uncached_image_to_world_coordinates(camera: camera_utilities.Camera,
+                                        image_points: np.ndarray):
+    """The original implementation, which rebuilds the homography every call and converts one point at a time."""
+    image_points = np.expand_dims(image_points, axis=1)
+    undistorted_points = cv.undistortPoints(
+        image_points,
+        camera.camera_matrix,
+        camera.distortion_coefficients,
+        P=camera.camera_matrix,
+    )
+
+    rmat, _ = cv.Rodrigues(camera.rotation_vectors)
+    extrinsic_mat = np.hstack((rmat, camera.translation_vectors))
+    projection_mat = camera.camera_matrix @ extrinsic_mat
+    homography_mat = projection_mat[:, [0, 1, 3]]
+    inv_homography_mat = np.linalg.inv(homography_mat)
+
+    sheet_points = []
+    for p in undistorted_points:
+        point3d_homogeneous = np.array([p[0][0], p[0][1], 1.0])
+        world_point_homogeneous = inv_homography_mat @ point3d_homogeneous
+        world_point_homogeneous /= world_point_homogeneous[2]
+        sheet_points.append(
+            (world_point_homogeneous[0], world_point_homogeneous[1], 0.0))
+
+    return np.array(sheet_points)
+
+
+def create_test_camera(distortion: bool) -> camera_utilities.Camera:
+    camera_matrix = np.array([[1000.0, 0.0, 640.0], [0.0, 1000.0, 360.0],
+                              [0.0, 0.0, 1.0]])
+    distortion_coefficients = np.array([[-0.2, 0.05, 0.0, 0.0, 0.0]
+                                        ]) if distortion else np.zeros((1, 5))
+    return camera_utilities.Camera("benchmark", np.array([0, 0]),
+                                   np.array([1280, 720]), camera_matrix,
+                                   distortion_coefficients,
+                                   np.array([[2.5], [0.0], [0.0]]),
+                                   np.array([[0.0], [-50.0], [40.0]]),
+                                   camera_utilities.CameraType.ANGLED)
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+
+    for distortion in [True, False]:
+        camera = create_test_camera(distortion)
+        print(f"\nDistortion coefficients: {'non-zero' if distortion else 'zero'}")
+        for num_points in args.num_points:
+            points = (rng.random((num_points, 2)) *
+                      np.array([1280, 720])).astype("float32")
+
+            np.testing.assert_allclose(
+                camera_utilities.image_to_world_coordinates(camera, points),
+                uncached_image_to_world_coordinates(camera, points),
+                rtol=1e-6,
+                atol=1e-6)
+
+            uncached = timeit.timeit(
+                lambda: uncached_image_to_world_coordinates(camera, points),
+                number=args.repeat) / args.repeat
+            cached = timeit.timeit(
+                lambda: camera_utilities.image_to_world_coordinates(
+                    camera, points),
+                number=args.repeat) / args.repeat
+            print(
+                f"  {num_points:>5} points: uncached {uncached * 1e6:9.1f}us, cached {cached * 1e6:9.1f}us, {uncached / cached:5.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=
+        "Benchmark the per-call cost of image_to_world_coordinates against the uncached per-point implementation."
+    )
+    parser.add_argument("--num-points",
+                        type=int,
+                        nargs="+",
+                        default=[1, 16, 1000])
+    parser.add_argument("--repeat",
+                        type=int,
+                        default=2000,
+                        help="Number of calls to average over")
+
+    args = parser.parse_args()
+    main(args)
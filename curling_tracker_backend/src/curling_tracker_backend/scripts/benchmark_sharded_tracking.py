@@ -0,0 +1,91 @@
+import argparse
+import json
+import time
+import cv2 as cv
+import numpy as np
+import curling_tracker_backend.util.camera_utilities as camera_utilities
+import curling_tracker_backend.util.curling_shot_tracker as shot_tracker
+
+
+def full_frame_camera_setup(video: shot_tracker.CurlingVideo,
+                            camera_type: camera_utilities.CameraType):
+    """A camera setup with a single uncalibrated camera covering the whole video frame."""
+    cap = cv.VideoCapture(video.video_path)
+    width = int(cap.get(cv.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    camera_matrix = np.array([[width, 0.0, width / 2],
+                              [0.0, width, height / 2], [0.0, 0.0, 1.0]])
+    camera = camera_utilities.Camera("full_frame", np.array([0, 0]),
+                                     np.array([width, height]), camera_matrix,
+                                     np.zeros((1, 5)), np.zeros((3, 1)),
+                                     np.array([[0.0], [0.0], [10.0]]),
+                                     camera_type)
+    return shot_tracker.CameraSetup("benchmark", "benchmark", [camera])
+
+
+def time_tracking(camera_setup, video, stone_detectors, args,
+                  num_workers: int):
+    start = time.perf_counter()
+    results = shot_tracker.video_stone_tracker(
+        camera_setup,
+        video,
+        stone_detectors,
+        args.image_save_interval,
+        frame_batch_size=args.frame_batch_size,
+        max_batch_size=args.max_batch_size,
+        num_workers=num_workers)
+    return results, time.perf_counter() - start
+
+
+def main(args):
+    video = shot_tracker.CurlingVideo(args.video)
+    camera_type = camera_utilities.CameraType(args.camera_type)
+    camera_setup = full_frame_camera_setup(video, camera_type)
+    detector = shot_tracker.StoneDetector(args.model)
+    stone_detectors = {camera_type: detector}
+
+    num_frames = len(video.sampled_frame_indexes(0.1))
+    print(f"Tracking {num_frames} frames of {args.video}")
+
+    # The first run is in process, it is the baseline the sharded runs have to match
+    baseline, elapsed = time_tracking(camera_setup, video, stone_detectors,
+                                      args, 0)
+    baseline_json = json.dumps(baseline.dict_for_json())
+    print(
+        f"  in process: {elapsed:6.2f}s, {num_frames / elapsed:6.1f} frames/sec"
+    )
+
+    for num_workers in args.workers:
+        results, elapsed = time_tracking(camera_setup, video, stone_detectors,
+                                         args, num_workers)
+        matches = json.dumps(results.dict_for_json()) == baseline_json
+        print(
+            f"  {num_workers:>2} workers: {elapsed:6.2f}s, {num_frames / elapsed:6.1f} frames/sec, "
+            f"{'matches' if matches else 'DIFFERS FROM'} in process results")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=
+        "Benchmark tracking a video with its time shards detected in worker processes against tracking it in process."
+    )
+    parser.add_argument("--video", required=True, help="The video to track")
+    parser.add_argument("--model",
+                        required=True,
+                        help="The stone detector model to track with")
+    parser.add_argument("--camera-type",
+                        default=camera_utilities.CameraType.TOP_DOWN.value,
+                        choices=[t.value for t in camera_utilities.CameraType])
+    parser.add_argument("--workers",
+                        type=int,
+                        nargs="+",
+                        default=[1, 2, 4, 8],
+                        help="Worker process counts to benchmark")
+    parser.add_argument("--frame-batch-size", type=int, default=4)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--image-save-interval", type=float, default=1.0)
+
+    args = parser.parse_args()
+    main(args)
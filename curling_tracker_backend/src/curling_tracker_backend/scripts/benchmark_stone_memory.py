@@ -0,0 +1,97 @@
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import curling_tracker_backend.util.curling_shot_tracker as shot_tracker
+
+
+class ListStoneHistory:
+    """The original Stone history storage, lists of tuples of NumPy scalars."""
+
+    def __init__(self, initial_position, initial_time):
+        self.position_history = [initial_position]
+        self.velocity_history = [(0.0, 0.0)]
+        self.acceleration_history = [(0.0, 0.0)]
+        self.time_history = [initial_time]
+
+    def record_filter_state(self, x, time):
+        self.position_history.append((x[0], x[1]))
+        self.velocity_history.append((x[2], x[3]))
+        self.acceleration_history.append((x[4], x[5]))
+        self.time_history.append(time)
+
+    def get_max_velocity(self):
+        return max(
+            np.sqrt(v[0]**2 + v[1]**2) for v in self.velocity_history)
+
+
+def simulate_game(args, use_arrays: bool):
+    """Record the history of every stone of a simulated game, one stone after another."""
+    rng = np.random.default_rng(0)
+    filter_bank = shot_tracker.create_stone_filter_bank(args.timestep)
+    stones = []
+
+    for stone_index in range(args.num_stones):
+        start_time = stone_index * args.timestep
+        if use_arrays:
+            stone = shot_tracker.Stone(shot_tracker.StoneClass.GREEN,
+                                       (0.0, 40.0), start_time, filter_bank)
+        else:
+            stone = ListStoneHistory((0.0, 40.0), start_time)
+
+        states = rng.normal(size=(args.frames_per_stone, 6))
+        for frame in range(args.frames_per_stone):
+            time = start_time + (frame + 1) * args.timestep
+            if use_arrays:
+                filter_bank.x[stone.filter_index] = states[frame]
+                stone.record_filter_state(time)
+            else:
+                stone.record_filter_state(states[frame], time)
+
+        stones.append(stone)
+
+    return stones
+
+
+def measure(args, use_arrays: bool):
+    tracemalloc.start()
+    start = time.perf_counter()
+    stones = simulate_game(args, use_arrays)
+    record_time = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for stone in stones:
+        stone.get_max_velocity()
+    max_velocity_time = time.perf_counter() - start
+
+    return memory, record_time, max_velocity_time
+
+
+def main(args):
+    num_samples = args.num_stones * args.frames_per_stone
+    print(
+        f"Simulating {args.num_stones} stones with {args.frames_per_stone} filter states each ({num_samples} samples)"
+    )
+
+    for name, use_arrays in [("lists", False), ("arrays", True)]:
+        memory, record_time, max_velocity_time = measure(args, use_arrays)
+        print(
+            f"  {name:>6}: {memory / 1e6:8.1f}MB, {memory / num_samples:6.1f} bytes/sample, "
+            f"record {record_time:6.2f}s, max velocity {max_velocity_time * 1e3:8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=
+        "Compare the memory used by Stone histories stored as arrays against the original lists of tuples."
+    )
+    # A 2 hour game at 10Hz, with 16 stones an end over 10 ends each tracked for about 7.5 minutes
+    parser.add_argument("--num-stones", type=int, default=160)
+    parser.add_argument("--frames-per-stone", type=int, default=4500)
+    parser.add_argument("--timestep", type=float, default=0.1)
+
+    args = parser.parse_args()
+    main(args)
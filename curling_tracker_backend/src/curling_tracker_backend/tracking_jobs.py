@@ -0,0 +1,617 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+import atexit
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from typing import Callable, Iterator, Optional
+from flask import Flask, current_app
+
+import curling_tracker_backend.db_helper as db_helper
+import curling_tracker_backend.util.async_yt_dlp as async_yt_dlp
+import curling_tracker_backend.util.camera_utilities as camera_utilities
+import curling_tracker_backend.util.curling_shot_tracker as shot_tracker
+from curling_tracker_backend.db import query_db
+from curling_tracker_backend.util.detection_cache import RawDetectionCache
+from curling_tracker_backend.util.detector_registry import registry
+from curling_tracker_backend.util.image_store import ImageFormat, ImageStore
+from curling_tracker_backend.util.motion_gate import MotionGate
+from curling_tracker_backend.video_cache import (CachedClip, VideoCache,
+                                                 video_content_hash)
+
+logger = logging.getLogger(__name__)
+
+
+class TrackingStatus:
+    QUEUED = "queued"
+    DOWNLOADING = "downloading"
+    TRACKING = "tracking"
+    COMPLETE = "complete"
+    FAILED = "failed"
+
+
+# The formats tracking results are saved in, keyed by mimetype. JSON comes first so it is the default.
+RESULTS_FILE_EXTENSIONS = {
+    "application/json": ".json",
+    "application/x-npz": ".npz",
+}
+
+# Bump when a change to the tracker changes its results, so results cached by older versions are not reused
+RESULTS_CACHE_VERSION = 2
+
+
+class TrackingQueueFull(Exception):
+    pass
+
+
+class TrackingJobQueue:
+    """Runs video tracking jobs on a bounded pool of worker threads.
+
+    At most max_workers jobs run at once and at most max_queued more wait for a worker. Submitting beyond that
+    raises TrackingQueueFull rather than letting the backlog grow without bound. Streamed tracking, which runs on the
+    request's own thread, takes a slot from the same budget with reserve_slot.
+
+    The jobs are recorded as owned by the queue's worker_id, worker_pid and worker_started, see
+    fail_interrupted_jobs.
+    """
+
+    def __init__(self, app: Flask, max_workers: int, max_queued: int):
+        self.app = app
+        self.worker_id = str(uuid.uuid4())
+        self.worker_pid = os.getpid()
+        self.worker_started = process_start_time(self.worker_pid)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="tracking-job")
+        self.slots = threading.BoundedSemaphore(max_workers + max_queued)
+
+    def submit(self, tracking_id: str, url: str, start_seconds: int,
+               duration: int, setup_id: str) -> Future:
+        """Queue a tracking job.
+
+        Args:
+            tracking_id (str): The id of the VideoTracking row for this job.
+            url (str): The url of the video to track.
+            start_seconds (int): The time in the video to start tracking at.
+            duration (int): The number of seconds of video to track.
+            setup_id (str): The camera setup of the video.
+
+        Raises:
+            TrackingQueueFull: When the maximum number of jobs are already running or queued.
+
+        Returns:
+            Future: The future for the job.
+        """
+        self.reserve_slot()
+
+        try:
+            future = self.executor.submit(run_tracking_job, self.app,
+                                          tracking_id, url, start_seconds,
+                                          duration, setup_id)
+        except BaseException:
+            # Such as when the executor has been shut down at exit
+            self.release_slot()
+            raise
+        future.add_done_callback(lambda _: self.release_slot())
+        return future
+
+    def reserve_slot(self):
+        """Take a slot for tracking a video outside the queue's workers, which must be given back with release_slot.
+
+        Raises:
+            TrackingQueueFull: When the maximum number of jobs are already running or queued.
+        """
+        if not self.slots.acquire(blocking=False):
+            raise TrackingQueueFull()
+
+    def release_slot(self):
+        """Give back a slot taken by reserve_slot."""
+        self.slots.release()
+
+
+def video_clip_id(url: str, start_seconds: int, duration: int) -> str:
+    """The id of a clip of a video, the same every time so every download of the clip writes to the same file."""
+    return hashlib.sha256(
+        f"{url}\n{start_seconds}\n{duration}".encode()).hexdigest()[:32]
+
+
+def download_clip(
+        url: str,
+        start_seconds: int,
+        duration: int,
+        progress_callback: Optional[Callable[[float],
+                                             None]] = None) -> CachedClip:
+    """Download a clip of a video and add it to the video cache, pinned until it is released.
+
+    Concurrent requests for the same clip share a single download.
+
+    Args:
+        url (str): The url of the video.
+        start_seconds (int): The start of the clip in the video.
+        duration (int): The length of the clip in seconds.
+        progress_callback (Optional[Callable[[float], None]], optional): Called from a background thread with the
+            fraction of the clip downloaded so far. Defaults to None.
+
+    Raises:
+        RuntimeError: If yt-dlp fails to download the clip.
+
+    Returns:
+        CachedClip: The downloaded clip.
+    """
+    logger.info(f"Downloading video for tracking.")
+    if not os.path.exists(current_app.config["YOUTUBE_DOWNLOADS_FOLDER"]):
+        os.makedirs(current_app.config["YOUTUBE_DOWNLOADS_FOLDER"])
+
+    def download_progress(downloaded_bytes: int, total_bytes: Optional[int]):
+        if progress_callback is not None and total_bytes:
+            progress_callback(min(downloaded_bytes / total_bytes, 1.0))
+
+    video_id = video_clip_id(url, start_seconds, duration)
+    output_file = os.path.join(current_app.config["YOUTUBE_DOWNLOADS_FOLDER"],
+                               video_id + ".mp4")
+    download_manager = get_download_manager()
+    try:
+        return_code = download_manager.download(
+            url,
+            output_file,
+            start_time=start_seconds,
+            end_time=start_seconds + duration,
+            progress_callback=download_progress).result()
+        if return_code != 0:
+            raise RuntimeError(
+                f"Downloading {url} failed with yt-dlp return code {return_code}"
+            )
+        if not os.path.exists(output_file):
+            raise RuntimeError(
+                f"Downloading {url} did not produce the clip {output_file}")
+
+        logger.info(f"Adding video to the video cache: {video_id=}")
+        return get_video_cache().add_clip(video_id, url, start_seconds,
+                                          duration, video_id + ".mp4")
+    finally:
+        # Requests for the clip from now on find it in the video cache
+        download_manager.forget(url, start_seconds, start_seconds + duration)
+
+
+def clip_video(clip: CachedClip, duration: int) -> shot_tracker.CurlingVideo:
+    """The requested time range of a cached clip, which may start part way into a longer clip."""
+    return shot_tracker.CurlingVideo(clip.path,
+                                     start_second=clip.offset_seconds,
+                                     end_second=clip.offset_seconds + duration)
+
+
+@contextmanager
+def open_video(
+    url: str,
+    start_seconds: int,
+    duration: int,
+    progress_callback: Optional[Callable[[float], None]] = None
+) -> Iterator[shot_tracker.CurlingVideo]:
+    """Open a clip of a video for tracking, served from the video cache when a cached clip covers it.
+
+    With STREAMING_INGEST, a clip that is not cached is streamed from its url instead, so tracking starts on the
+    first seconds of the clip while the rest is still downloading. Streamed clips are not saved.
+
+    Args:
+        url (str): The url of the video.
+        start_seconds (int): The start of the clip in the video.
+        duration (int): The length of the clip in seconds.
+        progress_callback (Optional[Callable[[float], None]], optional): Called with the fraction of the clip
+            downloaded so far, see download_clip. Not called for cached or streamed clips. Defaults to None.
+
+    Yields:
+        shot_tracker.CurlingVideo: The clip. A downloaded clip is kept in the cache until the block exits.
+    """
+    video_cache = get_video_cache()
+    clip = video_cache.find_clip(url, start_seconds, duration)
+    if clip is not None:
+        logger.info(
+            f"Using cached video {clip.path} from {clip.offset_seconds}s for tracking."
+        )
+    elif current_app.config["STREAMING_INGEST"]:
+        logger.info(f"Streaming video for tracking.")
+        stream_url, http_headers = async_yt_dlp.resolve_video_stream(url)
+        yield shot_tracker.StreamingVideo(stream_url, start_seconds, duration,
+                                          http_headers)
+        return
+    else:
+        clip = download_clip(url, start_seconds, duration, progress_callback)
+
+    try:
+        yield clip_video(clip, duration)
+    finally:
+        video_cache.release(clip)
+
+
+def video_tracking_options() -> dict:
+    """The video_stone_tracker options set in the app config."""
+    return {
+        "image_save_interval": 1.0,
+        "second_interval": 0.1,
+        "prefetch_depth": current_app.config["VIDEO_TRACKING_PREFETCH_DEPTH"],
+        "frame_batch_size":
+        current_app.config["VIDEO_TRACKING_FRAME_BATCH_SIZE"],
+        "max_batch_size": current_app.config["DETECTOR_MAX_BATCH_SIZE"],
+        "image_store": current_app.extensions["image_store"],
+        "num_workers": current_app.config["TRACKING_PROCESSES"],
+        "shard_pool": get_shard_pool(),
+        "motion_gate": motion_gate(),
+        "adaptive_sampler": adaptive_sampler(),
+    }
+
+
+def motion_gate() -> Optional[MotionGate]:
+    """A new motion gate for tracking a video, or None when motion gating is disabled."""
+    if not current_app.config["MOTION_GATE"]:
+        return None
+    return MotionGate(current_app.config["MOTION_GATE_THRESHOLD"],
+                      current_app.config["MOTION_GATE_REFRESH_INTERVAL"])
+
+
+def adaptive_sampler() -> Optional[shot_tracker.AdaptiveSampler]:
+    """A new adaptive sampler for tracking a video, or None when adaptive sampling is disabled."""
+    if not current_app.config["ADAPTIVE_SAMPLING"]:
+        return None
+    return shot_tracker.AdaptiveSampler(
+        idle_interval=current_app.config["ADAPTIVE_SAMPLING_IDLE_INTERVAL"],
+        hold_time=current_app.config["ADAPTIVE_SAMPLING_HOLD_TIME"])
+
+
+def raw_detection_cache(
+        video: shot_tracker.CurlingVideo) -> Optional[RawDetectionCache]:
+    """The cache of raw detector boxes for a video, or None when the cache is disabled or the video is streamed."""
+    if (not current_app.config["DETECTION_CACHE"]
+            or isinstance(video, shot_tracker.StreamingVideo)):
+        return None
+    return RawDetectionCache(current_app.config["DETECTION_CACHE_FOLDER"],
+                             video_content_hash(video.video_path),
+                             video.first_frame)
+
+
+def results_cache_key(
+    video: shot_tracker.CurlingVideo, camera_setup: shot_tracker.CameraSetup,
+    stone_detectors: dict[camera_utilities.CameraType,
+                          shot_tracker.StoneDetector]
+) -> Optional[str]:
+    """The key of the tracking results for a video, camera setup calibration, set of detector models, and tracker
+    parameters.
+
+    Any change to the inputs gives a new key, so results cached for an old calibration or model are never found.
+
+    Args:
+        video (shot_tracker.CurlingVideo): The video, which may be a clip of a longer video file.
+        camera_setup (shot_tracker.CameraSetup): The camera setup of the video.
+        stone_detectors (dict[camera_utilities.CameraType, shot_tracker.StoneDetector]): The detectors to track with.
+
+    Returns:
+        Optional[str]: The key, or None when a detector's model hash is unknown or the video is streamed and the
+            results cannot be cached.
+    """
+    if isinstance(video, shot_tracker.StreamingVideo) or any(
+            detector.model_hash is None
+            for detector in stone_detectors.values()):
+        return None
+
+    options = video_tracking_options()
+    key = {
+        "version":
+        RESULTS_CACHE_VERSION,
+        "video":
+        video_content_hash(video.video_path),
+        "clip": [video.first_frame, video.num_frames],
+        "calibration":
+        camera_setup.calibration_key,
+        "models": {
+            camera_type.value:
+            [detector.model_hash, detector.overlap_iou_threshold]
+            for camera_type, detector in stone_detectors.items()
+        },
+        "image_save_interval":
+        options["image_save_interval"],
+        "second_interval":
+        options["second_interval"],
+        "motion_gate": [
+            current_app.config["MOTION_GATE"],
+            current_app.config["MOTION_GATE_THRESHOLD"],
+            current_app.config["MOTION_GATE_REFRESH_INTERVAL"],
+        ],
+        "adaptive_sampling": [
+            current_app.config["ADAPTIVE_SAMPLING"],
+            current_app.config["ADAPTIVE_SAMPLING_IDLE_INTERVAL"],
+            current_app.config["ADAPTIVE_SAMPLING_HOLD_TIME"],
+        ],
+        "image_store": [
+            current_app.config["IMAGE_STORE_FORMAT"],
+            current_app.config["IMAGE_STORE_QUALITY"],
+            current_app.config["IMAGE_STORE_THUMBNAIL_WIDTH"],
+        ],
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def use_cached_results(tracking_id: str, cache_key: Optional[str]) -> bool:
+    """Complete a tracking job with previously cached results if there are any for the cache key.
+
+    Args:
+        tracking_id (str): The id of the VideoTracking row for the job.
+        cache_key (Optional[str]): The results cache key of the job.
+
+    Returns:
+        bool: True if cached results were found and the job is complete.
+    """
+    if cache_key is None or not current_app.config["TRACKING_RESULTS_CACHE"]:
+        return False
+
+    cached = query_db(
+        "SELECT tracking_id FROM TrackingResultsCache WHERE cache_key = ?",
+        [cache_key],
+        one=True)
+    if cached is None:
+        return False
+
+    cached_paths = {
+        mimetype: tracking_results_path(cached[0], mimetype)
+        for mimetype in RESULTS_FILE_EXTENSIONS
+    }
+    if not all(os.path.exists(path) for path in cached_paths.values()):
+        query_db("DELETE FROM TrackingResultsCache WHERE cache_key = ?",
+                 [cache_key])
+        return False
+
+    for mimetype, path in cached_paths.items():
+        shutil.copyfile(path, tracking_results_path(tracking_id, mimetype))
+
+    set_tracking_status(tracking_id, TrackingStatus.COMPLETE, 100)
+    logger.info(
+        f"Used cached tracking results {tracking_id=} cached_tracking_id={cached[0]}"
+    )
+    return True
+
+
+def set_tracking_status(tracking_id: str,
+                        status: str,
+                        percent_complete: Optional[float] = None,
+                        error: Optional[str] = None):
+    if percent_complete is None:
+        query_db(
+            "UPDATE VideoTracking SET status = ?, error = ? WHERE tracking_id = ?",
+            [status, error, tracking_id])
+    else:
+        query_db(
+            "UPDATE VideoTracking SET status = ?, percent_complete = ?, error = ? WHERE tracking_id = ?",
+            [status, percent_complete, error, tracking_id])
+
+
+def tracking_results_path(tracking_id: str,
+                          mimetype: str = "application/json") -> str:
+    return os.path.join(current_app.config["TRACKING_RESULTS_FOLDER"],
+                        tracking_id + RESULTS_FILE_EXTENSIONS[mimetype])
+
+
+def run_tracking_job(app: Flask, tracking_id: str, url: str,
+                     start_seconds: int, duration: int, setup_id: str):
+    """Download a video and track the stones in it, recording progress and results against the tracking id.
+
+    Args:
+        app (Flask): The flask app, used for the database and config.
+        tracking_id (str): The id of the VideoTracking row for this job.
+        url (str): The url of the video to track.
+        start_seconds (int): The time in the video to start tracking at.
+        duration (int): The number of seconds of video to track.
+        setup_id (str): The camera setup of the video.
+    """
+    with app.app_context():
+        try:
+            last_download_percent = -1
+
+            def update_download_progress(fraction: float):
+                # Called from the download manager's thread, which has no app context. Progress that arrives after
+                # the download has finished must not overwrite the later status.
+                nonlocal last_download_percent
+                percent = int(fraction * 100)
+                if percent > last_download_percent:
+                    last_download_percent = percent
+                    with app.app_context():
+                        query_db(
+                            "UPDATE VideoTracking SET percent_complete = ? WHERE tracking_id = ? AND status = ?",
+                            [percent, tracking_id, TrackingStatus.DOWNLOADING])
+
+            set_tracking_status(tracking_id, TrackingStatus.DOWNLOADING, 0)
+            with open_video(url, start_seconds, duration,
+                            update_download_progress) as video:
+                camera_setup = db_helper.get_setup_from_db(setup_id)
+                stone_detectors = registry.get_configured_stone_detectors(
+                    current_app.config)
+                cache_key = results_cache_key(video, camera_setup,
+                                              stone_detectors)
+                if use_cached_results(tracking_id, cache_key):
+                    return
+
+                last_percent = -1
+
+                def update_progress(fraction: float):
+                    # Only write whole percent changes to keep database writes down on long clips
+                    nonlocal last_percent
+                    percent = int(fraction * 100)
+                    if percent > last_percent:
+                        last_percent = percent
+                        set_tracking_status(tracking_id,
+                                            TrackingStatus.TRACKING, percent)
+
+                logger.info(f"Starting video stone tracking {tracking_id=}...")
+                set_tracking_status(tracking_id, TrackingStatus.TRACKING, 0)
+                tracking_results = shot_tracker.video_stone_tracker(
+                    camera_setup,
+                    video,
+                    stone_detectors,
+                    progress_callback=update_progress,
+                    detection_cache=raw_detection_cache(video),
+                    **video_tracking_options())
+
+                os.makedirs(current_app.config["TRACKING_RESULTS_FOLDER"],
+                            exist_ok=True)
+                with open(tracking_results_path(tracking_id), "w") as f:
+                    json.dump(tracking_results.dict_for_json(), f)
+                with open(
+                        tracking_results_path(tracking_id,
+                                              "application/x-npz"),
+                        "wb") as f:
+                    tracking_results.write_npz(f)
+
+                # Recorded while the clip is still pinned, so evicting the clip cannot miss this entry
+                if cache_key is not None:
+                    query_db(
+                        "INSERT OR REPLACE INTO TrackingResultsCache (cache_key, tracking_id, video_hash) VALUES (?, ?, ?)",
+                        [
+                            cache_key, tracking_id,
+                            video_content_hash(video.video_path)
+                        ])
+
+            set_tracking_status(tracking_id, TrackingStatus.COMPLETE, 100)
+            logger.info(f"Finished video stone tracking {tracking_id=}.")
+        except Exception as e:
+            logger.exception(f"Video stone tracking failed {tracking_id=}")
+            set_tracking_status(tracking_id,
+                                TrackingStatus.FAILED,
+                                error=str(e))
+
+
+def process_start_time(pid: int) -> Optional[int]:
+    """When a process started, in clock ticks since the machine booted, or None if it is not known.
+
+    Only known on Linux, from /proc. Together with the process id it identifies a process even after the id has been
+    reused, such as by the server in a restarted container.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The process name in brackets can contain spaces, the start time is the 20th field after it
+    return int(stat[stat.rindex(")") + 2:].split()[19])
+
+
+def worker_is_running(job_queue: TrackingJobQueue, worker_id: Optional[str],
+                      worker_pid: Optional[int],
+                      worker_started: Optional[int]) -> bool:
+    """Whether the job queue that queued a tracking job is still running.
+
+    A job queued by this process's job queue is running. A job queued by another job queue is only running while a
+    process with its process id and start time exists. Process ids can only be checked on POSIX systems, elsewhere
+    jobs queued by another job queue are treated as interrupted.
+
+    Args:
+        job_queue (TrackingJobQueue): The job queue of this process.
+        worker_id (Optional[str]): The id of the job queue that queued the job.
+        worker_pid (Optional[int]): The process id of the job queue that queued the job.
+        worker_started (Optional[int]): The start time of that process from process_start_time.
+
+    Returns:
+        bool: True if the job queue is running.
+    """
+    if worker_id == job_queue.worker_id:
+        return True
+    if (worker_pid is None or worker_pid == job_queue.worker_pid
+            or os.name != "posix"):
+        return False
+
+    try:
+        # Signal 0 only checks that the process exists
+        os.kill(worker_pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running as another user
+        pass
+
+    # Another process has the same id when the start times differ
+    return (worker_started is None
+            or process_start_time(worker_pid) in (None, worker_started))
+
+
+def fail_interrupted_jobs(job_queue: TrackingJobQueue):
+    """Mark the tracking jobs left queued or running by a process that has stopped as failed.
+
+    The job queue only lives in memory, so these jobs will never finish and their status would be polled forever.
+    Jobs owned by a process that is still running, such as a server when this is a flask command or the reloader's
+    file watching process, or another server process, are left alone.
+
+    Args:
+        job_queue (TrackingJobQueue): The job queue of this process.
+    """
+    if not query_db("PRAGMA table_info(VideoTracking)"):
+        # The table does not exist yet, init_db creates it
+        return
+
+    unfinished = query_db(
+        "SELECT tracking_id, worker_id, worker_pid, worker_started FROM VideoTracking WHERE status IN (?, ?, ?)",
+        [
+            TrackingStatus.QUEUED, TrackingStatus.DOWNLOADING,
+            TrackingStatus.TRACKING
+        ])
+    interrupted = [
+        tracking_id
+        for tracking_id, worker_id, worker_pid, worker_started in unfinished
+        if not worker_is_running(job_queue, worker_id, worker_pid,
+                                 worker_started)
+    ]
+    if len(interrupted) == 0:
+        return
+
+    logger.warning(
+        f"Marking {len(interrupted)} video tracking jobs interrupted by a restart as failed"
+    )
+    for tracking_id in interrupted:
+        set_tracking_status(tracking_id,
+                            TrackingStatus.FAILED,
+                            error="Interrupted by a server restart")
+
+
+def init_app(app: Flask):
+    """Initialize the app to run video tracking jobs.
+
+    Args:
+        app (Flask): The flask app to initalize.
+    """
+    app.extensions["tracking_jobs"] = TrackingJobQueue(
+        app, app.config["TRACKING_WORKERS"],
+        app.config["TRACKING_MAX_QUEUED_JOBS"])
+    with app.app_context():
+        fail_interrupted_jobs(app.extensions["tracking_jobs"])
+    app.extensions["image_store"] = ImageStore(
+        app.config["IMAGE_STORE_FOLDER"],
+        image_format=ImageFormat(app.config["IMAGE_STORE_FORMAT"]),
+        quality=app.config["IMAGE_STORE_QUALITY"],
+        thumbnail_width=app.config["IMAGE_STORE_THUMBNAIL_WIDTH"],
+        max_workers=app.config["IMAGE_STORE_WORKERS"],
+        url_prefix="/api/images/")
+    app.extensions["download_manager"] = async_yt_dlp.DownloadManager(
+        app.config["DOWNLOAD_WORKERS"])
+    atexit.register(app.extensions["download_manager"].shutdown)
+    app.extensions["video_cache"] = VideoCache(
+        app.config["YOUTUBE_DOWNLOADS_FOLDER"],
+        app.config["VIDEO_CACHE_MAX_BYTES"],
+        detection_cache_folder=app.config["DETECTION_CACHE_FOLDER"])
+    # The workers are only started by the first sharded video, and kept for the next ones
+    app.extensions["shard_pool"] = shot_tracker.ShardWorkerPool(
+        max(app.config["TRACKING_PROCESSES"], 1))
+    atexit.register(app.extensions["shard_pool"].shutdown)
+
+
+def get_job_queue() -> TrackingJobQueue:
+    return current_app.extensions["tracking_jobs"]
+
+
+def get_download_manager() -> async_yt_dlp.DownloadManager:
+    return current_app.extensions["download_manager"]
+
+
+def get_video_cache() -> VideoCache:
+    return current_app.extensions["video_cache"]
+
+
+def get_shard_pool() -> shot_tracker.ShardWorkerPool:
+    return current_app.extensions["shard_pool"]
@@ -1,10 +1,31 @@
 import yt_dlp
-import asyncio
 import functools
-from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 
+logger = logging.getLogger(__name__)
 
-def download_video_sync(url, output_path, start_time=None, end_time=None):
+# Called with the bytes downloaded so far and the total bytes, or None when the total is not known
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+def _progress_hook(progress_queue, key, d: dict):
+    if d["status"] in ("downloading", "finished"):
+        total_bytes = d.get("total_bytes") or d.get("total_bytes_estimate")
+        progress_queue.put(
+            (key, d.get("downloaded_bytes", 0),
+             int(total_bytes) if total_bytes is not None else None))
+
+
+def download_video_sync(url,
+                        output_path,
+                        start_time=None,
+                        end_time=None,
+                        progress_queue=None,
+                        progress_key=None):
     ydl_opts = {
         'outtmpl': output_path,
         'merge_output_format': 'mp4',
@@ -14,18 +35,195 @@ def download_video_sync(url, output_path, start_time=None, end_time=None):
     if start_time is not None and end_time is not None:
         ydl_opts['download_ranges'] = yt_dlp.utils.download_range_func(
             None, [(start_time, end_time)])
+        # Re-encode the clip so it starts exactly at start_time rather than at the keyframe before it. The video cache
+        # serves time ranges from inside longer clips by their offset from the clip's start, which has to be exact.
+        ydl_opts['force_keyframes_at_cuts'] = True
+
+    if progress_queue is not None:
+        ydl_opts['progress_hooks'] = [
+            functools.partial(_progress_hook, progress_queue, progress_key)
+        ]
+
+    # yt-dlp's exceptions can hold objects that cannot be pickled, such as its logger, so they would not make it back
+    # from a worker process. Only their message is passed back.
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            return ydl.download(url)
+    except Exception as e:
+        raise RuntimeError(str(e))
+
+
+def resolve_video_stream(url: str) -> Tuple[str, Dict[str, str]]:
+    """Find the direct url of the best video stream of a video, without downloading it.
+
+    Args:
+        url (str): The url of the video, such as a YouTube page.
+
+    Returns:
+        Tuple[str, Dict[str, str]]: The url of the video stream and the http headers to request it with.
+    """
+    ydl_opts = {
+        'format': 'bestvideo/best',
+        'quiet': True,
+    }
 
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        return ydl.download(url)
-
-
-async def download_video(url, output_path, start_time=None, end_time=None):
-    loop = asyncio.get_running_loop()
-    with ProcessPoolExecutor() as exc:
-        return await loop.run_in_executor(
-            exc,
-            functools.partial(download_video_sync,
-                              url=url,
-                              output_path=output_path,
-                              start_time=start_time,
-                              end_time=end_time))
+        info = ydl.extract_info(url, download=False)
+
+    video_format = (info.get('requested_formats') or [info])[0]
+    return video_format['url'], video_format.get('http_headers', {})
+
+
+class _Download:
+
+    def __init__(self, future: Future):
+        self.future = future
+        self.progress_callbacks: List[ProgressCallback] = []
+
+
+class DownloadManager:
+    """Downloads videos with yt-dlp on a long lived pool of worker processes.
+
+    At most max_workers downloads run at once, later ones wait for a worker. Requests for a download that is already
+    in flight, with the same url and time range, share its future instead of downloading the video again. Progress
+    from the workers is passed back to the callbacks of every request sharing the download.
+
+    A failed download is forgotten straight away so it can be retried. A successful one stays registered, and later
+    requests get its finished future, until forget is called once the downloaded file has been recorded elsewhere,
+    such as in the video cache. Otherwise a request arriving between the download finishing and the file being
+    recorded would download the same video again, over the file.
+
+    The worker processes are started on the first download.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        """
+        Args:
+            max_workers (int, optional): The number of videos downloaded at once. Defaults to 2.
+        """
+        self.max_workers = max(max_workers, 1)
+
+        self._lock = threading.Lock()
+        self._downloads: Dict[Tuple, _Download] = {}
+        self._executor = None
+        self._progress_manager = None
+        self._progress_queue = None
+
+    def _start(self):
+        # Spawned rather than forked, forking a process with running threads can deadlock the child
+        context = multiprocessing.get_context("spawn")
+        self._progress_manager = context.Manager()
+        self._progress_queue = self._progress_manager.Queue()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=context)
+        threading.Thread(target=self._forward_progress,
+                         name="download-progress",
+                         daemon=True).start()
+
+    def _forward_progress(self):
+        while True:
+            try:
+                key, downloaded_bytes, total_bytes = self._progress_queue.get()
+            except (EOFError, OSError):
+                # The queue's manager process has shut down
+                return
+
+            with self._lock:
+                download = self._downloads.get(key)
+                callbacks = (list(download.progress_callbacks)
+                             if download is not None else [])
+            for callback in callbacks:
+                try:
+                    callback(downloaded_bytes, total_bytes)
+                except Exception:
+                    logger.exception("Download progress callback failed")
+
+    def _finish(self, key: Tuple, future: Future):
+        if not future.cancelled() and future.exception() is None:
+            # Kept until forget is called
+            return
+        with self._lock:
+            download = self._downloads.get(key)
+            if download is not None and download.future is future:
+                del self._downloads[key]
+
+    def forget(self,
+               url: str,
+               start_time: Optional[int] = None,
+               end_time: Optional[int] = None):
+        """Stop sharing a finished download with later requests, so the next request downloads the video again.
+
+        Args:
+            url (str): The url of the video.
+            start_time (Optional[int], optional): The start of the time range. Defaults to None.
+            end_time (Optional[int], optional): The end of the time range. Defaults to None.
+        """
+        key = (url, start_time, end_time)
+        with self._lock:
+            download = self._downloads.get(key)
+            if download is not None and download.future.done():
+                del self._downloads[key]
+
+    def download(
+            self,
+            url: str,
+            output_path: str,
+            start_time: Optional[int] = None,
+            end_time: Optional[int] = None,
+            progress_callback: Optional[ProgressCallback] = None) -> Future:
+        """Download a video, or join the download of the same video and time range if it is in flight or has finished
+        and not been forgotten.
+
+        Joined downloads keep the output path of the first request. Use asyncio.wrap_future to await the result.
+
+        Args:
+            url (str): The url of the video.
+            output_path (str): The path to save the video to. A failed download is started over from the beginning.
+            start_time (Optional[int], optional): The start of the time range to download. Defaults to None.
+            end_time (Optional[int], optional): The end of the time range to download. Defaults to None.
+            progress_callback (Optional[ProgressCallback], optional): Called from a background thread with the bytes
+                downloaded so far and the total bytes. Defaults to None.
+
+        Returns:
+            Future: The future for the yt-dlp return code of the download. It raises a RuntimeError with yt-dlp's
+                message if the download fails.
+        """
+        key = (url, start_time, end_time)
+        with self._lock:
+            download = self._downloads.get(key)
+            started = download is None
+            if started:
+                if self._executor is None:
+                    self._start()
+                download = _Download(
+                    self._executor.submit(download_video_sync,
+                                          url=url,
+                                          output_path=output_path,
+                                          start_time=start_time,
+                                          end_time=end_time,
+                                          progress_queue=self._progress_queue,
+                                          progress_key=key))
+                self._downloads[key] = download
+            else:
+                logger.info(f"Joining in flight download of {url}")
+
+            if progress_callback is not None:
+                download.progress_callbacks.append(progress_callback)
+
+        # Outside the lock, the callback runs straight away if the download has already finished
+        if started:
+            download.future.add_done_callback(
+                functools.partial(self._finish, key))
+        return download.future
+
+    def shutdown(self):
+        """Wait for the running downloads and stop the worker processes and the progress queue's manager process."""
+        with self._lock:
+            executor = self._executor
+            progress_manager = self._progress_manager
+            self._executor = None
+            self._progress_manager = None
+        if executor is not None:
+            executor.shutdown()
+        if progress_manager is not None:
+            progress_manager.shutdown()
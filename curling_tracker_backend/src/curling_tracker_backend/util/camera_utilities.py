@@ -1,7 +1,11 @@
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import numpy as np
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
+from functools import cached_property
+from collections import OrderedDict
+import hashlib
+import threading
 import cv2 as cv
 
 
@@ -10,6 +14,48 @@ class CameraType(str, Enum):
     ANGLED = "angled"
 
 
+@dataclass(frozen=True)
+class InferenceProfile:
+    """How a camera's images are run through the stone detector.
+
+    Attributes:
+        imgsz (Optional[int]): The image size the detector letterboxes the images to. None uses the detector default.
+        resize_width (Optional[int]): The width to shrink images to before they go to the detector, so large crops are
+            not copied at full resolution. The boxes are scaled back to the original image. None does not resize.
+        confidence (Optional[float]): The confidence threshold of the detections. None uses the detector default.
+    """
+
+    imgsz: Optional[int] = None
+    resize_width: Optional[int] = None
+    confidence: Optional[float] = None
+
+    @property
+    def key(self) -> str:
+        """A key identifying the profile, empty for the default profile."""
+        if self == InferenceProfile():
+            return ""
+        return f"imgsz{self.imgsz}_w{self.resize_width}_conf{self.confidence}"
+
+    def dict_for_json(self) -> dict:
+        return {
+            "imgsz": self.imgsz,
+            "resize_width": self.resize_width,
+            "confidence": self.confidence,
+        }
+
+
+CALIBRATION_FIELDS = ("camera_matrix", "distortion_coefficients",
+                      "rotation_vectors", "translation_vectors")
+# Values derived from the calibration, dropped whenever a calibration field is reassigned
+_CALIBRATION_CACHED_PROPERTIES = ("inverse_homography", "has_distortion",
+                                  "calibration_key")
+
+# Undistortion remap tables keyed by calibration and image size, shared by every Camera with the same calibration
+_UNDISTORT_MAPS_CACHE_SIZE = 16
+_undistort_maps_cache = OrderedDict()
+_undistort_maps_lock = threading.Lock()
+
+
 @dataclass
 class Camera:
     """Stores the defining components of a camera.
@@ -23,6 +69,7 @@ class Camera:
         rotation_vectors (np.ndarray): The rotation vector for this camrea.
         translation_vectors (np.ndarray): The translation vector for this camera.
         camera_type (CameraType): The type of this camera (top down or angled)
+        inference_profile (InferenceProfile): How this camera's images are run through the stone detector.
     """
 
     name: str
@@ -33,6 +80,47 @@ class Camera:
     rotation_vectors: np.ndarray
     translation_vectors: np.ndarray
     camera_type: CameraType
+    inference_profile: InferenceProfile = field(
+        default_factory=InferenceProfile)
+
+    def __setattr__(self, name, value):
+        if name in CALIBRATION_FIELDS:
+            self.invalidate_calibration_cache()
+        super().__setattr__(name, value)
+
+    def invalidate_calibration_cache(self):
+        """Drop the values derived from the calibration.
+
+        This happens automatically when a calibration field is reassigned, but must be called after modifying a
+        calibration array in place.
+        """
+        for name in _CALIBRATION_CACHED_PROPERTIES:
+            self.__dict__.pop(name, None)
+
+    @cached_property
+    def inverse_homography(self) -> np.ndarray:
+        """The inverse of the homography from the sheet plane (z == 0) to undistorted pixel coordinates."""
+        rmat, _ = cv.Rodrigues(self.rotation_vectors)
+        extrinsic_mat = np.hstack((rmat, self.translation_vectors))
+        projection_mat = self.camera_matrix @ extrinsic_mat
+        homography_mat = projection_mat[:, [0, 1, 3]]
+        return np.linalg.inv(homography_mat)
+
+    @cached_property
+    def calibration_key(self) -> str:
+        """A hash identifying this camera's calibration."""
+        sha = hashlib.sha1()
+        for name in CALIBRATION_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                sha.update(np.ascontiguousarray(value, dtype=np.float64))
+            sha.update(b"|")
+        return sha.hexdigest()
+
+    @cached_property
+    def has_distortion(self) -> bool:
+        """Whether any of the distortion coefficients are non-zero."""
+        return bool(np.any(self.distortion_coefficients))
 
     def extract_image(self, image: np.ndarray) -> np.ndarray:
         """Extract the sub-image corresponding to this camera from a mosaic image.
@@ -83,29 +171,66 @@ def image_to_world_coordinates(camera: Camera,
     Returns:
         np.ndarray: The resulting world points.
     """
-    image_points = np.expand_dims(image_points, axis=1)
-    undistorted_points = cv.undistortPoints(
-        image_points,
+    image_points = np.asarray(image_points, dtype=np.float32).reshape(-1, 2)
+    if len(image_points) == 0:
+        return np.empty((0, 3))
+
+    if camera.has_distortion:
+        image_points = cv.undistortPoints(
+            np.expand_dims(image_points, axis=1),
+            camera.camera_matrix,
+            camera.distortion_coefficients,
+            P=camera.camera_matrix,
+        ).reshape(-1, 2)
+
+    homogeneous_points = np.hstack(
+        (image_points, np.ones((len(image_points), 1))))
+    world_points = homogeneous_points @ camera.inverse_homography.T
+    world_points = world_points[:, :2] / world_points[:, 2:3]
+
+    return np.hstack((world_points, np.zeros((len(world_points), 1))))
+
+
+def get_undistort_maps(
+        camera: Camera,
+        image_size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the remap tables that undistort images of a given size from a camera.
+
+    The tables are computed once per calibration and image size and kept in a small LRU cache shared across
+    Camera instances, since cameras are rebuilt from the database on every request.
+
+    Args:
+        camera (Camera): The camera to undistort images from.
+        image_size (Tuple[int, int]): The width and height of the images.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The two maps to pass to cv.remap.
+    """
+    key = (camera.calibration_key, tuple(image_size))
+    with _undistort_maps_lock:
+        maps = _undistort_maps_cache.get(key)
+        if maps is not None:
+            _undistort_maps_cache.move_to_end(key)
+            return maps
+
+    newcameramtx, roi = cv.getOptimalNewCameraMatrix(
         camera.camera_matrix,
         camera.distortion_coefficients,
-        P=camera.camera_matrix,
+        image_size,
+        1.0,
+        image_size,
     )
+    # cv.undistort builds the same fixed point maps internally, so the remapped images are identical
+    maps = cv.initUndistortRectifyMap(camera.camera_matrix,
+                                      camera.distortion_coefficients, None,
+                                      newcameramtx, image_size, cv.CV_16SC2)
 
-    rmat, _ = cv.Rodrigues(camera.rotation_vectors)
-    extrinsic_mat = np.hstack((rmat, camera.translation_vectors))
-    projection_mat = camera.camera_matrix @ extrinsic_mat
-    homography_mat = projection_mat[:, [0, 1, 3]]
-    inv_homography_mat = np.linalg.inv(homography_mat)
+    with _undistort_maps_lock:
+        _undistort_maps_cache[key] = maps
+        while len(_undistort_maps_cache) > _UNDISTORT_MAPS_CACHE_SIZE:
+            _undistort_maps_cache.popitem(last=False)
 
-    sheet_points = []
-    for p in undistorted_points:
-        point3d_homogeneous = np.array([p[0][0], p[0][1], 1.0])
-        world_point_homogeneous = inv_homography_mat @ point3d_homogeneous
-        world_point_homogeneous /= world_point_homogeneous[2]
-        sheet_points.append(
-            (world_point_homogeneous[0], world_point_homogeneous[1], 0.0))
-
-    return np.array(sheet_points)
+    return maps
 
 
 def undistort_image(camera: Camera, image: np.ndarray) -> np.ndarray:
@@ -118,18 +243,9 @@ def undistort_image(camera: Camera, image: np.ndarray) -> np.ndarray:
     Returns:
         np.ndarray: The resulting undistorted image.
     """
-    image_shape = list(image.shape[0:2][::-1])
-    newcameramtx, roi = cv.getOptimalNewCameraMatrix(
-        camera.camera_matrix,
-        camera.distortion_coefficients,
-        image_shape,
-        1.0,
-        image_shape,
-    )
-    undistorted_image = cv.undistort(image, camera.camera_matrix,
-                                     camera.distortion_coefficients, None,
-                                     newcameramtx)
-    return undistorted_image
+    image_size = tuple(image.shape[0:2][::-1])
+    map1, map2 = get_undistort_maps(camera, image_size)
+    return cv.remap(image, map1, map2, cv.INTER_LINEAR)
 
 
 def create_camera(
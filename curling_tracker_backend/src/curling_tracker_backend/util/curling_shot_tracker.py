@@ -1,19 +1,33 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 from enum import Enum
 import enum
+import hashlib
+import itertools
+import math
+import multiprocessing
+import json
 import os
-from typing import Generator, Iterator, List, Tuple
+import subprocess
+import sys
+import threading
+from typing import Callable, Generator, Iterable, Iterator, List, Optional, Tuple
 import scipy
 from ultralytics import YOLO
 import logging
 import cv2 as cv
 import numpy as np
 import base64
-from filterpy.kalman import KalmanFilter
 from filterpy.common import Q_discrete_white_noise
 
 from curling_tracker_backend.util.sheet_coordinates import SHEET_COORDINATES
 import curling_tracker_backend.util.camera_utilities as camera_utilities
+from curling_tracker_backend.util.detection_cache import RawDetectionCache
+from curling_tracker_backend.util.frame_prefetcher import FramePrefetcher
+from curling_tracker_backend.util.image_store import ImageStore
+from curling_tracker_backend.util.kalman_filter_bank import KalmanFilterBank
+from curling_tracker_backend.util.motion_gate import MotionGate
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +45,19 @@ class CameraSetup:
     name: str
     cameras: List[camera_utilities.Camera]
 
+    @property
+    def calibration_key(self) -> str:
+        """A hash identifying the cameras of this setup, their mosaic crops, calibrations and inference profiles."""
+        sha = hashlib.sha1()
+        for camera in self.cameras:
+            sha.update(camera.name.encode())
+            sha.update(camera.camera_type.value.encode())
+            sha.update(np.ascontiguousarray(camera.corner1, dtype=np.float64))
+            sha.update(np.ascontiguousarray(camera.corner2, dtype=np.float64))
+            sha.update(camera.calibration_key.encode())
+            sha.update(camera.inference_profile.key.encode())
+        return sha.hexdigest()
+
 
 @dataclass
 class StoneDetection:
@@ -51,8 +78,33 @@ class StoneDetection:
 class MosaicStoneDetections:
     images: dict[str, np.ndarray]
     detections: dict[str, List[StoneDetection]]
+    # The future StoredImage of each camera image when the images were written to an ImageStore instead of being kept
+    image_refs: Optional[dict[str, Future]] = None
 
     def dict_for_json(self) -> dict:
+        detections = {
+            camera_name:
+            [detection.dict_for_json() for detection in detections]
+            for camera_name, detections in self.detections.items()
+        }
+
+        if self.image_refs is not None:
+            stored_images = {
+                camera_name: image_ref.result()
+                for camera_name, image_ref in self.image_refs.items()
+            }
+            return {
+                "image_urls": {
+                    camera_name: stored_image.url
+                    for camera_name, stored_image in stored_images.items()
+                },
+                "thumbnail_urls": {
+                    camera_name: stored_image.thumbnail_url
+                    for camera_name, stored_image in stored_images.items()
+                },
+                "detections": detections,
+            }
+
         encoded_images = {}
         for camera_name, image in self.images.items():
             _, buffer = cv.imencode('.png', image)
@@ -61,19 +113,29 @@ class MosaicStoneDetections:
 
         return {
             "images": encoded_images,
-            "detections": {
-                camera_name:
-                [detection.dict_for_json() for detection in detections]
-                for camera_name, detections in self.detections.items()
-            },
+            "detections": detections,
         }
 
 
 class GameState:
 
-    def __init__(self, filter_timestep, stones=[]):
-        self.stones: List[Stone] = stones
+    def __init__(self,
+                 filter_timestep,
+                 stones: Optional[List["Stone"]] = None,
+                 filter_bank: Optional[KalmanFilterBank] = None):
+        self.stones: List[Stone] = stones if stones is not None else []
         self.filter_timestep = filter_timestep
+        # The Kalman filters of all the stones, so every active stone is predicted in a single call
+        self.filter_bank = (filter_bank if filter_bank is not None else
+                            create_stone_filter_bank(filter_timestep))
+        # Stones stop being tracked for good once they go inactive, so only the active ones, keyed by their index in
+        # stones, are considered when predicting and associating detections
+        self.active_stones: dict[int, Stone] = {
+            stone_id: stone
+            for stone_id, stone in enumerate(self.stones) if stone.active
+        }
+        # The time the filters of the active stones have been predicted to
+        self.predicted_time: Optional[float] = None
 
     def get_filtered_state(self,
                            num_detections_threshold: int = 5,
@@ -87,78 +149,146 @@ class GameState:
                 continue
             filtered_stones.append(stone)
 
-        return GameState(self.filter_timestep, stones=filtered_stones)
+        return GameState(self.filter_timestep,
+                         stones=filtered_stones,
+                         filter_bank=self.filter_bank)
 
-    def update_stones(self, timestamp: float):
-        for stone in self.stones:
-            stone.update_filter(timestamp)
+    def add_stone(self, stone: "Stone"):
+        self.active_stones[len(self.stones)] = stone
+        self.stones.append(stone)
 
-    def add_stone_detections(self, new_detections: MosaicStoneDetections,
-                             timestamp: float):
-        for camera_detections in new_detections.detections.values():
-            filtered_detections = []
+    def update_stones(self, timestamp: float):
+        for stone_id, stone in list(self.active_stones.items()):
+            stone.update_active_status(timestamp)
+            if not stone.active:
+                del self.active_stones[stone_id]
 
-            for detection in camera_detections:
-                if detection.overlapping:
-                    continue
+        self.filter_bank.predict(
+            [stone.filter_index for stone in self.active_stones.values()])
+        self.predicted_time = timestamp + self.filter_timestep
+        for stone in self.active_stones.values():
+            stone.record_filter_state(timestamp)
 
-                if not (SHEET_COORDINATES["away_middle_hog"][1] <=
-                        detection.sheet_coordinates[1] <=
-                        SHEET_COORDINATES["away_back_center_12"][1]
-                        or SHEET_COORDINATES["home_back_center_12"][1] <=
-                        detection.sheet_coordinates[1] <=
-                        SHEET_COORDINATES["home_middle_hog"][1]):
-                    continue
+    def predict_to(self, timestamp: float):
+        """Predict the active stones the rest of the way to a time further ahead than update_stones predicted them.
 
-                filtered_detections.append(detection)
+        update_stones predicts one filter timestep ahead, so this only does anything when the frames are further
+        apart than that, as they are while sampling adaptively.
 
-            if len(self.stones) == 0:
-                for detection in filtered_detections:
-                    self.stones.append(
-                        Stone(detection.color, detection.sheet_coordinates,
-                              timestamp, self.filter_timestep))
+        Args:
+            timestamp (float): The time of the next detections.
+        """
+        if self.predicted_time is None:
+            return
+
+        # Rounded so the filter bank only builds the transition for a handful of distinct gaps
+        dt = round(timestamp - self.predicted_time, 6)
+        if dt > 0.0:
+            self.filter_bank.predict(
+                [stone.filter_index for stone in self.active_stones.values()],
+                dt)
+            self.predicted_time = timestamp
+
+    @staticmethod
+    def trackable_detections(
+            camera_detections: List[StoneDetection]) -> List[StoneDetection]:
+        """The detections that are not overlapping and are between a hog line and back line."""
+        filtered_detections = []
+
+        for detection in camera_detections:
+            if detection.overlapping:
                 continue
 
-            if len(filtered_detections) == 0:
+            if not (SHEET_COORDINATES["away_middle_hog"][1] <=
+                    detection.sheet_coordinates[1] <=
+                    SHEET_COORDINATES["away_back_center_12"][1]
+                    or SHEET_COORDINATES["home_back_center_12"][1] <=
+                    detection.sheet_coordinates[1] <=
+                    SHEET_COORDINATES["home_middle_hog"][1]):
                 continue
 
-            matrix = []
-            for val1 in self.stones:
-                if not val1.active:
-                    new_row = [1000001.0] * len(filtered_detections)
-                    matrix.append(new_row)
-                    continue
+            filtered_detections.append(detection)
 
-                new_row = []
-                for val2 in filtered_detections:
-                    if val1.color != val2.color:
-                        new_row.append(1000001.0)
-                    else:
-                        dist = distance(val2.sheet_coordinates,
-                                        val1.get_latest_position())
-                        if dist > 2.0:
-                            dist = 1000001.0
-                        new_row.append(dist)
-
-                matrix.append(new_row)
-            matrix = np.array(matrix)
-
-            best_idxs = scipy.optimize.linear_sum_assignment(matrix)
-
-            remaining_detections = set(range(len(filtered_detections)))
-            for r, c in zip(*best_idxs):
-                if matrix[r][c] >= 1000000.0:
-                    continue
+        return filtered_detections
+
+    def add_stone_detections(self, new_detections: MosaicStoneDetections,
+                             timestamp: float):
+        self.predict_to(timestamp)
+
+        for camera_detections in new_detections.detections.values():
+            filtered_detections = self.trackable_detections(camera_detections)
+
+            # Stones only ever match detections of their own color, so each color is a separate assignment problem
+            colors = dict.fromkeys(detection.color
+                                   for detection in filtered_detections)
+            for color in colors:
+                self.associate_detections(
+                    [
+                        detection for detection in filtered_detections
+                        if detection.color == color
+                    ],
+                    [
+                        stone for stone in self.active_stones.values()
+                        if stone.color == color
+                    ],
+                    timestamp,
+                )
+
+    def associate_detections(self,
+                             detections: List[StoneDetection],
+                             stones: List["Stone"],
+                             timestamp: float,
+                             max_distance: float = 2.0):
+        """Match detections to the closest stones and start new stones for the unmatched detections.
 
-                self.stones[r].add_measurement(
-                    filtered_detections[c].sheet_coordinates, timestamp)
+        Args:
+            detections (List[StoneDetection]): The detections to associate, all of one color.
+            stones (List[Stone]): The active stones of the same color.
+            timestamp (float): The time of the detections.
+            max_distance (float, optional): The furthest a detection can be from a stone to match it. Defaults to 2.0.
+        """
+        remaining_detections = set(range(len(detections)))
+
+        if len(stones) != 0:
+            detection_positions = np.array(
+                [detection.sheet_coordinates[:2] for detection in detections],
+                dtype=np.float64)
+            stone_positions = np.array(
+                [stone.get_latest_position()[:2] for stone in stones],
+                dtype=np.float64)
+
+            costs = np.linalg.norm(stone_positions[:, np.newaxis, :] -
+                                   detection_positions[np.newaxis, :, :],
+                                   axis=2)
+            costs[costs > max_distance] = 1000001.0
+
+            matches = [
+                (r, c)
+                for r, c in zip(*scipy.optimize.linear_sum_assignment(costs))
+                if costs[r, c] < 1000000.0
+            ]
+
+            self.filter_bank.update(
+                [stones[r].filter_index for r, _ in matches],
+                [detection_positions[c] for _, c in matches])
+            for r, c in matches:
+                stones[r].add_measurement(timestamp)
                 remaining_detections.remove(c)
 
-            for idx in remaining_detections:
-                self.stones.append(
-                    Stone(filtered_detections[idx].color,
-                          filtered_detections[idx].sheet_coordinates,
-                          timestamp, self.filter_timestep))
+        for idx in sorted(remaining_detections):
+            self.add_stone(
+                Stone(detections[idx].color, detections[idx].sheet_coordinates,
+                      timestamp, self.filter_bank))
+
+    def active_stones_for_json(self) -> List[dict]:
+        """The latest state of the active stones, identified by their index in the stones list."""
+        return [{
+            "stone_id": stone_id,
+            "color": stone.color.name.lower(),
+            "position": stone.get_latest_position(),
+            "velocity": stone.get_latest_velocity(),
+            "time": stone.get_latest_time(),
+        } for stone_id, stone in self.active_stones.items()]
 
     def dict_for_json(self) -> dict:
         return {
@@ -171,6 +301,130 @@ class TrackingResults:
     state: GameState
     mosaic_detection_times: List[float]
     mosaic_detections: List[MosaicStoneDetections]
+    # The hit and miss counts of the motion gate, when the video was tracked with one
+    motion_gate: Optional[dict] = None
+    # The detected and skipped frame counts of the adaptive sampler, when the video was tracked with one
+    adaptive_sampling: Optional[dict] = None
+
+    def arrays_for_npz(self) -> dict[str, np.ndarray]:
+        """The results as flat columns for a binary .npz archive.
+
+        The stone histories are concatenated in stone order, and stone i owns rows stone_offsets[i] to
+        stone_offsets[i + 1]. The detections and PNG encoded images of the saved mosaic detections are flattened the
+        same way, with detection_mosaic_index and image_mosaic_index giving the saved mosaic detection each row
+        belongs to. Image i is the bytes image_offsets[i] to image_offsets[i + 1] of image_data, or is at
+        image_url[i] when it was written to an ImageStore, in which case it has no bytes in image_data. The motion
+        gate and adaptive sampling counts, when there are any, are scalars prefixed with motion_gate_ and
+        adaptive_sampling_.
+
+        Returns:
+            dict[str, np.ndarray]: The arrays keyed by name.
+        """
+        stones = self.state.stones
+        stone_offsets = np.zeros(len(stones) + 1, dtype=np.int64)
+        stone_offsets[1:] = np.cumsum(
+            [len(stone.time_history) for stone in stones])
+
+        def concatenate_history(name: str, shape: Tuple[int, ...],
+                                dtype) -> np.ndarray:
+            if len(stones) == 0:
+                return np.zeros(shape, dtype=dtype)
+            return np.concatenate([getattr(stone, name)
+                                   for stone in stones]).astype(dtype,
+                                                                copy=False)
+
+        detection_mosaic_index = []
+        detection_camera = []
+        detection_color = []
+        detection_image_coordinates = []
+        detection_sheet_coordinates = []
+        image_mosaic_index = []
+        image_camera = []
+        image_url = []
+        images = []
+        for mosaic_index, mosaic_detection in enumerate(
+                self.mosaic_detections):
+            for camera_name, detections in mosaic_detection.detections.items():
+                for detection in detections:
+                    detection_mosaic_index.append(mosaic_index)
+                    detection_camera.append(camera_name)
+                    detection_color.append(detection.color.name.lower())
+                    detection_image_coordinates.append(
+                        detection.image_coordinates)
+                    detection_sheet_coordinates.append(
+                        detection.sheet_coordinates)
+
+            if mosaic_detection.image_refs is not None:
+                for camera_name, image_ref in mosaic_detection.image_refs.items(
+                ):
+                    image_mosaic_index.append(mosaic_index)
+                    image_camera.append(camera_name)
+                    image_url.append(image_ref.result().url)
+                    images.append(np.zeros(0, dtype=np.uint8))
+                continue
+
+            for camera_name, image in mosaic_detection.images.items():
+                _, buffer = cv.imencode('.png', image)
+                image_mosaic_index.append(mosaic_index)
+                image_camera.append(camera_name)
+                image_url.append("")
+                images.append(buffer.reshape(-1))
+
+        image_offsets = np.zeros(len(images) + 1, dtype=np.int64)
+        image_offsets[1:] = np.cumsum([len(image) for image in images])
+
+        arrays = {
+            "stone_colors":
+            np.array([stone.color.name.lower() for stone in stones],
+                     dtype=str),
+            "stone_offsets":
+            stone_offsets,
+            "time_history":
+            concatenate_history("time_history", (0, ), np.float64),
+            "position_history":
+            concatenate_history("position_history", (0, 2), np.float32),
+            "velocity_history":
+            concatenate_history("velocity_history", (0, 2), np.float32),
+            "acceleration_history":
+            concatenate_history("acceleration_history", (0, 2), np.float32),
+            "mosaic_detection_times":
+            np.array(self.mosaic_detection_times, dtype=np.float64),
+            "detection_mosaic_index":
+            np.array(detection_mosaic_index, dtype=np.int64),
+            "detection_camera":
+            np.array(detection_camera, dtype=str),
+            "detection_color":
+            np.array(detection_color, dtype=str),
+            "detection_image_coordinates":
+            np.array(detection_image_coordinates,
+                     dtype=np.float32).reshape(-1, 4),
+            "detection_sheet_coordinates":
+            np.array(detection_sheet_coordinates,
+                     dtype=np.float32).reshape(-1, 3),
+            "image_mosaic_index":
+            np.array(image_mosaic_index, dtype=np.int64),
+            "image_camera":
+            np.array(image_camera, dtype=str),
+            "image_url":
+            np.array(image_url, dtype=str),
+            "image_offsets":
+            image_offsets,
+            "image_data": (np.concatenate(images) if len(images) != 0 else
+                           np.zeros(0, dtype=np.uint8)),
+        }
+        for prefix, counts in [("motion_gate_", self.motion_gate),
+                               ("adaptive_sampling_", self.adaptive_sampling)]:
+            for name, count in (counts or {}).items():
+                arrays[prefix + name] = np.array(count, dtype=np.int64)
+        return arrays
+
+    def write_npz(self, file):
+        """Write the results as an uncompressed .npz archive of the arrays_for_npz columns.
+
+        Args:
+            file: The path or file object to write to.
+        """
+        np.savez(file, **self.arrays_for_npz())
 
     def dict_for_json(self) -> dict:
         return {
@@ -182,42 +436,187 @@ class TrackingResults:
             ],
             "mosaic_detection_times":
             self.mosaic_detection_times,
+            "motion_gate":
+            self.motion_gate,
+            "adaptive_sampling":
+            self.adaptive_sampling,
         }
 
 
+@dataclass
+class TrackingUpdate:
+    """The tracking state after processing a single frame of a video."""
+    frame_time: float
+    stones: List[dict]
+    mosaic_detection: Optional[MosaicStoneDetections]
+
+    def dict_for_json(self) -> dict:
+        return {
+            "frame_time":
+            self.frame_time,
+            "stones":
+            self.stones,
+            "mosaic_detection": (self.mosaic_detection.dict_for_json() if
+                                 self.mosaic_detection is not None else None),
+        }
+
+
+class DecodeMode(str, Enum):
+    SEEK = "seek"
+    SEQUENTIAL = "sequential"
+    AUTO = "auto"
+
+
 class CurlingVideo:
 
-    def __init__(self, video_path: str):
+    # Whether frames can be decoded from any point in the video, which is needed to decode time shards in parallel
+    seekable = True
+
+    def __init__(self,
+                 video_path: str,
+                 gop_size: Optional[int] = None,
+                 start_second: float = 0.0,
+                 end_second: Optional[float] = None):
+        """A video file, or a clip of one, to extract frames from.
+
+        Frame indexes and times are relative to the start of the clip, so a clip cut out of a longer video file
+        tracks the same as a file of just the clip.
+
+        Args:
+            video_path (str): The path to the video file.
+            gop_size (Optional[int], optional): The number of frames between keyframes in the video. OpenCV does not
+                expose this, so when None it is assumed to be 2 seconds of frames which is typical for streamed video.
+                Defaults to None.
+            start_second (float, optional): The start of the clip in the video file. Defaults to 0.0.
+            end_second (Optional[float], optional): The end of the clip in the video file, or None to continue to the
+                end of the file. Defaults to None.
+        """
         self.video_path = video_path
 
         cap = cv.VideoCapture(self.video_path)
         self.fps = cap.get(cv.CAP_PROP_FPS)
-        self.num_frames = int(cap.get(cv.CAP_PROP_FRAME_COUNT))
+        file_frames = int(cap.get(cv.CAP_PROP_FRAME_COUNT))
         cap.release()
 
+        # The index in the video file of the clip's first frame
+        self.first_frame = int(round(self.fps * start_second))
+        self.num_frames = max(file_frames - self.first_frame, 0)
+        # The index in the video file the clip stops before, None runs to the end of the file
+        self.end_frame = None
+        if end_second is not None:
+            self.end_frame = max(int(round(self.fps * end_second)),
+                                 self.first_frame)
+            self.num_frames = min(self.num_frames,
+                                  self.end_frame - self.first_frame)
+
+        if gop_size is None:
+            gop_size = int(self.fps * 2.0)
+        self.gop_size = max(gop_size, 1)
+
+    def select_decode_mode(self, frame_interval: int) -> DecodeMode:
+        """Pick the cheapest way to step through the video at a given frame interval.
+
+        A seek has to decode from the previous keyframe, on average half a GOP of frames, while walking forward
+        decodes every frame in the interval, including the ones it skips. Walking forward wins whenever the interval
+        is shorter than that.
+
+        Args:
+            frame_interval (int): The number of frames between yielded frames.
+
+        Returns:
+            DecodeMode: Either DecodeMode.SEEK or DecodeMode.SEQUENTIAL.
+        """
+        if frame_interval <= self.gop_size / 2:
+            return DecodeMode.SEQUENTIAL
+        return DecodeMode.SEEK
+
     def frame_generator(
-            self,
-            second_interval: float = 1.0,
-            start_second: float = 0.0) -> Generator[np.ndarray, None, None]:
+        self,
+        second_interval: float = 1.0,
+        start_second: float = 0.0,
+        decode_mode: DecodeMode = DecodeMode.AUTO
+    ) -> Generator[Tuple[int, np.ndarray], None, None]:
         """Generator for extracting frames from a video.
 
         Args:
-            video_path (str): The path to the video to extract frames from
-            second_interval (int, optional): The interval in seconds between frames to yield. Defaults to 1.
-            start_second (int, optional): The time in the video to start yielding frames at. Defaults to 0.
+            second_interval (float, optional): The interval in seconds between frames to yield. Defaults to 1.
+            start_second (float, optional): The time in the video to start yielding frames at. Defaults to 0.
+            decode_mode (DecodeMode, optional): Whether to seek to every yielded frame or walk the stream forward with
+                grab(). Walking forward still decodes every frame, only the colour conversion and copy of retrieve()
+                are skipped for the frames that are not yielded, so it saves the seeks rather than the decoding. AUTO
+                picks based on the interval and GOP size, see select_decode_mode. Defaults to DecodeMode.AUTO.
 
         Yields:
-            np.ndarray: An array containing the next frame from the video
+            Tuple[int, np.ndarray]: The index of the frame and an array containing the frame
         """
+        yield from self.frame_range_generator(
+            int(self.fps * start_second), None,
+            self.frame_interval(second_interval), decode_mode)
+
+    def frame_interval(self, second_interval: float) -> int:
+        """The number of frames between yielded frames for an interval in seconds."""
+        return max(int(self.fps * second_interval), 1)
+
+    def sampled_frame_indexes(self, second_interval: float) -> range:
+        """The indexes of the frames frame_generator yields from the start of the video."""
+        return range(0, self.num_frames, self.frame_interval(second_interval))
+
+    def frame_range_generator(
+        self,
+        start_frame: int,
+        end_frame: Optional[int],
+        frame_interval: int,
+        decode_mode: DecodeMode = DecodeMode.AUTO
+    ) -> Generator[Tuple[int, np.ndarray], None, None]:
+        """Generator for extracting every frame_interval-th frame in a range of frames.
+
+        Args:
+            start_frame (int): The index of the first frame to yield.
+            end_frame (Optional[int]): The index to stop before, or None to continue to the end of the clip.
+            frame_interval (int): The number of frames between yielded frames.
+            decode_mode (DecodeMode, optional): How to step through the video, see frame_generator.
+                Defaults to DecodeMode.AUTO.
+
+        Yields:
+            Tuple[int, np.ndarray]: The index of the frame and an array containing the frame
+        """
+        if decode_mode == DecodeMode.AUTO:
+            decode_mode = self.select_decode_mode(frame_interval)
+        logger.debug(
+            f"Decoding {self.video_path} with {decode_mode=} {frame_interval=} gop_size={self.gop_size}"
+        )
+
+        # Decode with indexes in the video file, and yield them relative to the clip
+        start_frame += self.first_frame
+        if end_frame is not None:
+            end_frame += self.first_frame
+        if self.end_frame is not None:
+            end_frame = (self.end_frame if end_frame is None else min(
+                end_frame, self.end_frame))
+        if end_frame is None:
+            end_frame = sys.maxsize
 
         cap = cv.VideoCapture(self.video_path)
-        frame_interval = int(self.fps * second_interval)
-        start_frame = int(self.fps * start_second)
+        if start_frame > 0:
+            cap.set(cv.CAP_PROP_POS_FRAMES, start_frame)
+
+        if decode_mode == DecodeMode.SEQUENTIAL:
+            frames = self._sequential_frames(cap, start_frame, end_frame,
+                                             frame_interval)
+        else:
+            frames = self._seek_frames(cap, start_frame, end_frame,
+                                       frame_interval)
+        for frame_index, frame in frames:
+            yield frame_index - self.first_frame, frame
+
+        cap.release()
 
-        cap.set(cv.CAP_PROP_POS_FRAMES, start_frame)
+    @staticmethod
+    def _seek_frames(cap: cv.VideoCapture, start_frame: int, end_frame: int,
+                     frame_interval: int):
         current_frame = start_frame
 
-        while cap.isOpened():
+        while cap.isOpened() and current_frame < end_frame:
             cap.set(cv.CAP_PROP_POS_FRAMES, current_frame)
             ret, frame = cap.read()
             if not ret:
@@ -226,7 +625,204 @@ class CurlingVideo:
             yield current_frame, frame
             current_frame += frame_interval
 
-        cap.release()
+    @staticmethod
+    def _sequential_frames(cap: cv.VideoCapture, start_frame: int,
+                           end_frame: int, frame_interval: int):
+        current_frame = start_frame
+        next_frame = start_frame
+
+        # grab() decodes every frame, retrieve() only converts and copies out the frames that are yielded
+        while cap.isOpened() and next_frame < end_frame:
+            if not cap.grab():
+                break
+
+            if current_frame == next_frame:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+
+                yield current_frame, frame
+                next_frame += frame_interval
+
+            current_frame += 1
+
+
+class StreamingVideo(CurlingVideo):
+    """A clip of a video that is decoded by ffmpeg as it is downloaded.
+
+    ffmpeg reads the video straight from its url and pipes raw BGR frames back, dropping the frames that are not
+    yielded, so the first frames are ready after the first seconds of the clip have been downloaded rather than the
+    whole clip. The stream can only be read forward, every pass over the clip starts a new ffmpeg process.
+    """
+
+    seekable = False
+
+    def __init__(self,
+                 stream_url: str,
+                 start_second: float = 0.0,
+                 duration: Optional[float] = None,
+                 http_headers: Optional[dict[str, str]] = None):
+        """
+        Args:
+            stream_url (str): The url of the video stream, such as the direct media url resolved by yt-dlp.
+            start_second (float, optional): The start of the clip in the video. Defaults to 0.0.
+            duration (Optional[float], optional): The length of the clip in seconds, or None to continue to the end
+                of the video. Defaults to None.
+            http_headers (Optional[dict[str, str]], optional): Headers to send with the requests for the stream.
+                Defaults to None.
+
+        Raises:
+            ValueError: If the stream has neither a usable average nor a usable base frame rate.
+        """
+        self.video_path = stream_url
+        self.start_second = start_second
+        self.http_headers = http_headers or {}
+        # ffmpeg seeks to the start of the clip itself
+        self.first_frame = 0
+
+        stream, video_duration = self._probe()
+        self.width = int(stream["width"])
+        self.height = int(stream["height"])
+        # The average frame rate is "0/0" when ffprobe can not work it out, such as for some live streams
+        fps = (self._parse_frame_rate(stream.get("avg_frame_rate"))
+               or self._parse_frame_rate(stream.get("r_frame_rate")))
+        if fps is None:
+            raise ValueError(
+                f"Unknown frame rate for {self.video_path}: avg_frame_rate={stream.get('avg_frame_rate')} "
+                f"r_frame_rate={stream.get('r_frame_rate')}")
+        self.fps = fps
+
+        if duration is None and video_duration is not None:
+            duration = max(video_duration - start_second, 0.0)
+        self.duration = duration
+        # Unknown for a live stream, progress is not reported then
+        self.num_frames = 0
+        if duration is not None:
+            self.num_frames = int(self.fps * duration)
+        self.gop_size = max(int(self.fps * 2.0), 1)
+
+    def _header_args(self) -> List[str]:
+        if not self.http_headers:
+            return []
+        return [
+            "-headers", "".join(f"{name}: {value}\r\n"
+                                for name, value in self.http_headers.items())
+        ]
+
+    @staticmethod
+    def _parse_frame_rate(frame_rate: Optional[str]) -> Optional[float]:
+        """Parse an ffprobe frame rate such as "30000/1001", or return None if it is missing or not positive."""
+        if not frame_rate:
+            return None
+        numerator, _, denominator = frame_rate.partition("/")
+        try:
+            fps = float(numerator) / float(denominator or 1)
+        except (ValueError, ZeroDivisionError):
+            return None
+        return fps if math.isfinite(fps) and fps > 0 else None
+
+    def _probe(self) -> Tuple[dict, Optional[float]]:
+        output = subprocess.run([
+            "ffprobe", "-v", "error", *self._header_args(), "-select_streams",
+            "v:0", "-show_entries",
+            "stream=width,height,avg_frame_rate,r_frame_rate:format=duration",
+            "-of", "json", self.video_path
+        ],
+                                capture_output=True,
+                                check=True).stdout
+        probe = json.loads(output)
+        if not probe.get("streams"):
+            raise RuntimeError(f"No video stream found in {self.video_path}")
+
+        duration = probe.get("format", {}).get("duration")
+        if duration in (None, "N/A"):
+            return probe["streams"][0], None
+        return probe["streams"][0], float(duration)
+
+    def frame_range_generator(
+        self,
+        start_frame: int,
+        end_frame: Optional[int],
+        frame_interval: int,
+        decode_mode: DecodeMode = DecodeMode.AUTO
+    ) -> Generator[Tuple[int, np.ndarray], None, None]:
+        """Generator for extracting every frame_interval-th frame in a range of frames as they are downloaded.
+
+        Args:
+            start_frame (int): The index of the first frame to yield.
+            end_frame (Optional[int]): The index to stop before, or None to continue to the end of the clip.
+            frame_interval (int): The number of frames between yielded frames.
+            decode_mode (DecodeMode, optional): Unused, the stream is always decoded in order.
+                Defaults to DecodeMode.AUTO.
+
+        Raises:
+            RuntimeError: If ffmpeg fails to decode the stream.
+
+        Yields:
+            Tuple[int, np.ndarray]: The index of the frame and an array containing the frame
+        """
+        logger.debug(
+            f"Streaming {self.video_path} with {frame_interval=} {start_frame=} {end_frame=}"
+        )
+
+        if self.duration is not None:
+            end_frame = (self.num_frames if end_frame is None else min(
+                end_frame, self.num_frames))
+
+        args = [
+            "ffmpeg", "-nostdin", "-loglevel", "error", *self._header_args(),
+            "-ss", f"{self.start_second + start_frame / self.fps:.6f}"
+        ]
+        if end_frame is not None:
+            args += ["-t", f"{(end_frame - start_frame) / self.fps:.6f}"]
+        # Only the yielded frames are converted and piped back, frame numbers restart at 0 after the seek
+        args += [
+            "-i", self.video_path, "-map", "0:v:0", "-vf",
+            f"select=not(mod(n\\,{frame_interval}))", "-fps_mode",
+            "passthrough", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"
+        ]
+
+        process = subprocess.Popen(args,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        frame_size = self.width * self.height * 3
+        current_frame = start_frame
+        try:
+            while end_frame is None or current_frame < end_frame:
+                frame = bytearray(frame_size)
+                if process.stdout.readinto(frame) < frame_size:
+                    process.wait()
+                    break
+
+                yield current_frame, np.frombuffer(
+                    frame, dtype=np.uint8).reshape(self.height, self.width, 3)
+                current_frame += frame_interval
+        finally:
+            # Still running when the range ends before the stream or the caller stops early
+            stopped_early = process.poll() is None
+            if stopped_early:
+                process.kill()
+            stderr = process.communicate()[1]
+
+        if not stopped_early and process.returncode != 0:
+            raise RuntimeError(
+                f"ffmpeg failed to decode {self.video_path}: {stderr.decode(errors='replace').strip()}"
+            )
+
+
+def batched(iterable: Iterable, n: int) -> Iterator[list]:
+    """Split an iterable into lists of length n, the last list may be shorter.
+
+    Args:
+        iterable (Iterable): The items to split.
+        n (int): The length of each list.
+
+    Yields:
+        list: The next list of items.
+    """
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, n)):
+        yield batch
 
 
 def distance(p1: Tuple[float, float], p2: Tuple[float, float]) -> float:
@@ -242,30 +838,85 @@ def distance(p1: Tuple[float, float], p2: Tuple[float, float]) -> float:
     return np.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
 
 
+def overlapping_boxes(boxes: List[Tuple[float, float, float, float]],
+                      iou_threshold: float = 0.0) -> np.ndarray:
+    """Find which boxes overlap any of the other boxes.
+
+    Args:
+        boxes (List[Tuple[float, float, float, float]]): The boxes as x, y, width, height.
+        iou_threshold (float, optional): The intersection over union above which two boxes overlap. 0 counts any
+            two boxes that touch as overlapping. Defaults to 0.0.
+
+    Returns:
+        np.ndarray: A boolean for each box, True when it overlaps another box.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+
+    if iou_threshold <= 0.0:
+        overlaps = ((x2[:, np.newaxis] > x1[np.newaxis, :]) &
+                    (x1[:, np.newaxis] < x2[np.newaxis, :]) &
+                    (y2[:, np.newaxis] > y1[np.newaxis, :]) &
+                    (y1[:, np.newaxis] < y2[np.newaxis, :]))
+    else:
+        intersection_width = np.clip(
+            np.minimum(x2[:, np.newaxis], x2[np.newaxis, :]) -
+            np.maximum(x1[:, np.newaxis], x1[np.newaxis, :]), 0.0, None)
+        intersection_height = np.clip(
+            np.minimum(y2[:, np.newaxis], y2[np.newaxis, :]) -
+            np.maximum(y1[:, np.newaxis], y1[np.newaxis, :]), 0.0, None)
+        intersection = intersection_width * intersection_height
+        area = boxes[:, 2] * boxes[:, 3]
+        union = area[:, np.newaxis] + area[np.newaxis, :] - intersection
+        overlaps = intersection > iou_threshold * union
+
+    np.fill_diagonal(overlaps, False)
+    return overlaps.any(axis=1)
+
+
+class DetectorBackend(str, Enum):
+    PYTORCH = "pytorch"
+    ONNX = "onnx"
+    OPENVINO = "openvino"
+
+
 class StoneDetector:
     """
     A class for detecting curling stones in images using a YOLO model and converting to world coordinates.
     """
 
-    def __init__(self, model_path: str):
-        self.model = YOLO(model_path)
-
-    def is_overlapping(self, detection, all_detections):
-        x, y, width, height = detection.image_coordinates
-
-        for other in all_detections:
-            if other is detection:
-                continue
-
-            ox, oy, owidth, oheight = other.image_coordinates
+    # The confidence threshold used when a camera's inference profile does not set one
+    DEFAULT_CONFIDENCE = 0.75
 
-            overlap_x = not (x + width <= ox or x >= ox + owidth)
-            overlap_y = not (y + height <= oy or y >= oy + oheight)
+    def __init__(self,
+                 model_path: str,
+                 model_hash: Optional[str] = None,
+                 overlap_iou_threshold: float = 0.0):
+        """
+        Args:
+            model_path (str): The path to the YOLO model. Either PyTorch .pt weights, an exported .onnx file, or an
+                exported OpenVINO model folder.
+            model_hash (Optional[str], optional): A hash of the model weights identifying this model version.
+                Defaults to None.
+            overlap_iou_threshold (float, optional): The IoU above which two detections are flagged as overlapping.
+                0 flags any two boxes that touch. Defaults to 0.0.
+        """
+        self.model_path = model_path
+        self.model_hash = model_hash
+        self.overlap_iou_threshold = overlap_iou_threshold
+        # Exported models do not record their task, so tell ultralytics they are detection models
+        self.model = YOLO(model_path, task="detect")
+        # The ultralytics predictor keeps per-call state, so concurrent requests sharing a detector take turns
+        self.predict_lock = threading.Lock()
 
-            if overlap_x and overlap_y:
-                return True
+    def warm_up(self, image_shape: Tuple[int, int] = (640, 640)):
+        """Run a dummy inference so the first real request does not pay for predictor setup.
 
-        return False
+        Args:
+            image_shape (Tuple[int, int], optional): The height and width of the dummy image. Defaults to (640, 640).
+        """
+        self.predict([np.zeros((*image_shape, 3), dtype=np.uint8)])
 
     def convert_to_sheet_coords(
         self, camera: camera_utilities.Camera,
@@ -307,6 +958,32 @@ class StoneDetector:
 
         return []
 
+    def predict(self,
+                images: List[np.ndarray],
+                imgsz: Optional[int] = None,
+                conf: Optional[float] = None) -> list:
+        """Run the model on a batch of images in a single forward pass.
+
+        Args:
+            images (List[np.ndarray]): The images to run the model on.
+            imgsz (Optional[int], optional): The image size to letterbox the images to. None uses the ultralytics
+                default. Defaults to None.
+            conf (Optional[float], optional): The confidence threshold. None uses DEFAULT_CONFIDENCE.
+                Defaults to None.
+
+        Returns:
+            list: The ultralytics result for each image, in the same order as the images.
+        """
+        kwargs = {"imgsz": imgsz} if imgsz is not None else {}
+        with self.predict_lock:
+            return self.model.predict(
+                source=images,
+                save=False,
+                save_txt=False,
+                conf=conf if conf is not None else self.DEFAULT_CONFIDENCE,
+                verbose=False,
+                **kwargs)
+
     def detect_stones(self, camera: camera_utilities.Camera,
                       image: np.ndarray) -> List[StoneDetection]:
         """Detect curling stones in an image and return their position in world coordinates
@@ -318,145 +995,297 @@ class StoneDetector:
         Returns:
             List: The resulting list of stone locations.
         """
-        stone_boxes = {}
-        stone_boxes[StoneClass.GREEN] = []
-        stone_boxes[StoneClass.YELLOW] = []
-        results = self.model.predict(source=image,
-                                     save=False,
-                                     save_txt=False,
-                                     conf=0.75,
-                                     verbose=False)
-        for result in results:
-            for box in result.boxes:
-                x1, y1, x2, y2 = box.xyxy[0]
-                width = int(x2 - x1)
-                height = int(y2 - y1)
-                class_id = StoneClass(int(box.cls[0]))
-                stone_boxes[class_id].append((int(x1), int(y1), width, height))
+        return self.detect_stones_batch([camera], [image])[0]
 
-        stones = []
-        # Add stones to list
-        if len(stone_boxes[StoneClass.GREEN]) != 0:
-            green_sheet_coords = self.convert_to_sheet_coords(
-                camera, stone_boxes[StoneClass.GREEN])
+    def detect_stones_batch(
+            self,
+            cameras: List[camera_utilities.Camera],
+            images: List[np.ndarray],
+            max_batch_size: Optional[int] = None
+    ) -> List[List[StoneDetection]]:
+        """Detect curling stones in several images with as few forward passes as possible.
 
-            for image_coords, sheet_coords in zip(
-                    stone_boxes[StoneClass.GREEN], green_sheet_coords):
-                stones.append(
-                    StoneDetection(StoneClass.GREEN, image_coords,
-                                   sheet_coords, False))
+        Args:
+            cameras (List[camera_utilities.Camera]): The camera each image came from.
+            images (List[np.ndarray]): The images to detect stones in.
+            max_batch_size (Optional[int], optional): The maximum number of images per forward pass. None puts all
+                the images in one pass. Defaults to None.
 
-        if len(stone_boxes[StoneClass.YELLOW]) != 0:
-            yellow_sheet_coords = self.convert_to_sheet_coords(
-                camera, stone_boxes[StoneClass.YELLOW])
+        Returns:
+            List[List[StoneDetection]]: The stone detections for each image, in the same order as the images.
+        """
+        return [
+            self.stones_from_boxes(camera, boxes) for camera, boxes in zip(
+                cameras,
+                self.detect_boxes_batch(
+                    images, max_batch_size,
+                    [camera.inference_profile for camera in cameras]))
+        ]
+
+    def detect_boxes_batch(
+        self,
+        images: List[np.ndarray],
+        max_batch_size: Optional[int] = None,
+        profiles: Optional[List[camera_utilities.InferenceProfile]] = None
+    ) -> List[np.ndarray]:
+        """Detect the image space boxes of the curling stones in several images.
+
+        The images with the same inference profile share forward passes. Images with a resize width are shrunk to it
+        first and their boxes are scaled back to the original image.
+
+        Args:
+            images (List[np.ndarray]): The images to detect stones in.
+            max_batch_size (Optional[int], optional): The maximum number of images per forward pass. None puts all
+                the images in one pass. Defaults to None.
+            profiles (Optional[List[camera_utilities.InferenceProfile]], optional): The inference profile of each
+                image. None uses the default profile for every image. Defaults to None.
+
+        Returns:
+            List[np.ndarray]: The boxes for each image, in the same order as the images. See boxes_from_result.
+        """
+        if max_batch_size is None or max_batch_size <= 0:
+            max_batch_size = max(len(images), 1)
+        if profiles is None:
+            profiles = [camera_utilities.InferenceProfile()] * len(images)
+
+        profile_indexes = {}
+        for i, profile in enumerate(profiles):
+            profile_indexes.setdefault(profile, []).append(i)
+
+        boxes = [None] * len(images)
+        for profile, indexes in profile_indexes.items():
+            profile_images = []
+            scales = []
+            for i in indexes:
+                image = images[i]
+                scale = 1.0
+                if (profile.resize_width is not None
+                        and image.shape[1] != profile.resize_width):
+                    scale = profile.resize_width / image.shape[1]
+                    image = cv.resize(image,
+                                      (profile.resize_width,
+                                       max(round(image.shape[0] * scale), 1)),
+                                      interpolation=cv.INTER_AREA
+                                      if scale < 1.0 else cv.INTER_LINEAR)
+                profile_images.append(image)
+                scales.append(scale)
+
+            for start in range(0, len(indexes), max_batch_size):
+                results = self.predict(
+                    profile_images[start:start + max_batch_size],
+                    profile.imgsz, profile.confidence)
+                for i, scale, result in zip(
+                        indexes[start:start + max_batch_size],
+                        scales[start:start + max_batch_size], results):
+                    boxes[i] = self.boxes_from_result(result, scale)
+
+        return boxes
+
+    @staticmethod
+    def boxes_from_result(result, scale: float = 1.0) -> np.ndarray:
+        """Get the raw boxes from the ultralytics result for a single image.
+
+        Args:
+            result: The ultralytics result for the image.
+            scale (float, optional): How much the image was resized before detection. The boxes are divided by it
+                to put them back in the original image. Defaults to 1.0.
 
-            for image_coords, sheet_coords in zip(
-                    stone_boxes[StoneClass.YELLOW], yellow_sheet_coords):
+        Returns:
+            np.ndarray: An int32 row of class id, x, y, width, height for each box.
+        """
+        boxes = []
+        for box in result.boxes:
+            x1, y1, x2, y2 = box.xyxy[0] / scale
+            boxes.append((int(box.cls[0]), int(x1), int(y1), int(x2 - x1),
+                          int(y2 - y1)))
+        return np.array(boxes, dtype=np.int32).reshape(-1, 5)
+
+    def stones_from_result(self, camera: camera_utilities.Camera,
+                           result) -> List[StoneDetection]:
+        """Convert the ultralytics result for a single image into stone detections.
+
+        Args:
+            camera (Camera): The camera that the image came from.
+            result: The ultralytics result for the image.
+
+        Returns:
+            List[StoneDetection]: The resulting list of stone locations.
+        """
+        return self.stones_from_boxes(camera, self.boxes_from_result(result))
+
+    def stones_from_boxes(self, camera: camera_utilities.Camera,
+                          boxes: np.ndarray) -> List[StoneDetection]:
+        """Convert the raw boxes for a single image into stone detections.
+
+        Args:
+            camera (Camera): The camera that the image came from.
+            boxes (np.ndarray): The boxes from boxes_from_result.
+
+        Returns:
+            List[StoneDetection]: The resulting list of stone locations.
+        """
+        stones = []
+        # Add stones to list
+        for stone_class in [StoneClass.GREEN, StoneClass.YELLOW]:
+            class_boxes = [
+                tuple(box) for box in boxes[boxes[:, 0] == stone_class.value,
+                                            1:5].tolist()
+            ]
+            if len(class_boxes) == 0:
+                continue
+
+            class_sheet_coords = self.convert_to_sheet_coords(
+                camera, class_boxes)
+            for image_coords, sheet_coords in zip(class_boxes,
+                                                  class_sheet_coords):
                 stones.append(
-                    StoneDetection(StoneClass.YELLOW, image_coords,
-                                   sheet_coords, False))
+                    StoneDetection(stone_class, image_coords, sheet_coords,
+                                   False))
 
         #Update the overlapping check now that we have all the detections
-        for stone in stones:
-            stone.overlapping = self.is_overlapping(stone, stones)
+        overlapping = overlapping_boxes(
+            [stone.image_coordinates for stone in stones],
+            self.overlap_iou_threshold)
+        for stone, stone_overlapping in zip(stones, overlapping):
+            stone.overlapping = bool(stone_overlapping)
 
         return stones
 
 
+# The stone filter state is [x, y, vx, vy, ax, ay] and only the position is measured
+STONE_MEASUREMENT_FUNCTION = np.array([[1., 0., 0., 0., 0., 0.],
+                                       [0., 1., 0., 0., 0., 0.]])
+STONE_MEASUREMENT_NOISE = np.eye(2) * 0.25
+STONE_INITIAL_COVARIANCE = np.diag([0.25, 0.25, 10., 10., 10., 10.])
+
+
+def stone_transition_matrices(dt: float) -> Tuple[np.ndarray, np.ndarray]:
+    """The constant acceleration transition function and process noise of the stone filters.
+
+    Args:
+        dt (float): The timestep of the filter.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The state transition matrix F and the process noise Q.
+    """
+    f_x = [1., 0., dt, 0., 0.5 * dt**2, 0.]
+    f_y = [0., 1., 0., dt, 0., 0.5 * dt**2]
+    f_vx = [0., 0., 1., 0., dt, 0.]
+    f_vy = [0., 0., 0., 1., 0., dt]
+    f_ax = [0., 0., 0., 0., 1., 0.]
+    f_ay = [0., 0., 0., 0., 0., 1.]
+    F = np.array([f_x, f_y, f_vx, f_vy, f_ax, f_ay])
+
+    Q = Q_discrete_white_noise(dim=2,
+                               dt=dt,
+                               var=0.1,
+                               block_size=3,
+                               order_by_dim=False)
+    return F, Q
+
+
+def create_stone_filter_bank(dt: float) -> KalmanFilterBank:
+    return KalmanFilterBank(STONE_MEASUREMENT_FUNCTION,
+                            STONE_MEASUREMENT_NOISE, stone_transition_matrices,
+                            dt)
+
+
 class Stone:
+    """A tracked stone and the history of its filtered state.
 
-    def __init__(self, color: StoneClass, initial_position: Tuple[float,
-                                                                  float],
-                 initial_time: float, filter_timestep: float):
+    The history is kept in preallocated arrays that double in size when full, with the kinematics as float32 rows
+    of [x, y, vx, vy, ax, ay] and the times as float64, rather than lists of tuples of NumPy scalars.
+    """
+
+    __slots__ = ("color", "filter_bank", "filter_index",
+                 "last_measurement_time", "active", "num_frames_visible",
+                 "max_speed", "_kinematics", "_times", "_length")
+
+    def __init__(self,
+                 color: StoneClass,
+                 initial_position: Tuple[float, float],
+                 initial_time: float,
+                 filter_bank: KalmanFilterBank,
+                 initial_capacity: int = 64):
         self.color = color
-        self.filter_timestep = filter_timestep
-        self.filter = self.create_stone_filter(initial_position,
-                                               filter_timestep)
-        self.position_history = [initial_position]
-        self.velocity_history = [(0.0, 0.0)]
-        self.acceleration_history = [(0.0, 0.0)]
-        self.time_history = [initial_time]
+        self.filter_bank = filter_bank
+        self.filter_index = filter_bank.add(
+            [initial_position[0], initial_position[1], 0., 0., 0., 0.],
+            STONE_INITIAL_COVARIANCE)
         self.last_measurement_time = initial_time
         self.active = True
         self.num_frames_visible = 0
+        self.max_speed = 0.0
 
-    def get_max_velocity(self):
-        if len(self.velocity_history) == 0:
-            return 0.0
-        return max(np.sqrt(v[0]**2 + v[1]**2) for v in self.velocity_history)
-
-    @classmethod
-    def create_stone_filter(cls, initial_position, dt):
-        #x = [x,y,vx,vy,ax,ay]
-        filter = KalmanFilter(dim_x=6, dim_z=2)
+        self._kinematics = np.zeros((max(initial_capacity, 1), 6),
+                                    dtype=np.float32)
+        self._times = np.zeros(max(initial_capacity, 1), dtype=np.float64)
+        self._kinematics[0, 0:2] = initial_position[0:2]
+        self._times[0] = initial_time
+        self._length = 1
 
-        #initial value
-        filter.x = np.array(
-            [initial_position[0], initial_position[1], 0., 0., 0., 0.])
+    @property
+    def position_history(self) -> np.ndarray:
+        return self._kinematics[:self._length, 0:2]
 
-        #Transition function
-        f_x = [1., 0., dt, 0., 0.5 * dt**2, 0.]
-        f_y = [0., 1., 0., dt, 0., 0.5 * dt**2]
-        f_vx = [0., 0., 1., 0., dt, 0.]
-        f_vy = [0., 0., 0., 1., 0., dt]
-        f_ax = [0., 0., 0., 0., 1., 0.]
-        f_ay = [0., 0., 0., 0., 0., 1.]
-        filter.F = np.array([f_x, f_y, f_vx, f_vy, f_ax, f_ay])
+    @property
+    def velocity_history(self) -> np.ndarray:
+        return self._kinematics[:self._length, 2:4]
 
-        #Measurement function
-        filter.H = np.array([[1., 0., 0., 0., 0., 0.],
-                             [0., 1., 0., 0., 0., 0.]])
+    @property
+    def acceleration_history(self) -> np.ndarray:
+        return self._kinematics[:self._length, 4:6]
 
-        #Covariance matrix
-        filter.P = np.eye(6) * 10
-        filter.P[0, 0] = 0.25
-        filter.P[1, 1] = 0.25
+    @property
+    def time_history(self) -> np.ndarray:
+        return self._times[:self._length]
 
-        filter.R = np.eye(2) * 0.25
-
-        filter.Q = Q_discrete_white_noise(dim=2,
-                                          dt=dt,
-                                          var=0.1,
-                                          block_size=3,
-                                          order_by_dim=False)
-
-        return filter
+    def get_max_velocity(self) -> float:
+        return self.max_speed
 
     def update_active_status(self, current_time: float):
         if current_time - self.last_measurement_time > 1.0:
             self.active = False
 
-    def add_measurement(self, position: Tuple[float, float], time: float):
+    def add_measurement(self, time: float):
+        """Record that the stone was measured. The filter itself is updated by GameState for all stones at once."""
         if self.last_measurement_time is None or time > self.last_measurement_time:
             self.num_frames_visible += 1
 
-        self.filter.update([position[0], position[1]])
         self.last_measurement_time = time
         self.active = True
 
-    def update_filter(self, time: float):
-        self.update_active_status(time)
-        if self.active:
-            self.filter.predict()
-            self.position_history.append((self.filter.x[0], self.filter.x[1]))
-            self.velocity_history.append((self.filter.x[2], self.filter.x[3]))
-            self.acceleration_history.append(
-                (self.filter.x[4], self.filter.x[5]))
-            self.time_history.append(time)
+    def record_filter_state(self, time: float):
+        if self._length == len(self._times):
+            self._kinematics = np.concatenate(
+                (self._kinematics, np.zeros_like(self._kinematics)))
+            self._times = np.concatenate(
+                (self._times, np.zeros_like(self._times)))
+
+        x = self.filter_bank.x[self.filter_index]
+        self._kinematics[self._length] = x
+        self._times[self._length] = time
+        self._length += 1
+        speed = math.hypot(x[2], x[3])
+        if speed > self.max_speed:
+            self.max_speed = speed
 
     def get_latest_position(self) -> Tuple[float, float]:
-        return self.position_history[-1]
+        return tuple(self._kinematics[self._length - 1, 0:2].tolist())
+
+    def get_latest_velocity(self) -> Tuple[float, float]:
+        return tuple(self._kinematics[self._length - 1, 2:4].tolist())
 
     def get_latest_time(self) -> float:
-        return self.time_history[-1]
+        return float(self._times[self._length - 1])
 
     def dict_for_json(self) -> dict:
         return {
             "color": self.color.name.lower(),
-            "position_history": self.position_history,
-            "velocity_history": self.velocity_history,
-            "acceleration_history": self.acceleration_history,
-            "time_history": self.time_history,
+            "position_history": self.position_history.tolist(),
+            "velocity_history": self.velocity_history.tolist(),
+            "acceleration_history": self.acceleration_history.tolist(),
+            "time_history": self.time_history.tolist(),
         }
 
 
@@ -489,65 +1318,879 @@ def bhattacharyya_distance_gaussian(mu1: np.ndarray, mu2: np.ndarray,
     return term1 + term2
 
 
-def mosaic_image_detect_stones(
-    camera_setup: CameraSetup, image: np.ndarray,
-    stone_detectors: dict[camera_utilities.CameraType, StoneDetector]
-) -> MosaicStoneDetections:
-    all_detections = MosaicStoneDetections({}, {})
+def split_mosaic_image(camera_setup: CameraSetup,
+                       image: np.ndarray) -> dict[str, np.ndarray]:
+    """Split a mosaic image into the images for each camera in the setup.
+
+    Args:
+        camera_setup (CameraSetup): The camera setup describing the mosaic.
+        image (np.ndarray): The mosaic image.
+
+    Returns:
+        dict[str, np.ndarray]: The image for each camera keyed by camera name.
+    """
+    return {
+        camera.name: camera.extract_image(image)
+        for camera in camera_setup.cameras
+    }
 
-    for i, camera in enumerate(camera_setup.cameras):
-        # Split image for this camera
-        split_image = camera.extract_image(image)
-        detections = stone_detectors[camera.camera_type].detect_stones(
-            camera, split_image)
 
-        all_detections.images[camera.name] = split_image
-        all_detections.detections[camera.name] = detections
+def camera_images_detect_stones(
+        camera_setup: CameraSetup,
+        camera_images: dict[str, np.ndarray],
+        stone_detectors: dict[camera_utilities.CameraType, StoneDetector],
+        max_batch_size: Optional[int] = None) -> MosaicStoneDetections:
+    """Detect stones in images that have already been split out of a mosaic image.
+
+    Args:
+        camera_setup (CameraSetup): The camera setup the images came from.
+        camera_images (dict[str, np.ndarray]): The image for each camera keyed by camera name.
+        stone_detectors (dict[camera_utilities.CameraType, StoneDetector]): The detector to use for each camera type.
+        max_batch_size (Optional[int], optional): The maximum number of images per forward pass. Defaults to None.
+
+    Returns:
+        MosaicStoneDetections: The images and detections for each camera.
+    """
+    return camera_images_batch_detect_stones(camera_setup, [camera_images],
+                                             stone_detectors,
+                                             max_batch_size)[0]
+
+
+def camera_images_batch_detect_stones(
+        camera_setup: CameraSetup,
+        camera_images_batch: List[dict[str, np.ndarray]],
+        stone_detectors: dict[camera_utilities.CameraType, StoneDetector],
+        max_batch_size: Optional[int] = None,
+        frame_indexes: Optional[List[int]] = None,
+        detection_cache: Optional[RawDetectionCache] = None,
+        motion_gate: Optional[MotionGate] = None
+) -> List[MosaicStoneDetections]:
+    """Detect stones in the camera images of several frames.
+
+    The images of every camera with the same camera type, across all the frames, are run through their detector
+    together so each detector does as few forward passes as possible. With a detection cache, only the images whose
+    boxes are not cached go through the detector, the rest are converted to sheet coordinates from the cached boxes.
+    With a motion gate, uncached images that have not changed since their camera's last detected image reuse its
+    boxes instead of going through the detector.
+
+    Args:
+        camera_setup (CameraSetup): The camera setup the images came from.
+        camera_images_batch (List[dict[str, np.ndarray]]): The image for each camera keyed by camera name, for
+            each frame.
+        stone_detectors (dict[camera_utilities.CameraType, StoneDetector]): The detector to use for each camera type.
+        max_batch_size (Optional[int], optional): The maximum number of images per forward pass. Defaults to None.
+        frame_indexes (Optional[List[int]], optional): The index in the video of each frame, needed to use the
+            detection cache. Defaults to None.
+        detection_cache (Optional[RawDetectionCache], optional): The raw detector boxes of the video's frames.
+            Defaults to None.
+        motion_gate (Optional[MotionGate], optional): The motion gate of the video, given the frames in order.
+            Defaults to None.
+
+    Returns:
+        List[MosaicStoneDetections]: The images and detections for each camera, for each frame.
+    """
+    all_detections = [
+        MosaicStoneDetections({}, {}) for _ in camera_images_batch
+    ]
+
+    camera_type_batches = {}
+    for frame_idx, camera_images in enumerate(camera_images_batch):
+        for camera in camera_setup.cameras:
+            camera_type_batches.setdefault(camera.camera_type, []).append(
+                (frame_idx, camera, camera_images[camera.name]))
+
+    for camera_type, batch in camera_type_batches.items():
+        stone_detector = stone_detectors[camera_type]
+        use_cache = (detection_cache is not None and frame_indexes is not None
+                     and stone_detector.model_hash is not None)
+
+        boxes = [None] * len(batch)
+        if use_cache:
+            for i, (frame_idx, camera, _) in enumerate(batch):
+                boxes[i] = detection_cache.get(frame_indexes[frame_idx],
+                                               camera,
+                                               stone_detector.model_hash)
+
+        # The batch is in frame order, so a camera's reference image may be one detected earlier in this batch
+        reference_indexes = {}
+        gated = []
+        if motion_gate is not None:
+            for i, (_, camera, image) in enumerate(batch):
+                if boxes[i] is not None:
+                    continue
+                boxes_available = (camera.name in reference_indexes or
+                                   motion_gate.boxes(camera.name) is not None)
+                if motion_gate.check(camera.name, image, boxes_available):
+                    motion_gate.hits += 1
+                    gated.append((i, reference_indexes.get(camera.name)))
+                else:
+                    motion_gate.misses += 1
+                    reference_indexes[camera.name] = i
+
+        gated_indexes = set(i for i, _ in gated)
+        uncached = [
+            i for i, box in enumerate(boxes)
+            if box is None and i not in gated_indexes
+        ]
+        detected_boxes = stone_detector.detect_boxes_batch(
+            [batch[i][2] for i in uncached], max_batch_size,
+            [batch[i][1].inference_profile for i in uncached])
+        for i, image_boxes in zip(uncached, detected_boxes):
+            boxes[i] = image_boxes
+            if use_cache:
+                frame_idx, camera, _ = batch[i]
+                detection_cache.put(frame_indexes[frame_idx], camera,
+                                    stone_detector.model_hash, image_boxes)
+
+        for i, reference_index in gated:
+            camera = batch[i][1]
+            boxes[i] = (boxes[reference_index] if reference_index is not None
+                        else motion_gate.boxes(camera.name))
+        for camera_name, reference_index in reference_indexes.items():
+            motion_gate.set_boxes(camera_name, boxes[reference_index])
+
+        for (frame_idx, camera, image), image_boxes in zip(batch, boxes):
+            all_detections[frame_idx].images[camera.name] = image
+            all_detections[frame_idx].detections[
+                camera.name] = stone_detector.stones_from_boxes(
+                    camera, image_boxes)
+
+    # Keep the cameras in setup order regardless of how they were batched
+    for mosaic_detection in all_detections:
+        mosaic_detection.images = {
+            camera.name: mosaic_detection.images[camera.name]
+            for camera in camera_setup.cameras
+        }
+        mosaic_detection.detections = {
+            camera.name: mosaic_detection.detections[camera.name]
+            for camera in camera_setup.cameras
+        }
 
     return all_detections
 
 
+def mosaic_image_detect_stones(
+        camera_setup: CameraSetup,
+        image: np.ndarray,
+        stone_detectors: dict[camera_utilities.CameraType, StoneDetector],
+        max_batch_size: Optional[int] = None) -> MosaicStoneDetections:
+    return camera_images_detect_stones(camera_setup,
+                                       split_mosaic_image(camera_setup, image),
+                                       stone_detectors, max_batch_size)
+
+
+STONE_DETECTOR_FILENAMES = {
+    camera_utilities.CameraType.TOP_DOWN: "top_down_stone_detector.pt",
+    camera_utilities.CameraType.ANGLED: "angled_stone_detector.pt",
+}
+
+
+def stone_detector_model_path(
+        model_dir: str,
+        camera_type: camera_utilities.CameraType,
+        backend: DetectorBackend = DetectorBackend.PYTORCH) -> str:
+    """Find the path of the stone detector model for a camera type and backend.
+
+    The exported models use the file names ultralytics gives them when exporting the .pt weights in place.
+
+    Args:
+        model_dir (str): The folder containing the stone detector models.
+        camera_type (camera_utilities.CameraType): The camera type the model is for.
+        backend (DetectorBackend, optional): The inference backend. Defaults to DetectorBackend.PYTORCH.
+
+    Returns:
+        str: The path to the model file or folder.
+    """
+    stem = os.path.splitext(STONE_DETECTOR_FILENAMES[camera_type])[0]
+    if backend == DetectorBackend.ONNX:
+        return os.path.join(model_dir, stem + ".onnx")
+    elif backend == DetectorBackend.OPENVINO:
+        return os.path.join(model_dir, stem + "_openvino_model")
+    return os.path.join(model_dir, stem + ".pt")
+
+
 def get_stone_detectors(
-        model_dir: str) -> dict[camera_utilities.CameraType, StoneDetector]:
+    model_dir: str,
+    backend: DetectorBackend = DetectorBackend.PYTORCH,
+    camera_type_backends: Optional[dict[camera_utilities.CameraType,
+                                        DetectorBackend]] = None
+) -> dict[camera_utilities.CameraType, StoneDetector]:
+    """Load a stone detector for each camera type.
+
+    Args:
+        model_dir (str): The folder containing the stone detector models.
+        backend (DetectorBackend, optional): The inference backend to use. Defaults to DetectorBackend.PYTORCH.
+        camera_type_backends (Optional[dict[camera_utilities.CameraType, DetectorBackend]], optional): Backends
+            overriding backend for specific camera types. Defaults to None.
+
+    Returns:
+        dict[camera_utilities.CameraType, StoneDetector]: The detector for each camera type.
+    """
+    camera_type_backends = camera_type_backends or {}
+
     detectors = {}
-    detectors[camera_utilities.CameraType.TOP_DOWN] = StoneDetector(
-        os.path.join(model_dir, "top_down_stone_detector.pt"))
-    detectors[camera_utilities.CameraType.ANGLED] = StoneDetector(
-        os.path.join(model_dir, "angled_stone_detector.pt"))
+    for camera_type in STONE_DETECTOR_FILENAMES:
+        detectors[camera_type] = StoneDetector(
+            stone_detector_model_path(
+                model_dir, camera_type,
+                camera_type_backends.get(camera_type, backend)))
 
     return detectors
 
 
+class AdaptiveSampler:
+    """Decides when to track a video densely, and counts the frames detected and skipped.
+
+    Stones are at rest for most of a game, so while nothing moves only one probe frame every idle_interval seconds
+    is detected. A probe shows motion when a tracked stone is moving, or when its detections and the active stones
+    no longer line up, i.e. a stone has appeared, gone, or moved more than match_distance. Tracking then stays dense
+    until no stone has moved for hold_time seconds.
+
+    The results are not expected to match dense sampling. The Kalman filters see fewer measurements, and the large
+    time steps across idle intervals change their state, so the stones have fewer history samples and their
+    velocities and maximum speeds differ, most of all around the start of a throw. Use
+    scripts/benchmark_adaptive_sampling.py to compare the two on a video.
+    """
+
+    def __init__(self,
+                 idle_interval: float = 1.0,
+                 moving_speed: float = 1.0,
+                 match_distance: float = 1.0,
+                 hold_time: float = 2.0):
+        """
+        Args:
+            idle_interval (float, optional): The seconds between probe frames while nothing moves. It should not be
+                more than the 1 second a stone stays active without being detected. Defaults to 1.0.
+            moving_speed (float, optional): The speed in feet per second above which a stone is moving.
+                Defaults to 1.0.
+            match_distance (float, optional): The furthest in feet a probe detection can be from an active stone of
+                its color, and the reverse, without counting as motion. Defaults to 1.0.
+            hold_time (float, optional): The seconds to keep tracking densely after the last motion.
+                Defaults to 2.0.
+        """
+        self.idle_interval = idle_interval
+        self.moving_speed = moving_speed
+        self.match_distance = match_distance
+        self.hold_time = hold_time
+
+        self.detected_frames = 0
+        self.skipped_frames = 0
+        self.backfills = 0
+
+    def stones_moving(self, state: GameState) -> bool:
+        """Whether any active stone is moving faster than moving_speed."""
+        return any(
+            math.hypot(*stone.get_latest_velocity()) > self.moving_speed
+            for stone in state.active_stones.values())
+
+    def motion_detected(self, state: GameState,
+                        mosaic_detection: MosaicStoneDetections) -> bool:
+        """Whether the detections of a probe frame show motion since the tracking state was last updated.
+
+        Args:
+            state (GameState): The tracking state before the probe frame.
+            mosaic_detection (MosaicStoneDetections): The detections of the probe frame.
+
+        Returns:
+            bool: True if the frames before the probe should be tracked densely.
+        """
+        if self.stones_moving(state):
+            return True
+
+        detections = [
+            detection
+            for camera_detections in mosaic_detection.detections.values()
+            for detection in GameState.trackable_detections(camera_detections)
+        ]
+        for color in StoneClass:
+            detection_positions = np.array([
+                detection.sheet_coordinates[:2]
+                for detection in detections if detection.color == color
+            ],
+                                           dtype=np.float64).reshape(-1, 2)
+            stone_positions = np.array([
+                stone.get_latest_position()
+                for stone in state.active_stones.values()
+                if stone.color == color
+            ],
+                                       dtype=np.float64).reshape(-1, 2)
+
+            if len(detection_positions) == 0 and len(stone_positions) == 0:
+                continue
+            if len(detection_positions) == 0 or len(stone_positions) == 0:
+                return True
+
+            distances = np.linalg.norm(detection_positions[:, np.newaxis, :] -
+                                       stone_positions[np.newaxis, :, :],
+                                       axis=2)
+            if (np.any(distances.min(axis=1) > self.match_distance)
+                    or np.any(distances.min(axis=0) > self.match_distance)):
+                return True
+
+        return False
+
+    def dict_for_json(self) -> dict:
+        return {
+            "detected_frames": self.detected_frames,
+            "skipped_frames": self.skipped_frames,
+            "backfills": self.backfills,
+        }
+
+
 def video_stone_tracker(camera_setup: CameraSetup,
                         video: CurlingVideo,
                         stone_detectors: dict[camera_utilities.CameraType,
                                               StoneDetector],
-                        image_save_interval: float = -1.0) -> TrackingResults:
+                        image_save_interval: float = -1.0,
+                        motion_gate: Optional[MotionGate] = None,
+                        adaptive_sampler: Optional[AdaptiveSampler] = None,
+                        **kwargs) -> TrackingResults:
+    """Track the stones in a video.
 
-    second_interval = 0.1
+    Args:
+        camera_setup (CameraSetup): The camera setup of the video.
+        video (CurlingVideo): The video to track.
+        stone_detectors (dict[camera_utilities.CameraType, StoneDetector]): The detector to use for each camera type.
+        image_save_interval (float, optional): The interval in seconds between saved mosaic detections. A negative
+            value saves none. Defaults to -1.0.
+        motion_gate (Optional[MotionGate], optional): When given, camera images that have not changed since their
+            last detection reuse its boxes, and the gate's counts are reported in the results. Defaults to None.
+        adaptive_sampler (Optional[AdaptiveSampler], optional): When given, the video is only tracked densely around
+            stone motion, and the sampler's counts are reported in the results. Defaults to None.
+        **kwargs: Passed on to video_stone_tracker_stream.
 
-    state = GameState(second_interval)
+    Returns:
+        TrackingResults: The tracked stones and the saved mosaic detections.
+    """
     detection_times = []
     mosaic_detections = []
 
-    for frame_index, frame in video.frame_generator(
-            second_interval=second_interval):
-        frame_time = float(frame_index) / video.fps
+    stream = video_stone_tracker_stream(camera_setup,
+                                        video,
+                                        stone_detectors,
+                                        image_save_interval,
+                                        motion_gate=motion_gate,
+                                        adaptive_sampler=adaptive_sampler,
+                                        **kwargs)
+    while True:
+        try:
+            update = next(stream)
+        except StopIteration as stop:
+            state = stop.value
+            break
+
+        if update.mosaic_detection is not None:
+            detection_times.append(update.frame_time)
+            mosaic_detections.append(update.mosaic_detection)
+
+    return TrackingResults(
+        state, detection_times, mosaic_detections,
+        motion_gate.dict_for_json() if motion_gate is not None else None,
+        adaptive_sampler.dict_for_json()
+        if adaptive_sampler is not None else None)
+
+
+def video_stone_tracker_stream(
+    camera_setup: CameraSetup,
+    video: CurlingVideo,
+    stone_detectors: dict[camera_utilities.CameraType, StoneDetector],
+    image_save_interval: float = -1.0,
+    prefetch_depth: int = 0,
+    frame_batch_size: int = 1,
+    max_batch_size: Optional[int] = None,
+    progress_callback: Optional[Callable[[float], None]] = None,
+    image_store: Optional[ImageStore] = None,
+    detection_cache: Optional[RawDetectionCache] = None,
+    num_workers: int = 0,
+    motion_gate: Optional[MotionGate] = None,
+    adaptive_sampler: Optional[AdaptiveSampler] = None,
+    shard_pool: Optional["ShardWorkerPool"] = None,
+    second_interval: float = 0.1
+) -> Generator[TrackingUpdate, None, GameState]:
+    """Track the stones in a video, yielding the tracking state as each frame is processed.
+
+    Nothing but the tracking state is kept between frames, so saved mosaic detections are only available from the
+    update they are yielded in.
+
+    Args:
+        camera_setup (CameraSetup): The camera setup of the video.
+        video (CurlingVideo): The video to track.
+        stone_detectors (dict[camera_utilities.CameraType, StoneDetector]): The detector to use for each camera type.
+        image_save_interval (float, optional): The interval in seconds between saved mosaic detections. A negative
+            value saves none. Defaults to -1.0.
+        prefetch_depth (int, optional): When greater than 0, frames are decoded and split into camera images on a
+            background thread with up to this many frames queued ahead of the detector. Defaults to 0.
+        frame_batch_size (int, optional): The number of consecutive frames to run through the detectors together.
+            Defaults to 1.
+        max_batch_size (Optional[int], optional): The maximum number of images per forward pass. Defaults to None.
+        progress_callback (Optional[Callable[[float], None]], optional): Called with the fraction of the video
+            processed so far after each batch of frames. Defaults to None.
+        image_store (Optional[ImageStore], optional): When given, the images of saved mosaic detections are written
+            to the store in the background and the detections reference them instead of holding the images.
+            Defaults to None.
+        detection_cache (Optional[RawDetectionCache], optional): The raw detector boxes of the video's frames. Cached
+            frames skip the detector and newly detected boxes are added and saved. Only used when detecting in this
+            process. Defaults to None.
+        num_workers (int, optional): When greater than 0, the video is split into this many time shards that are
+            decoded and run through the detectors in separate processes, see sharded_frame_detections. Tracking
+            still runs once over all the detections in order, so the results are the same. Ignored for videos that
+            are not seekable, such as a StreamingVideo. Defaults to 0.
+        motion_gate (Optional[MotionGate], optional): When given, camera images that have not changed since their
+            last detection reuse its boxes instead of going through the detectors. Which boxes are reused depends
+            on where the shards start, so the gate is ignored when detecting with worker processes. Defaults to None.
+        adaptive_sampler (Optional[AdaptiveSampler], optional): When given, frames are only detected every
+            idle_interval seconds while nothing moves, and densely around stone motion, see
+            adaptive_frame_detections. Adaptive sampling needs the tracking state, so it always detects in this
+            process and num_workers is ignored. Defaults to None.
+        shard_pool (Optional[ShardWorkerPool], optional): The worker processes to detect the shards in when
+            num_workers is greater than 0. Defaults to None, which starts worker processes for this video only.
+        second_interval (float, optional): The interval in seconds between the tracked frames. Defaults to 0.1.
+
+    Yields:
+        TrackingUpdate: The active stones after each frame, and the mosaic detection when it is saved.
+
+    Returns:
+        GameState: The filtered tracking state once the whole video is processed.
+    """
+
+    state = GameState(second_interval)
+    last_saved_time = None
+
+    if num_workers > 0 and not video.seekable:
+        logger.warning(
+            "Video can only be decoded in order, ignoring num_workers")
+        num_workers = 0
+
+    if adaptive_sampler is not None:
+        if num_workers > 0:
+            logger.warning(
+                "Adaptive sampling detects in process, ignoring num_workers")
+        frame_detections = adaptive_frame_detections(
+            camera_setup,
+            video.frame_generator(second_interval=second_interval), video.fps,
+            second_interval, stone_detectors, state, adaptive_sampler,
+            prefetch_depth, frame_batch_size, max_batch_size, detection_cache,
+            motion_gate)
+    elif num_workers > 0:
+        if motion_gate is not None:
+            logger.warning(
+                "Motion gating depends on the shard boundaries, ignoring the motion gate"
+            )
+        frame_interval = video.frame_interval(second_interval)
+        frame_detections = sharded_frame_detections(
+            camera_setup, video, stone_detectors, frame_interval,
+            saved_frame_indexes(video.sampled_frame_indexes(second_interval),
+                                video.fps, image_save_interval), num_workers,
+            frame_batch_size, max_batch_size, shard_pool)
+    else:
+        frame_detections = frame_batch_detections(
+            camera_setup,
+            video.frame_generator(second_interval=second_interval),
+            stone_detectors, prefetch_depth, frame_batch_size, max_batch_size,
+            detection_cache, motion_gate)
+
+    try:
+        for frame_batch in frame_detections:
+            for frame_index, mosaic_detection in frame_batch:
+                frame_time = float(frame_index) / video.fps
+
+                saved_detection = None
+                if image_save_interval > 0.0:
+                    if (last_saved_time is None or frame_time - last_saved_time
+                            >= image_save_interval):
+                        last_saved_time = frame_time
+                        saved_detection = mosaic_detection
+                        if image_store is not None:
+                            saved_detection = MosaicStoneDetections(
+                                {}, mosaic_detection.detections, {
+                                    camera_name: image_store.put_async(image)
+                                    for camera_name, image in
+                                    mosaic_detection.images.items()
+                                })
+
+                state.add_stone_detections(mosaic_detection, frame_time)
+                state.update_stones(frame_time)
+
+                yield TrackingUpdate(frame_time,
+                                     state.active_stones_for_json(),
+                                     saved_detection)
+
+            if progress_callback is not None and video.num_frames > 0:
+                progress_callback(
+                    min((frame_batch[-1][0] + 1) / video.num_frames, 1.0))
+    finally:
+        frame_detections.close()
+        # Keep the boxes detected so far even when tracking stops early
+        if detection_cache is not None:
+            detection_cache.save()
+
+    return state.get_filtered_state()
+
+
+def saved_frame_indexes(frame_indexes: Iterable[int], fps: float,
+                        image_save_interval: float) -> frozenset:
+    """The frames whose mosaic detections video_stone_tracker_stream saves.
+
+    Args:
+        frame_indexes (Iterable[int]): The indexes of the tracked frames, in order.
+        fps (float): The frame rate of the video.
+        image_save_interval (float): The interval in seconds between saved mosaic detections.
+
+    Returns:
+        frozenset: The indexes of the saved frames.
+    """
+    saved = set()
+    if image_save_interval <= 0.0:
+        return frozenset(saved)
+
+    last_saved_time = None
+    for frame_index in frame_indexes:
+        frame_time = float(frame_index) / fps
+        if (last_saved_time is None
+                or frame_time - last_saved_time >= image_save_interval):
+            last_saved_time = frame_time
+            saved.add(frame_index)
+    return frozenset(saved)
+
+
+def frame_batch_detections(
+    camera_setup: CameraSetup,
+    frames: Iterable[Tuple[int, np.ndarray]],
+    stone_detectors: dict[camera_utilities.CameraType, StoneDetector],
+    prefetch_depth: int = 0,
+    frame_batch_size: int = 1,
+    max_batch_size: Optional[int] = None,
+    detection_cache: Optional[RawDetectionCache] = None,
+    motion_gate: Optional[MotionGate] = None
+) -> Generator[List[Tuple[int, MosaicStoneDetections]], None, None]:
+    """Detect the stones in video frames a batch of frames at a time.
+
+    Args:
+        camera_setup (CameraSetup): The camera setup of the video.
+        frames (Iterable[Tuple[int, np.ndarray]]): The index and mosaic image of each frame.
+        stone_detectors (dict[camera_utilities.CameraType, StoneDetector]): The detector to use for each camera type.
+        prefetch_depth (int, optional): When greater than 0, frames are decoded and split into camera images on a
+            background thread with up to this many frames queued ahead of the detector. Defaults to 0.
+        frame_batch_size (int, optional): The number of consecutive frames to run through the detectors together.
+            Defaults to 1.
+        max_batch_size (Optional[int], optional): The maximum number of images per forward pass. Defaults to None.
+        detection_cache (Optional[RawDetectionCache], optional): The raw detector boxes of the video's frames.
+            Defaults to None.
+        motion_gate (Optional[MotionGate], optional): Skips the detector for camera images that have not changed.
+            Defaults to None.
+
+    Yields:
+        List[Tuple[int, MosaicStoneDetections]]: The index and detections of each frame in the batch.
+    """
+    camera_frames = camera_frame_generator(camera_setup, frames,
+                                           prefetch_depth)
+
+    for frame_batch in batched(camera_frames, max(frame_batch_size, 1)):
+        yield detect_camera_frames(camera_setup, frame_batch, stone_detectors,
+                                   max_batch_size, detection_cache,
+                                   motion_gate)
+
 
-        mosaic_detection = mosaic_image_detect_stones(camera_setup, frame,
-                                                      stone_detectors)
-        if image_save_interval > 0.0:
-            if len(detection_times) == 0:
-                detection_times.append(frame_time)
-                mosaic_detections.append(mosaic_detection)
+def camera_frame_generator(
+        camera_setup: CameraSetup, frames: Iterable[Tuple[int, np.ndarray]],
+        prefetch_depth: int) -> Iterable[Tuple[int, dict[str, np.ndarray]]]:
+    """Split video frames into their camera images, optionally on a background thread.
+
+    Args:
+        camera_setup (CameraSetup): The camera setup of the video.
+        frames (Iterable[Tuple[int, np.ndarray]]): The index and mosaic image of each frame.
+        prefetch_depth (int): When greater than 0, frames are decoded and split on a background thread with up to
+            this many frames queued ahead.
+
+    Returns:
+        Iterable[Tuple[int, dict[str, np.ndarray]]]: The index and camera images of each frame.
+    """
+
+    def split_frame(item):
+        # Copy the camera images so queued frames do not keep the whole mosaic frame alive
+        frame_index, frame = item
+        return frame_index, {
+            camera_name: np.ascontiguousarray(camera_image)
+            for camera_name, camera_image in split_mosaic_image(
+                camera_setup, frame).items()
+        }
+
+    if prefetch_depth > 0:
+        return FramePrefetcher(frames,
+                               queue_depth=prefetch_depth,
+                               transform=split_frame)
+    return ((frame_index, split_mosaic_image(camera_setup, frame))
+            for frame_index, frame in frames)
+
+
+def detect_camera_frames(
+    camera_setup: CameraSetup,
+    camera_frames: List[Tuple[int, dict[str, np.ndarray]]],
+    stone_detectors: dict[camera_utilities.CameraType, StoneDetector],
+    max_batch_size: Optional[int] = None,
+    detection_cache: Optional[RawDetectionCache] = None,
+    motion_gate: Optional[MotionGate] = None
+) -> List[Tuple[int, MosaicStoneDetections]]:
+    """Detect the stones in the camera images of several video frames, see camera_images_batch_detect_stones.
+
+    Returns:
+        List[Tuple[int, MosaicStoneDetections]]: The index and detections of each frame.
+    """
+    frame_indexes = [frame_index for frame_index, _ in camera_frames]
+    batch_detections = camera_images_batch_detect_stones(
+        camera_setup, [camera_images for _, camera_images in camera_frames],
+        stone_detectors, max_batch_size, frame_indexes, detection_cache,
+        motion_gate)
+    return list(zip(frame_indexes, batch_detections))
+
+
+def adaptive_frame_detections(
+    camera_setup: CameraSetup,
+    frames: Iterable[Tuple[int, np.ndarray]],
+    fps: float,
+    second_interval: float,
+    stone_detectors: dict[camera_utilities.CameraType, StoneDetector],
+    state: GameState,
+    sampler: AdaptiveSampler,
+    prefetch_depth: int = 0,
+    frame_batch_size: int = 1,
+    max_batch_size: Optional[int] = None,
+    detection_cache: Optional[RawDetectionCache] = None,
+    motion_gate: Optional[MotionGate] = None
+) -> Generator[List[Tuple[int, MosaicStoneDetections]], None, None]:
+    """Detect the stones in the frames of a video chosen by an adaptive sampler.
+
+    Every frame is decoded at the dense interval, but while the sampler is idle the frames are only buffered and
+    just the last frame of each idle interval is detected. When that probe frame shows motion, the buffered frames
+    are detected too, so the frames leading up to the motion are tracked densely, and every frame is detected until
+    no stone has moved for the sampler's hold time.
+
+    The sampler decides from the tracking state, so the caller must track each yielded batch before requesting the
+    next one. Fewer frames are detected than with dense sampling, so the Kalman state of the tracked stones is not
+    expected to match it, see AdaptiveSampler.
+
+    Args:
+        camera_setup (CameraSetup): The camera setup of the video.
+        frames (Iterable[Tuple[int, np.ndarray]]): The index and mosaic image of each frame, at the dense interval.
+        fps (float): The frame rate of the video.
+        second_interval (float): The dense interval in seconds between the frames.
+        stone_detectors (dict[camera_utilities.CameraType, StoneDetector]): The detector to use for each camera type.
+        state (GameState): The tracking state the yielded detections are added to.
+        sampler (AdaptiveSampler): Decides when to sample densely, and counts the detected and skipped frames.
+        prefetch_depth (int, optional): When greater than 0, frames are decoded and split into camera images on a
+            background thread with up to this many frames queued ahead of the detector. Defaults to 0.
+        frame_batch_size (int, optional): The number of consecutive frames to run through the detectors together
+            while sampling densely. Defaults to 1.
+        max_batch_size (Optional[int], optional): The maximum number of images per forward pass. Defaults to None.
+        detection_cache (Optional[RawDetectionCache], optional): The raw detector boxes of the video's frames.
+            Defaults to None.
+        motion_gate (Optional[MotionGate], optional): Skips the detector for camera images that have not changed.
+            Defaults to None.
+
+    Yields:
+        List[Tuple[int, MosaicStoneDetections]]: The index and detections of each detected frame, in order.
+    """
+    idle_frames = max(round(sampler.idle_interval / second_interval), 1)
+    camera_frames = camera_frame_generator(camera_setup, frames,
+                                           prefetch_depth)
+
+    def detect(pending_frames):
+        sampler.detected_frames += len(pending_frames)
+        return detect_camera_frames(camera_setup, pending_frames,
+                                    stone_detectors, max_batch_size,
+                                    detection_cache, motion_gate)
+
+    # Start densely so the stones in play at the start of the video are picked up
+    dense = True
+    dense_until = 0.0
+    pending_frames = []
+    for camera_frame in itertools.chain(camera_frames, [None]):
+        end_of_video = camera_frame is None
+        if not end_of_video:
+            pending_frames.append(camera_frame)
+        if len(pending_frames) == 0 or (
+                not end_of_video and len(pending_frames)
+                < (frame_batch_size if dense else idle_frames)):
+            continue
+
+        if dense:
+            frame_batch = detect(pending_frames)
+        else:
+            frame_batch = detect(pending_frames[-1:])
+            probe_time = float(frame_batch[0][0]) / fps
+            if sampler.motion_detected(state, frame_batch[0][1]):
+                sampler.backfills += 1
+                frame_batch = detect(pending_frames[:-1]) + frame_batch
+                dense_until = probe_time + sampler.hold_time
             else:
-                last_saved_time = detection_times[-1]
-                if frame_time - last_saved_time >= image_save_interval:
-                    detection_times.append(frame_time)
-                    mosaic_detections.append(mosaic_detection)
+                sampler.skipped_frames += len(pending_frames) - 1
+        pending_frames = []
+
+        yield frame_batch
+
+        last_time = float(frame_batch[-1][0]) / fps
+        if sampler.stones_moving(state):
+            dense_until = max(dense_until, last_time + sampler.hold_time)
+        dense = last_time < dense_until
+
 
-        state.add_stone_detections(mosaic_detection, frame_time)
-        state.update_stones(frame_time)
+class ShardWorkerPool:
+    """Worker processes to detect the time shards of videos in, see sharded_frame_detections.
 
-    return TrackingResults(state.get_filtered_state(), detection_times,
-                           mosaic_detections)
+    The processes are started on first use and kept for later videos, so each worker only loads a detector model
+    the first time a shard needs it.
+    """
+
+    def __init__(self, max_workers: int):
+        """
+        Args:
+            max_workers (int): The number of worker processes.
+        """
+        self.max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _start(self):
+        # Spawn rather than fork, forking a process with inference threads running can deadlock
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Run a function in a worker process, starting the workers if they are not running.
+
+        Returns:
+            Future: The future for the function's result.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._start()
+            try:
+                return self._executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died, the pool can not be used any more
+                logger.warning("Shard worker pool is broken, restarting it")
+                self._executor.shutdown(wait=False)
+                self._start()
+                return self._executor.submit(fn, *args)
+
+    def shutdown(self):
+        """Stop the worker processes, waiting for the running shards and cancelling the queued ones."""
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+# The stone detectors loaded by a shard worker process, keyed by (model_path, model_hash, overlap_iou_threshold)
+_shard_worker_stone_detectors: dict[Tuple[str, Optional[str], float],
+                                    StoneDetector] = {}
+
+
+def _shard_worker_detectors(
+    detector_models: dict[camera_utilities.CameraType,
+                          Tuple[str, Optional[str], float]]
+) -> dict[camera_utilities.CameraType, StoneDetector]:
+    detectors = {}
+    for camera_type, detector_model in detector_models.items():
+        # Camera types sharing a model share a detector, as they do in the parent process
+        if detector_model not in _shard_worker_stone_detectors:
+            model_path, model_hash, overlap_iou_threshold = detector_model
+            _shard_worker_stone_detectors[detector_model] = StoneDetector(
+                model_path, model_hash, overlap_iou_threshold)
+        detectors[camera_type] = _shard_worker_stone_detectors[detector_model]
+    return detectors
+
+
+def _detect_shard(
+        camera_setup: CameraSetup, video: CurlingVideo,
+        detector_models: dict[camera_utilities.CameraType,
+                              Tuple[str, Optional[str],
+                                    float]], start_frame: int,
+        end_frame: Optional[int], frame_interval: int, saved_frames: frozenset,
+        frame_batch_size: int, max_batch_size: Optional[int]
+) -> List[Tuple[int, MosaicStoneDetections]]:
+    frames = video.frame_range_generator(start_frame, end_frame,
+                                         frame_interval)
+
+    shard_detections = []
+    for frame_batch in frame_batch_detections(
+            camera_setup, frames, _shard_worker_detectors(detector_models), 0,
+            frame_batch_size, max_batch_size):
+        for frame_index, mosaic_detection in frame_batch:
+            # Only send back the images that will be saved
+            if frame_index not in saved_frames:
+                mosaic_detection.images = {}
+            shard_detections.append((frame_index, mosaic_detection))
+    return shard_detections
+
+
+def sharded_frame_detections(
+    camera_setup: CameraSetup,
+    video: CurlingVideo,
+    stone_detectors: dict[camera_utilities.CameraType, StoneDetector],
+    frame_interval: int,
+    saved_frames: frozenset,
+    num_workers: int,
+    frame_batch_size: int = 1,
+    max_batch_size: Optional[int] = None,
+    shard_pool: Optional[ShardWorkerPool] = None
+) -> Generator[List[Tuple[int, MosaicStoneDetections]], None, None]:
+    """Detect the stones in a video with a pool of worker processes, one contiguous time shard of the video each.
+
+    Every worker loads each detector model once, the first time one of its shards needs it. The shards are yielded
+    in order as they finish, so the detections come out in the same order as a sequential run.
+
+    Args:
+        camera_setup (CameraSetup): The camera setup of the video.
+        video (CurlingVideo): The video to detect stones in.
+        stone_detectors (dict[camera_utilities.CameraType, StoneDetector]): The detector to use for each camera type.
+            The workers load the same models.
+        frame_interval (int): The number of frames between detected frames.
+        saved_frames (frozenset): The frames whose camera images are sent back from the workers. The images of
+            the other frames are dropped.
+        num_workers (int): The number of shards.
+        frame_batch_size (int, optional): The number of consecutive frames to run through the detectors together.
+            Defaults to 1.
+        max_batch_size (Optional[int], optional): The maximum number of images per forward pass. Defaults to None.
+        shard_pool (Optional[ShardWorkerPool], optional): The worker processes to detect the shards in. Defaults to
+            None, which starts num_workers processes and stops them once the video is done.
+
+    Yields:
+        List[Tuple[int, MosaicStoneDetections]]: The index and detections of each frame in a shard.
+    """
+    frame_indexes = range(0, video.num_frames, frame_interval)
+    shard_size = max(math.ceil(len(frame_indexes) / num_workers), 1)
+    shard_starts = list(frame_indexes[::shard_size]) or [0]
+    # The last shard runs to the end of the video in case the frame count is an underestimate
+    shard_ends = shard_starts[1:] + [None]
+
+    detector_models = {
+        camera_type: (detector.model_path, detector.model_hash,
+                      detector.overlap_iou_threshold)
+        for camera_type, detector in stone_detectors.items()
+    }
+
+    own_pool = shard_pool is None
+    if own_pool:
+        shard_pool = ShardWorkerPool(num_workers)
+    futures = []
+    try:
+        for start_frame, end_frame in zip(shard_starts, shard_ends):
+            futures.append(
+                shard_pool.submit(_detect_shard, camera_setup, video,
+                                  detector_models, start_frame, end_frame,
+                                  frame_interval, saved_frames,
+                                  frame_batch_size, max_batch_size))
+        for future in futures:
+            shard_detections = future.result()
+            if len(shard_detections) != 0:
+                yield shard_detections
+    finally:
+        # Don't leave the shards of an abandoned video queued in a shared pool
+        for future in futures:
+            future.cancel()
+        if own_pool:
+            shard_pool.shutdown()
@@ -0,0 +1,180 @@
+from contextlib import contextmanager
+import logging
+import os
+import tempfile
+import threading
+from typing import Iterator, Optional, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where only the caches in this process are kept from overwriting each other
+    fcntl = None
+
+import curling_tracker_backend.util.camera_utilities as camera_utilities
+
+logger = logging.getLogger(__name__)
+
+
+def camera_crop_key(camera: camera_utilities.Camera) -> str:
+    """A key for the region of the mosaic image a camera's images are cropped from."""
+    x = min(camera.corner1[0], camera.corner2[0])
+    y = min(camera.corner1[1], camera.corner2[1])
+    width = abs(camera.corner1[0] - camera.corner2[0])
+    height = abs(camera.corner1[1] - camera.corner2[1])
+    return f"{x}_{y}_{width}_{height}"
+
+
+_file_locks: dict[str, threading.Lock] = {}
+_file_locks_lock = threading.Lock()
+
+
+@contextmanager
+def _locked_file(path: str) -> Iterator[None]:
+    # Threads of this process take a lock per file, other processes are kept out with an flock on a lock file next to it
+    with _file_locks_lock:
+        file_lock = _file_locks.setdefault(path, threading.Lock())
+    with file_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_entry(path: str) -> dict[int, np.ndarray]:
+    entry = {}
+    if os.path.exists(path):
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                offsets = data["offsets"]
+                boxes = data["boxes"]
+                for i, frame_index in enumerate(
+                        data["frame_indexes"].tolist()):
+                    entry[frame_index] = boxes[offsets[i]:offsets[i + 1]]
+        except (OSError, KeyError, ValueError):
+            logger.warning(f"Ignoring unreadable detection cache {path}")
+            entry = {}
+    return entry
+
+
+def _entry_key(camera: camera_utilities.Camera,
+               model_hash: str) -> Tuple[str, str]:
+    # The inference profile changes the boxes as much as the model, so cameras with one get their own file
+    crop_key = camera_crop_key(camera)
+    if camera.inference_profile.key:
+        crop_key += "_" + camera.inference_profile.key
+    return model_hash, crop_key
+
+
+class RawDetectionCache:
+    """The raw stone detector boxes for the frames of a video, stored on disk.
+
+    The boxes only depend on the video frame, the camera crop, the detector model and the camera's inference
+    profile, not on the camera calibration, so re-tracking a video after recalibrating a camera can skip the
+    detector entirely. The boxes for each camera crop, profile and model are kept in one .npz file under
+    <folder>/<video hash>/<model hash>/, loaded on first use and written back by save.
+
+    Several caches can be open for the same video at once, such as for two tracking jobs on clips of the same video.
+    save merges the boxes already in the file with its own while holding a lock on the file, so neither cache's frames
+    are lost.
+    """
+
+    def __init__(self, folder: str, video_hash: str, frame_offset: int = 0):
+        """
+        Args:
+            folder (str): The folder the caches of all the videos are stored in.
+            video_hash (str): The content hash of the video.
+            frame_offset (int, optional): The index in the video of the first frame of the clip being tracked. The
+                boxes are stored by their index in the video, so clips of the same video share them. Defaults to 0.
+        """
+        self.folder = os.path.join(folder, video_hash)
+        self.frame_offset = frame_offset
+        self.entries: dict[Tuple[str, str], dict[int, np.ndarray]] = {}
+        self.dirty = set()
+        self.lock = threading.Lock()
+
+    def _path(self, key: Tuple[str, str]) -> str:
+        model_hash, crop_key = key
+        return os.path.join(self.folder, model_hash, crop_key + ".npz")
+
+    def _load(self, key: Tuple[str, str]) -> dict[int, np.ndarray]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            return entry
+
+        entry = _read_entry(self._path(key))
+        self.entries[key] = entry
+        return entry
+
+    def get(self, frame_index: int, camera: camera_utilities.Camera,
+            model_hash: str) -> Optional[np.ndarray]:
+        """Get the cached boxes for a camera's image of a frame.
+
+        Args:
+            frame_index (int): The index of the frame in the clip.
+            camera (camera_utilities.Camera): The camera the image is cropped for.
+            model_hash (str): The hash of the detector model.
+
+        Returns:
+            Optional[np.ndarray]: The boxes, or None if they are not cached.
+        """
+        key = _entry_key(camera, model_hash)
+        with self.lock:
+            return self._load(key).get(frame_index + self.frame_offset)
+
+    def put(self, frame_index: int, camera: camera_utilities.Camera,
+            model_hash: str, boxes: np.ndarray):
+        """Cache the boxes for a camera's image of a frame.
+
+        Args:
+            frame_index (int): The index of the frame in the clip.
+            camera (camera_utilities.Camera): The camera the image is cropped for.
+            model_hash (str): The hash of the detector model.
+            boxes (np.ndarray): The boxes from StoneDetector.boxes_from_result.
+        """
+        key = _entry_key(camera, model_hash)
+        with self.lock:
+            self._load(key)[frame_index + self.frame_offset] = boxes
+            self.dirty.add(key)
+
+    def save(self):
+        """Write the boxes added since the last save to disk, merged with the boxes other caches have saved since."""
+        with self.lock:
+            for key in self.dirty:
+                path = self._path(key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with _locked_file(path):
+                    entry = _read_entry(path)
+                    entry.update(self.entries[key])
+                    self._write_entry(path, entry)
+                self.entries[key] = entry
+
+            self.dirty.clear()
+
+    @staticmethod
+    def _write_entry(path: str, entry: dict[int, np.ndarray]):
+        frame_indexes = sorted(entry)
+        offsets = np.zeros(len(frame_indexes) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(
+            [len(entry[frame_index]) for frame_index in frame_indexes])
+        boxes = (np.concatenate([
+            entry[frame_index] for frame_index in frame_indexes
+        ]) if len(frame_indexes) != 0 else np.zeros(
+            (0, 5), dtype=np.int32))
+
+        # Write to a temporary file first so a reader never sees a partially written cache
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                         suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f,
+                     frame_indexes=np.array(frame_indexes,
+                                            dtype=np.int64),
+                     offsets=offsets,
+                     boxes=boxes.astype(np.int32, copy=False))
+        os.replace(temp_path, path)
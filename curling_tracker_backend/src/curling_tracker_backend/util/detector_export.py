@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+import logging
+from typing import List
+
+import numpy as np
+from ultralytics import YOLO
+
+import curling_tracker_backend.util.camera_utilities as camera_utilities
+import curling_tracker_backend.util.curling_shot_tracker as shot_tracker
+
+logger = logging.getLogger(__name__)
+
+
+def export_stone_detectors(
+    model_dir: str, backend: shot_tracker.DetectorBackend
+) -> dict[camera_utilities.CameraType, str]:
+    """Export the PyTorch stone detector for each camera type to another inference backend.
+
+    The exported models are written next to the .pt weights with the names stone_detector_model_path expects.
+    They are exported with dynamic input shapes so the batched inference path can send more than one image per
+    forward pass.
+
+    Args:
+        model_dir (str): The folder containing the stone detector models.
+        backend (shot_tracker.DetectorBackend): The backend to export to.
+
+    Returns:
+        dict[camera_utilities.CameraType, str]: The path of the exported model for each camera type.
+    """
+    exported_paths = {}
+    for camera_type in shot_tracker.STONE_DETECTOR_FILENAMES:
+        model_path = shot_tracker.stone_detector_model_path(
+            model_dir, camera_type, shot_tracker.DetectorBackend.PYTORCH)
+        logger.info(f"Exporting {model_path} to {backend.value}")
+        exported_paths[camera_type] = YOLO(model_path).export(
+            format=backend.value, dynamic=True)
+
+    return exported_paths
+
+
+@dataclass
+class DetectorParityReport:
+    num_images: int
+    num_mismatched_images: int
+    max_box_difference: float
+
+    @property
+    def passed(self) -> bool:
+        return self.num_mismatched_images == 0
+
+
+def _result_boxes(result) -> np.ndarray:
+    # Columns are class, x1, y1, x2, y2
+    boxes = result.boxes
+    return np.hstack((boxes.cls.cpu().numpy().reshape(-1, 1),
+                      boxes.xyxy.cpu().numpy().reshape(-1, 4)))
+
+
+def compare_stone_detectors(reference: shot_tracker.StoneDetector,
+                            candidate: shot_tracker.StoneDetector,
+                            images: List[np.ndarray],
+                            tolerance: float = 2.0) -> DetectorParityReport:
+    """Check that two stone detectors find the same boxes in a set of images.
+
+    Every reference box is matched to the closest candidate box of the same class. An image is a mismatch when the
+    number of boxes of any class differs or a matched box corner is more than tolerance pixels away.
+
+    Args:
+        reference (shot_tracker.StoneDetector): The detector to compare against, usually the PyTorch model.
+        candidate (shot_tracker.StoneDetector): The detector being checked, usually an exported model.
+        images (List[np.ndarray]): The images to run both detectors on.
+        tolerance (float, optional): The largest allowed box corner difference in pixels. Defaults to 2.0.
+
+    Returns:
+        DetectorParityReport: The number of mismatched images and the largest box difference seen.
+    """
+    num_mismatched_images = 0
+    max_box_difference = 0.0
+
+    for image in images:
+        reference_boxes = _result_boxes(reference.predict([image])[0])
+        candidate_boxes = _result_boxes(candidate.predict([image])[0])
+
+        mismatched = False
+        for class_id in np.union1d(reference_boxes[:, 0], candidate_boxes[:,
+                                                                          0]):
+            class_reference = reference_boxes[reference_boxes[:, 0] ==
+                                              class_id, 1:]
+            class_candidate = candidate_boxes[candidate_boxes[:, 0] ==
+                                              class_id, 1:]
+            if len(class_reference) != len(class_candidate):
+                mismatched = True
+                continue
+
+            differences = np.abs(class_reference[:, None, :] -
+                                 class_candidate[None, :, :]).max(axis=2)
+            closest = differences.min(axis=1)
+            max_box_difference = max(max_box_difference,
+                                     float(closest.max()))
+            if np.any(closest > tolerance):
+                mismatched = True
+
+        if mismatched:
+            num_mismatched_images += 1
+
+    return DetectorParityReport(len(images), num_mismatched_images,
+                                max_box_difference)
@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+import hashlib
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import curling_tracker_backend.util.camera_utilities as camera_utilities
+import curling_tracker_backend.util.curling_shot_tracker as shot_tracker
+
+logger = logging.getLogger(__name__)
+
+
+def _model_files(path: str) -> List[str]:
+    # Exported OpenVINO models are a folder of files rather than a single file
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(
+        os.path.join(root, name) for root, _, names in os.walk(path)
+        for name in names)
+
+
+def file_hash(path: str) -> str:
+    """Find the SHA256 hash of a model file, or of all the files in a model folder.
+
+    Args:
+        path (str): The path to the file or folder.
+
+    Returns:
+        str: The hex digest of the contents.
+    """
+    sha = hashlib.sha256()
+    for file_path in _model_files(path):
+        sha.update(os.path.relpath(file_path, path).encode())
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _stat_key(path: str) -> Tuple[int, int]:
+    stats = [os.stat(file_path) for file_path in _model_files(path)]
+    return (max(stat.st_mtime_ns for stat in stats),
+            sum(stat.st_size for stat in stats))
+
+
+@dataclass
+class _RegistryEntry:
+    stat_key: Tuple[int, int]
+    model_hash: str
+    detector: shot_tracker.StoneDetector
+
+
+class DetectorRegistry:
+    """Loads each stone detector model once per process and shares it between requests.
+
+    A detector is shared by every request for the same model and overlap IoU threshold. A model is reloaded only
+    when its file changes. The file's modification time and size are checked on every lookup, and the weights are
+    re-hashed only when those change, so an unchanged model costs a single stat call.
+    """
+
+    def __init__(self, warm_up: bool = True):
+        """
+        Args:
+            warm_up (bool, optional): Run a dummy inference on every newly loaded model. Defaults to True.
+        """
+        self.warm_up = warm_up
+        self.entries: dict[Tuple[str, float], _RegistryEntry] = {}
+        self.lock = threading.Lock()
+
+    def get(self,
+            model_path: str,
+            overlap_iou_threshold: float = 0.0) -> shot_tracker.StoneDetector:
+        """Get the detector for a model, loading it if it is not loaded or the file has changed.
+
+        Args:
+            model_path (str): The path to the model weights.
+            overlap_iou_threshold (float, optional): The IoU above which the detector flags two detections as
+                overlapping, see shot_tracker.StoneDetector. Defaults to 0.0.
+
+        Returns:
+            shot_tracker.StoneDetector: The shared detector for the model.
+        """
+        model_path = os.path.abspath(model_path)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model not found: {model_path}")
+        stat_key = _stat_key(model_path)
+
+        key = (model_path, overlap_iou_threshold)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.stat_key == stat_key:
+                return entry.detector
+
+            model_hash = file_hash(model_path)
+            if entry is not None and entry.model_hash == model_hash:
+                entry.stat_key = stat_key
+                return entry.detector
+
+            logger.info(f"Loading stone detector {model_path} ({model_hash=})")
+            detector = shot_tracker.StoneDetector(
+                model_path,
+                model_hash=model_hash,
+                overlap_iou_threshold=overlap_iou_threshold)
+            if self.warm_up:
+                detector.warm_up()
+
+            self.entries[key] = _RegistryEntry(stat_key, model_hash, detector)
+            return detector
+
+    def get_stone_detectors(
+        self,
+        model_dir: str,
+        backend: shot_tracker.DetectorBackend = shot_tracker.DetectorBackend.
+        PYTORCH,
+        camera_type_backends: Optional[dict[camera_utilities.CameraType,
+                                            shot_tracker.DetectorBackend]] = None,
+        overlap_iou_threshold: float = 0.0
+    ) -> dict[camera_utilities.CameraType, shot_tracker.StoneDetector]:
+        """Get the shared detector for each camera type.
+
+        Args:
+            model_dir (str): The folder containing the stone detector models.
+            backend (shot_tracker.DetectorBackend, optional): The inference backend to use.
+                Defaults to DetectorBackend.PYTORCH.
+            camera_type_backends (Optional[dict[camera_utilities.CameraType, shot_tracker.DetectorBackend]], optional):
+                Backends overriding backend for specific camera types. Defaults to None.
+            overlap_iou_threshold (float, optional): The IoU above which the detectors flag two detections as
+                overlapping. Defaults to 0.0.
+
+        Returns:
+            dict[camera_utilities.CameraType, shot_tracker.StoneDetector]: The detector for each camera type.
+        """
+        camera_type_backends = camera_type_backends or {}
+        return {
+            camera_type:
+            self.get(
+                shot_tracker.stone_detector_model_path(
+                    model_dir, camera_type,
+                    camera_type_backends.get(camera_type, backend)),
+                overlap_iou_threshold)
+            for camera_type in shot_tracker.STONE_DETECTOR_FILENAMES
+        }
+
+    def get_configured_stone_detectors(
+        self, config: dict
+    ) -> dict[camera_utilities.CameraType, shot_tracker.StoneDetector]:
+        """Get the shared detector for each camera type using the model folder, backends and overlap IoU threshold
+        from an app config.
+
+        Args:
+            config (dict): The flask app config.
+
+        Returns:
+            dict[camera_utilities.CameraType, shot_tracker.StoneDetector]: The detector for each camera type.
+        """
+        return self.get_stone_detectors(
+            config["MODEL_FOLDER"],
+            shot_tracker.DetectorBackend(config["DETECTOR_BACKEND"]), {
+                camera_utilities.CameraType(camera_type):
+                shot_tracker.DetectorBackend(backend)
+                for camera_type, backend in
+                config["DETECTOR_CAMERA_TYPE_BACKENDS"].items()
+            }, config["STONE_OVERLAP_IOU_THRESHOLD"])
+
+
+registry = DetectorRegistry()
@@ -0,0 +1,88 @@
+from typing import Any, Callable, Iterable, Iterator, Optional
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+_END_OF_STREAM = object()
+
+
+class FramePrefetcher:
+    """Runs a frame generator on a background thread and hands the frames over through a bounded queue.
+
+    OpenCV releases the GIL while decoding, so decoding the next frames overlaps with inference on the current one.
+    When the queue is full the producer blocks until the consumer catches up, which bounds the memory held by
+    decoded frames to queue_depth items.
+    """
+
+    def __init__(self,
+                 frames: Iterable[Any],
+                 queue_depth: int = 8,
+                 transform: Optional[Callable[[Any], Any]] = None):
+        """
+        Args:
+            frames (Iterable[Any]): The frames to prefetch, usually CurlingVideo.frame_generator().
+            queue_depth (int, optional): The maximum number of prefetched items waiting to be consumed. Defaults to 8.
+            transform (Optional[Callable[[Any], Any]], optional): Applied to every item on the producer thread before
+                it is queued, e.g. cropping the camera images out of the mosaic. Defaults to None.
+        """
+        self.frames = frames
+        self.transform = transform
+        self.queue = queue.Queue(maxsize=max(queue_depth, 1))
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _put(self, item) -> bool:
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            for item in self.frames:
+                if self.transform is not None:
+                    item = self.transform(item)
+                if not self._put(item):
+                    break
+        except Exception as e:
+            logger.exception("Frame prefetcher failed.")
+            self._put(e)
+        finally:
+            close = getattr(self.frames, "close", None)
+            if close is not None:
+                close()
+            self._put(_END_OF_STREAM)
+
+    def __iter__(self) -> Iterator[Any]:
+        self.thread = threading.Thread(target=self._produce,
+                                       name="frame-prefetcher",
+                                       daemon=True)
+        self.thread.start()
+
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _END_OF_STREAM:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the producer thread and drop any frames still in the queue."""
+        self.stop_event.set()
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        if self.thread is not None and self.thread is not threading.current_thread(
+        ):
+            self.thread.join()
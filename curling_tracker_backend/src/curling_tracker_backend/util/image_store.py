@@ -0,0 +1,143 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from typing import Optional
+import cv2 as cv
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ImageFormat(str, Enum):
+    PNG = "png"
+    JPEG = "jpeg"
+    WEBP = "webp"
+
+
+IMAGE_FORMAT_EXTENSIONS = {
+    ImageFormat.PNG: ".png",
+    ImageFormat.JPEG: ".jpg",
+    ImageFormat.WEBP: ".webp",
+}
+
+# The names of stored images, the SHA256 hash of the encoded image and its extension
+IMAGE_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.(png|jpg|webp)$")
+
+
+@dataclass
+class StoredImage:
+    url: str
+    thumbnail_url: Optional[str]
+
+
+class ImageStore:
+    """A content-addressed store of encoded images on disk.
+
+    Every image is named by the SHA256 hash of its encoded bytes, so identical images are only written once and a
+    stored image never changes, which lets it be served with long cache lifetimes. Images are encoded on a thread
+    pool, since OpenCV releases the GIL while encoding.
+    """
+
+    def __init__(self,
+                 folder: str,
+                 image_format: ImageFormat = ImageFormat.PNG,
+                 quality: int = 90,
+                 thumbnail_width: int = 0,
+                 max_workers: int = 2,
+                 url_prefix: str = ""):
+        """
+        Args:
+            folder (str): The folder to store the images in.
+            image_format (ImageFormat, optional): The format to encode images with. Defaults to ImageFormat.PNG.
+            quality (int, optional): The JPEG or WebP quality from 0 to 100. Unused for PNG. Defaults to 90.
+            thumbnail_width (int, optional): The width of a JPEG thumbnail stored alongside each image. 0 stores no
+                thumbnails. Defaults to 0.
+            max_workers (int, optional): The number of threads encoding images. Defaults to 2.
+            url_prefix (str, optional): Prepended to image names to form their urls. Defaults to "".
+        """
+        self.folder = folder
+        self.image_format = ImageFormat(image_format)
+        self.quality = quality
+        self.thumbnail_width = thumbnail_width
+        self.url_prefix = url_prefix
+        self.executor = ThreadPoolExecutor(max_workers=max(max_workers, 1),
+                                           thread_name_prefix="image-store")
+
+    def path(self, name: str) -> str:
+        """The path of a stored image from its name."""
+        return os.path.join(self.folder, name[0:2], name)
+
+    def _encode(self, image: np.ndarray, image_format: ImageFormat) -> bytes:
+        if image_format == ImageFormat.JPEG:
+            params = [cv.IMWRITE_JPEG_QUALITY, self.quality]
+        elif image_format == ImageFormat.WEBP:
+            params = [cv.IMWRITE_WEBP_QUALITY, self.quality]
+        else:
+            params = []
+
+        success, buffer = cv.imencode(IMAGE_FORMAT_EXTENSIONS[image_format],
+                                      image, params)
+        if not success:
+            raise ValueError(f"Could not encode image as {image_format.value}")
+        return buffer.tobytes()
+
+    def _write(self, data: bytes, image_format: ImageFormat) -> str:
+        name = hashlib.sha256(data).hexdigest() + IMAGE_FORMAT_EXTENSIONS[
+            image_format]
+        path = self.path(name)
+        if os.path.exists(path):
+            return name
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so a partially written image is never served
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def put(self, image: np.ndarray) -> StoredImage:
+        """Encode and store an image, and a thumbnail of it when enabled.
+
+        Args:
+            image (np.ndarray): The image to store.
+
+        Returns:
+            StoredImage: The urls of the stored image and thumbnail.
+        """
+        name = self._write(self._encode(image, self.image_format),
+                           self.image_format)
+
+        thumbnail_url = None
+        if self.thumbnail_width > 0 and image.shape[1] > self.thumbnail_width:
+            height = max(
+                round(image.shape[0] * self.thumbnail_width / image.shape[1]),
+                1)
+            thumbnail = cv.resize(image, (self.thumbnail_width, height),
+                                  interpolation=cv.INTER_AREA)
+            thumbnail_name = self._write(
+                self._encode(thumbnail, ImageFormat.JPEG), ImageFormat.JPEG)
+            thumbnail_url = self.url_prefix + thumbnail_name
+
+        return StoredImage(self.url_prefix + name, thumbnail_url)
+
+    def put_async(self, image: np.ndarray) -> Future:
+        """Encode and store an image on the store's thread pool.
+
+        Args:
+            image (np.ndarray): The image to store. It must not be modified until the future completes.
+
+        Returns:
+            Future: The future StoredImage.
+        """
+        return self.executor.submit(self.put, image)
@@ -0,0 +1,113 @@
+from typing import Callable, Optional, Sequence, Tuple
+import numpy as np
+
+
+class KalmanFilterBank:
+    """A set of linear Kalman filters sharing one model, stored as stacked arrays.
+
+    Every filter shares the measurement function H, the measurement noise R, and the transition F and process
+    noise Q for a timestep. Their states and covariances are rows of x and P, so predicting or updating any subset
+    of the filters is a handful of batched matrix products instead of a Python loop over filter objects. The
+    predict and update steps match filterpy's KalmanFilter, including the Joseph form covariance update.
+    """
+
+    def __init__(self,
+                 H: np.ndarray,
+                 R: np.ndarray,
+                 transition_matrices: Callable[[float], Tuple[np.ndarray,
+                                                              np.ndarray]],
+                 dt: float,
+                 capacity: int = 32):
+        """
+        Args:
+            H (np.ndarray): The dim_z x dim_x measurement function.
+            R (np.ndarray): The dim_z x dim_z measurement noise.
+            transition_matrices (Callable[[float], Tuple[np.ndarray, np.ndarray]]): Builds the state transition F
+                and process noise Q for a timestep. It is called once per distinct timestep.
+            dt (float): The timestep used when predict is not given one.
+            capacity (int, optional): The number of filters to allocate space for up front. Defaults to 32.
+        """
+        self.H = np.asarray(H, dtype=np.float64)
+        self.R = np.asarray(R, dtype=np.float64)
+        self.dim_z, self.dim_x = self.H.shape
+        self.transition_matrices = transition_matrices
+        self.dt = dt
+        self._transition_cache: dict[float, Tuple[np.ndarray,
+                                                  np.ndarray]] = {}
+
+        self.x = np.zeros((max(capacity, 1), self.dim_x))
+        self.P = np.zeros((max(capacity, 1), self.dim_x, self.dim_x))
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _transition(self, dt: float) -> Tuple[np.ndarray, np.ndarray]:
+        matrices = self._transition_cache.get(dt)
+        if matrices is None:
+            F, Q = self.transition_matrices(dt)
+            matrices = (np.asarray(F, dtype=np.float64),
+                        np.asarray(Q, dtype=np.float64))
+            self._transition_cache[dt] = matrices
+        return matrices
+
+    def add(self, x: Sequence[float], P: np.ndarray) -> int:
+        """Add a filter to the bank.
+
+        Args:
+            x (Sequence[float]): The initial state.
+            P (np.ndarray): The initial covariance.
+
+        Returns:
+            int: The index of the new filter.
+        """
+        if self.size == len(self.x):
+            self.x = np.concatenate((self.x, np.zeros_like(self.x)))
+            self.P = np.concatenate((self.P, np.zeros_like(self.P)))
+
+        index = self.size
+        self.x[index] = x
+        self.P[index] = P
+        self.size += 1
+        return index
+
+    def predict(self, indices: Sequence[int], dt: Optional[float] = None):
+        """Predict the next state of some of the filters.
+
+        Args:
+            indices (Sequence[int]): The filters to predict.
+            dt (Optional[float], optional): The timestep to predict over. Defaults to the bank's dt.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        if len(indices) == 0:
+            return
+
+        F, Q = self._transition(self.dt if dt is None else dt)
+        self.x[indices] = self.x[indices] @ F.T
+        self.P[indices] = F @ self.P[indices] @ F.T + Q
+
+    def update(self, indices: Sequence[int], z: np.ndarray):
+        """Update some of the filters with a measurement each.
+
+        Args:
+            indices (Sequence[int]): The filters to update, each at most once.
+            z (np.ndarray): The measurement for each filter, one row per index.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        if len(indices) == 0:
+            return
+
+        z = np.asarray(z, dtype=np.float64).reshape(len(indices), self.dim_z)
+        x = self.x[indices]
+        P = self.P[indices]
+
+        y = z - x @ self.H.T
+        PHT = P @ self.H.T
+        S = self.H @ PHT + self.R
+        K = PHT @ np.linalg.inv(S)
+
+        self.x[indices] = x + (K @ y[:, :, np.newaxis])[:, :, 0]
+
+        I_KH = np.eye(self.dim_x) - K @ self.H
+        self.P[indices] = (I_KH @ P @ I_KH.transpose(0, 2, 1) +
+                           K @ self.R @ K.transpose(0, 2, 1))
@@ -0,0 +1,107 @@
+from typing import Optional
+import cv2 as cv
+import numpy as np
+
+
+class MotionGate:
+    """Decides when a camera's image has changed enough since its last detection to run the detector again.
+
+    Stones are at rest for most of a game, so most camera images look the same as the last one that went through
+    the detector and would get the same boxes. Each image is shrunk to a small grayscale thumbnail and compared with
+    the thumbnail of the camera's last detected image. When no pixel of the thumbnail has changed by more than the
+    threshold, the image is a hit and reuses the last detected boxes. Shrinking averages away compression noise
+    while a moving stone still changes the blocks it crosses. Every camera is detected again at least every
+    refresh_interval images so a slow change can not go unnoticed forever.
+
+    The gate keeps state between calls, so the images of each camera must be checked in frame order. The hit and
+    miss counts are kept by the caller, which knows whether an image really reused boxes.
+    """
+
+    def __init__(self,
+                 threshold: float = 8.0,
+                 refresh_interval: int = 30,
+                 thumbnail_width: int = 64):
+        """
+        Args:
+            threshold (float, optional): The largest change in a thumbnail pixel's gray level, from 0 to 255, that
+                still counts as no motion. Defaults to 8.0.
+            refresh_interval (int, optional): The most images of a camera in a row that reuse its boxes before it is
+                detected again. 0 never forces a refresh. Defaults to 30.
+            thumbnail_width (int, optional): The width the images are shrunk to before comparing them.
+                Defaults to 64.
+        """
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+        self.thumbnail_width = thumbnail_width
+
+        self.hits = 0
+        self.misses = 0
+        self.forced_refreshes = 0
+
+        self._reference_thumbnails: dict[str, np.ndarray] = {}
+        self._reference_boxes: dict[str, np.ndarray] = {}
+        self._images_since_refresh: dict[str, int] = {}
+
+    def _thumbnail(self, image: np.ndarray) -> np.ndarray:
+        height = max(
+            round(image.shape[0] * self.thumbnail_width / image.shape[1]), 1)
+        thumbnail = cv.resize(image, (self.thumbnail_width, height),
+                              interpolation=cv.INTER_AREA)
+        if thumbnail.ndim == 3:
+            thumbnail = cv.cvtColor(thumbnail, cv.COLOR_BGR2GRAY)
+        return thumbnail.astype(np.int16)
+
+    def check(self,
+              camera_name: str,
+              image: np.ndarray,
+              boxes_available: bool = True) -> bool:
+        """Check whether a camera's image can reuse the boxes of its last detected image.
+
+        On a miss the image becomes the camera's reference, and its boxes must be given to set_boxes once detected.
+        Until then boxes still returns the boxes of the previous reference.
+
+        Args:
+            camera_name (str): The camera the image is from.
+            image (np.ndarray): The camera's image.
+            boxes_available (bool, optional): Whether the camera has reference boxes to reuse, either from set_boxes
+                or from an earlier image that is still being detected. Without them every image is a miss.
+                Defaults to True.
+
+        Returns:
+            bool: True if the last detected boxes can be reused, False if the image must go through the detector.
+        """
+        thumbnail = self._thumbnail(image)
+        reference = self._reference_thumbnails.get(camera_name)
+        images_since_refresh = self._images_since_refresh.get(camera_name, 0)
+
+        if (boxes_available and reference is not None
+                and reference.shape == thumbnail.shape):
+            unchanged = np.max(np.abs(thumbnail - reference)) <= self.threshold
+            refresh_due = (self.refresh_interval > 0
+                           and images_since_refresh >= self.refresh_interval)
+            if unchanged and not refresh_due:
+                self._images_since_refresh[camera_name] = (
+                    images_since_refresh + 1)
+                return True
+            if unchanged:
+                self.forced_refreshes += 1
+
+        # The old boxes are kept until set_boxes, images checked before this one may still reuse them
+        self._reference_thumbnails[camera_name] = thumbnail
+        self._images_since_refresh[camera_name] = 0
+        return False
+
+    def boxes(self, camera_name: str) -> Optional[np.ndarray]:
+        """The boxes of a camera's last detected image, or None if they have not been set."""
+        return self._reference_boxes.get(camera_name)
+
+    def set_boxes(self, camera_name: str, boxes: np.ndarray):
+        """Set the boxes detected in the image that last missed the gate for a camera."""
+        self._reference_boxes[camera_name] = boxes
+
+    def dict_for_json(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "forced_refreshes": self.forced_refreshes,
+        }
@@ -0,0 +1,214 @@
+from dataclasses import dataclass
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from curling_tracker_backend.db import query_db
+from curling_tracker_backend.util.detector_registry import file_hash
+
+logger = logging.getLogger(__name__)
+
+# Added to the name of an evicted clip's file until it is deleted
+_EVICTED_SUFFIX = ".evicted"
+
+_video_hashes: dict[str, Tuple[Tuple[int, int], str]] = {}
+_video_hashes_lock = threading.Lock()
+
+
+def video_content_hash(video_file: str) -> str:
+    """The SHA256 hash of a video file, only re-hashed when the file's modification time or size changes."""
+    stat = os.stat(video_file)
+    stat_key = (stat.st_mtime_ns, stat.st_size)
+    with _video_hashes_lock:
+        cached = _video_hashes.get(video_file)
+        if cached is not None and cached[0] == stat_key:
+            return cached[1]
+
+    content_hash = file_hash(video_file)
+    with _video_hashes_lock:
+        _video_hashes[video_file] = (stat_key, content_hash)
+    return content_hash
+
+
+@dataclass
+class CachedClip:
+    """A downloaded clip of a video that covers a requested time range.
+
+    Attributes:
+        video_id (str): The id of the clip in the Videos table.
+        path (str): The path to the clip.
+        offset_seconds (int): The time in the clip that the requested range starts at.
+    """
+
+    video_id: str
+    path: str
+    offset_seconds: int
+
+
+class VideoCache:
+    """The downloaded clips of videos, kept on disk within a size budget.
+
+    Every clip is recorded in the Videos table with its size and when it was last used. A time range inside a cached
+    clip is served from that clip instead of being downloaded again. When the clips take up more than max_bytes the
+    least recently used ones are deleted, apart from clips that are pinned because they are still being read. Clips
+    found or added are pinned until they are released.
+
+    Deleting a clip also deletes its raw detection cache and its entries in the tracking results cache, found by the
+    content hash stored with the clip, so they do not grow without bound while the clips stay within the budget.
+    Clips are only evicted when they are released, never while a request is adding one.
+    """
+
+    def __init__(self,
+                 folder: str,
+                 max_bytes: Optional[int],
+                 detection_cache_folder: Optional[str] = None):
+        """
+        Args:
+            folder (str): The folder the clips are downloaded to.
+            max_bytes (Optional[int]): The most disk space the clips can take up. None keeps every clip.
+            detection_cache_folder (Optional[str], optional): The folder of the raw detection caches of the clips.
+                Defaults to None.
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.detection_cache_folder = detection_cache_folder
+
+        self._lock = threading.Lock()
+        self._pins: dict[str, int] = {}
+
+    def _pin(self, video_id: str):
+        self._pins[video_id] = self._pins.get(video_id, 0) + 1
+
+    def find_clip(self, url: str, start_seconds: int,
+                  duration: int) -> Optional[CachedClip]:
+        """Find the shortest cached clip of a video that covers a time range and pin it.
+
+        Args:
+            url (str): The url of the video.
+            start_seconds (int): The start of the time range in the video.
+            duration (int): The length of the time range in seconds.
+
+        Returns:
+            Optional[CachedClip]: The clip, or None if no cached clip covers the time range.
+        """
+        with self._lock:
+            db_videos = query_db(
+                "SELECT video_id, filename, start_seconds FROM Videos WHERE url = ? AND start_seconds <= ? AND start_seconds + duration >= ? ORDER BY duration",
+                [url, start_seconds, start_seconds + duration])
+            for video_id, filename, clip_start_seconds in db_videos:
+                path = os.path.join(self.folder, filename)
+                if not os.path.exists(path):
+                    # Deleted from the folder without going through the cache
+                    query_db("DELETE FROM Videos WHERE video_id = ?",
+                             [video_id])
+                    continue
+
+                query_db(
+                    "UPDATE Videos SET last_accessed = ? WHERE video_id = ?",
+                    [time.time(), video_id])
+                self._pin(video_id)
+                return CachedClip(video_id, path,
+                                  start_seconds - clip_start_seconds)
+        return None
+
+    def add_clip(self, video_id: str, url: str, start_seconds: int,
+                 duration: int, filename: str) -> CachedClip:
+        """Record a downloaded clip and pin it.
+
+        The clip's content hash is found here, before the cache is locked, and stored with the clip so evicting it
+        can find its raw detection cache and tracking results cache entries without reading the clip again.
+
+        Args:
+            video_id (str): The id of the clip.
+            url (str): The url of the video.
+            start_seconds (int): The start of the clip in the video.
+            duration (int): The length of the clip in seconds.
+            filename (str): The name of the clip's file in the folder.
+
+        Returns:
+            CachedClip: The clip.
+        """
+        path = os.path.join(self.folder, filename)
+        content_hash = video_content_hash(path)
+        with self._lock:
+            # Every request that shared the download adds the same clip
+            query_db(
+                "INSERT OR REPLACE INTO Videos (video_id, url, start_seconds, duration, filename, size, last_accessed, content_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    video_id, url, start_seconds, duration, filename,
+                    os.path.getsize(path),
+                    time.time(), content_hash
+                ])
+            self._pin(video_id)
+        return CachedClip(video_id, path, 0)
+
+    def release(self, clip: CachedClip):
+        """Unpin a clip returned by find_clip or add_clip, then evict the least recently used clips that are over the
+        budget. The clip can be evicted once no request has it pinned."""
+        with self._lock:
+            self._pins[clip.video_id] -= 1
+            if self._pins[clip.video_id] == 0:
+                del self._pins[clip.video_id]
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used clips until the clips are within the budget.
+
+        The evicted clips are removed from the Videos table and moved aside while the cache is locked, and their files
+        and derived data are deleted after it is unlocked, so other requests are not held up by the deletes.
+        """
+        with self._lock:
+            evicted = self._evict()
+
+        for path, content_hash in evicted:
+            os.remove(path)
+            with _video_hashes_lock:
+                _video_hashes.pop(path[:-len(_EVICTED_SUFFIX)], None)
+            if content_hash is not None and self.detection_cache_folder is not None:
+                shutil.rmtree(os.path.join(self.detection_cache_folder,
+                                           content_hash),
+                              ignore_errors=True)
+
+    def _evict(self) -> List[Tuple[str, Optional[str]]]:
+        if self.max_bytes is None:
+            return []
+
+        # Clips recorded before sizes and access times were kept sort first
+        db_videos = query_db(
+            "SELECT video_id, filename, size, content_hash FROM Videos ORDER BY last_accessed"
+        )
+        sizes = {}
+        for video_id, filename, size, _ in db_videos:
+            path = os.path.join(self.folder, filename)
+            if size is None and os.path.exists(path):
+                size = os.path.getsize(path)
+            sizes[video_id] = size or 0
+
+        evicted = []
+        total_bytes = sum(sizes.values())
+        for video_id, filename, _, content_hash in db_videos:
+            if total_bytes <= self.max_bytes:
+                break
+            if video_id in self._pins:
+                continue
+
+            path = os.path.join(self.folder, filename)
+            if os.path.exists(path):
+                # A new download of the same clip writes to the same path, so the file is renamed before the lock is
+                # released rather than deleted after it
+                os.replace(path, path + _EVICTED_SUFFIX)
+                evicted.append((path + _EVICTED_SUFFIX, content_hash))
+            query_db("DELETE FROM Videos WHERE video_id = ?", [video_id])
+            if content_hash is not None:
+                # The results files themselves belong to the tracking jobs they were made for and are kept
+                query_db(
+                    "DELETE FROM TrackingResultsCache WHERE video_hash = ?",
+                    [content_hash])
+            total_bytes -= sizes[video_id]
+            logger.info(
+                f"Evicted video {filename} from the video cache, {total_bytes} bytes cached"
+            )
+        return evicted
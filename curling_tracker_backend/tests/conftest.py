@@ -0,0 +1,53 @@
+import functools
+import http.server
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+
+class _RecordingHandler(http.server.SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requested_paths.append(self.path)
+        super().do_GET()
+
+
+@pytest.fixture
+def video_server(tmp_path):
+    """A local http server serving the files in a temporary folder, recording the path of every GET request.
+
+    Yields the server, with the folder as server.folder and the url of the folder as server.url.
+    """
+    folder = tmp_path / "served"
+    folder.mkdir()
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        functools.partial(_RecordingHandler, directory=str(folder)))
+    server.folder = folder
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    server.requested_paths = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None,
+                                     reason="ffmpeg is not installed")
+
+
+def write_test_video(path: str, seconds: int = 5, fps: int = 25):
+    """Write a test pattern video with a single keyframe at its start, like a stream with a long keyframe interval."""
+    subprocess.run([
+        "ffmpeg", "-loglevel", "error", "-y", "-f", "lavfi", "-i",
+        f"testsrc=size=160x120:rate={fps}:duration={seconds}", "-g",
+        str(seconds * fps), "-pix_fmt", "yuv420p",
+        str(path)
+    ],
+                   check=True)
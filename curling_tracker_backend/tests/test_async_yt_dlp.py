@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+
+import pytest
+
+from curling_tracker_backend.util.async_yt_dlp import DownloadManager
+
+
+@pytest.fixture
+def download_manager():
+    download_manager = DownloadManager(max_workers=2)
+    yield download_manager
+    download_manager.shutdown()
+
+
+class ProgressRecorder:
+
+    def __init__(self):
+        self.updates = []
+        self.lock = threading.Lock()
+
+    def __call__(self, downloaded_bytes, total_bytes):
+        with self.lock:
+            self.updates.append((downloaded_bytes, total_bytes))
+
+    def wait_for(self, update, timeout=10.0):
+        # Progress is forwarded from the worker processes on a background thread, so it can arrive after the result
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.lock:
+                if update in self.updates:
+                    return True
+            time.sleep(0.05)
+        return False
+
+
+def test_concurrent_downloads_of_the_same_video_share_one_download(
+        download_manager, video_server, tmp_path):
+    video_bytes = os.urandom(256 * 1024)
+    (video_server.folder / "video.mp4").write_bytes(video_bytes)
+    url = f"{video_server.url}/video.mp4"
+    first_progress = ProgressRecorder()
+    second_progress = ProgressRecorder()
+
+    first = download_manager.download(url,
+                                      str(tmp_path / "first.mp4"),
+                                      progress_callback=first_progress)
+    second = download_manager.download(url,
+                                       str(tmp_path / "second.mp4"),
+                                       progress_callback=second_progress)
+
+    assert second is first
+    assert first.result(timeout=120) == 0
+    # The joined download keeps the first request's output path
+    assert (tmp_path / "first.mp4").read_bytes() == video_bytes
+    assert not (tmp_path / "second.mp4").exists()
+    assert first_progress.wait_for((len(video_bytes), len(video_bytes)))
+    assert second_progress.wait_for((len(video_bytes), len(video_bytes)))
+
+    # A finished download is still shared until it is forgotten
+    assert download_manager.download(url, str(tmp_path / "later.mp4")) is first
+    requests_per_download = len(video_server.requested_paths)
+    assert requests_per_download > 0
+
+    download_manager.forget(url)
+    again = download_manager.download(url, str(tmp_path / "again.mp4"))
+    assert again is not first
+    assert again.result(timeout=120) == 0
+    # The two concurrent requests made the same requests to the server as one download on its own
+    assert len(video_server.requested_paths) == 2 * requests_per_download
+
+
+def test_failed_download_raises_the_yt_dlp_error(download_manager, tmp_path):
+    # Nothing listens on port 1
+    url = "http://127.0.0.1:1/video.mp4"
+    future = download_manager.download(url, str(tmp_path / "video.mp4"))
+
+    with pytest.raises(RuntimeError, match="Unable to download"):
+        future.result(timeout=120)
+
+    # Failed downloads are forgotten straight away so they can be retried
+    assert download_manager.download(url, str(tmp_path /
+                                              "video.mp4")) is not future
@@ -0,0 +1,37 @@
+import numpy as np
+
+from curling_tracker_backend.util.camera_utilities import Camera, CameraType
+from curling_tracker_backend.util.detection_cache import RawDetectionCache
+
+
+def make_camera() -> Camera:
+    return Camera(name="camera",
+                  corner1=np.array([0, 0]),
+                  corner2=np.array([640, 480]),
+                  camera_matrix=np.eye(3),
+                  distortion_coefficients=np.zeros(5),
+                  rotation_vectors=np.zeros(3),
+                  translation_vectors=np.zeros(3),
+                  camera_type=CameraType.TOP_DOWN)
+
+
+def test_concurrent_caches_keep_each_others_frames(tmp_path):
+    # Two jobs on clips of the same video load the cache before either has saved, then save in turn
+    camera = make_camera()
+    first = RawDetectionCache(str(tmp_path), "video")
+    second = RawDetectionCache(str(tmp_path), "video", frame_offset=100)
+    assert first.get(0, camera, "model") is None
+    assert second.get(0, camera, "model") is None
+
+    first_boxes = np.array([[1, 2, 3, 4, 0]], dtype=np.int32)
+    second_boxes = np.array([[5, 6, 7, 8, 1]], dtype=np.int32)
+    first.put(0, camera, "model", first_boxes)
+    second.put(0, camera, "model", second_boxes)
+    first.save()
+    second.save()
+
+    reloaded = RawDetectionCache(str(tmp_path), "video")
+    np.testing.assert_array_equal(reloaded.get(0, camera, "model"),
+                                  first_boxes)
+    np.testing.assert_array_equal(reloaded.get(100, camera, "model"),
+                                  second_boxes)
@@ -0,0 +1,51 @@
+import os
+import shutil
+
+import cv2 as cv
+import pytest
+
+pytest.importorskip("ultralytics")
+
+import curling_tracker_backend.util.curling_shot_tracker as shot_tracker
+import curling_tracker_backend.util.detector_export as detector_export
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "src",
+                         "curling_tracker_backend", "model")
+SAMPLE_IMAGES = [
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", name)
+    for name in ("example_sheet_stones.png", "example_sheet_stones2.png")
+]
+# The packages each exported backend needs to run
+BACKEND_PACKAGES = {
+    shot_tracker.DetectorBackend.ONNX: "onnxruntime",
+    shot_tracker.DetectorBackend.OPENVINO: "openvino",
+}
+
+
+@pytest.mark.parametrize("backend", list(BACKEND_PACKAGES))
+def test_exported_detectors_match_pytorch(backend, tmp_path):
+    pytest.importorskip(BACKEND_PACKAGES[backend])
+    model_paths = [
+        shot_tracker.stone_detector_model_path(MODEL_DIR, camera_type)
+        for camera_type in shot_tracker.STONE_DETECTOR_FILENAMES
+    ]
+    if not all(os.path.exists(path) for path in model_paths):
+        pytest.skip("The stone detector models are not in the model folder")
+
+    # Export from a copy so the exported models are not written to the model folder
+    for model_path in model_paths:
+        shutil.copy(model_path, tmp_path)
+    exported_paths = detector_export.export_stone_detectors(
+        str(tmp_path), backend)
+    images = [cv.imread(path) for path in SAMPLE_IMAGES]
+
+    for camera_type, exported_path in exported_paths.items():
+        report = detector_export.compare_stone_detectors(
+            shot_tracker.StoneDetector(
+                shot_tracker.stone_detector_model_path(
+                    str(tmp_path), camera_type)),
+            shot_tracker.StoneDetector(exported_path), images)
+        assert report.passed, (
+            f"{camera_type.value} {backend.value}: {report.num_mismatched_images}/{report.num_images} images "
+            f"mismatched, max box difference {report.max_box_difference:.2f}px"
+        )
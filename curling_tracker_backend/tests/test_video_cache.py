@@ -0,0 +1,40 @@
+import cv2 as cv
+import numpy as np
+
+from curling_tracker_backend.util.async_yt_dlp import download_video_sync
+from conftest import requires_ffmpeg, write_test_video
+
+
+def read_frame(path: str, start_second: float = 0.0) -> np.ndarray:
+    # Seek by frame index, as CurlingVideo does
+    cap = cv.VideoCapture(str(path))
+    cap.set(cv.CAP_PROP_POS_FRAMES,
+            int(round(cap.get(cv.CAP_PROP_FPS) * start_second)))
+    ok, frame = cap.read()
+    cap.release()
+    assert ok
+    return frame
+
+
+def frame_count(path: str) -> int:
+    cap = cv.VideoCapture(str(path))
+    count = int(cap.get(cv.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return count
+
+
+@requires_ffmpeg
+def test_sub_range_of_cached_clip_matches_fresh_download(video_server,
+                                                        tmp_path):
+    # The video cache serves 2s-3s from a 0s-4s clip at an offset of 2s, which has to give the same frames as
+    # downloading 2s-3s on its own. The test video has no keyframe at 2s.
+    write_test_video(video_server.folder / "video.mp4")
+    url = f"{video_server.url}/video.mp4"
+
+    download_video_sync(url, str(tmp_path / "long.mp4"), 0, 4)
+    download_video_sync(url, str(tmp_path / "short.mp4"), 2, 3)
+
+    assert frame_count(tmp_path / "short.mp4") == 25
+    cached_frame = read_frame(tmp_path / "long.mp4", 2.0).astype(np.int16)
+    fresh_frame = read_frame(tmp_path / "short.mp4").astype(np.int16)
+    assert np.abs(cached_frame - fresh_frame).mean() < 2.0
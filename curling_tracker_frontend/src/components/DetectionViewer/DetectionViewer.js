@@ -13,6 +13,16 @@ const DetectionViewer = ({ selectedTime, detections, detectionTimes, onImageChan
   //Helper Functions
   //////////////////
 
+  // Saved images are either urls into the backend image store or inline base64 PNGs
+  const getCameraImages = (detection) => {
+    if (detection.image_urls) {
+      return detection.image_urls;
+    }
+    return Object.fromEntries(
+      Object.entries(detection.images).map(([camera, image]) => [camera, `data:image/png;base64,${image}`])
+    );
+  };
+
   const getDetectionsIndexForTime = (time) => {
     if (!detectionTimes) {
       return 0;
@@ -36,7 +46,7 @@ const DetectionViewer = ({ selectedTime, detections, detectionTimes, onImageChan
     if (detectionTimes && detections) {
       const timeIndex = Math.max(findInsertionPoint(detectionTimes, selectedTime) - 1, 0);
       if (timeIndex >= 0 && timeIndex < detections.length) {
-        return detections[timeIndex].images[selectedCameraView];
+        return getCameraImages(detections[timeIndex])[selectedCameraView] ?? "";
       }
     }
 
@@ -52,7 +62,7 @@ const DetectionViewer = ({ selectedTime, detections, detectionTimes, onImageChan
       <Select.Root
         value={selectedCameraView ? [selectedCameraView] : []}
         collection={createListCollection({
-          items: detections ? Object.keys(detections[getDetectionsIndexForTime(selectedTime)].images) : [],
+          items: detections ? Object.keys(getCameraImages(detections[getDetectionsIndexForTime(selectedTime)])) : [],
         })}
         size="sm"
         width="320px"
@@ -67,7 +77,7 @@ const DetectionViewer = ({ selectedTime, detections, detectionTimes, onImageChan
           <Select.Positioner>
             <Select.Content>
               {detections &&
-                Object.keys(detections[getDetectionsIndexForTime(selectedTime)].images).map((key) => (
+                Object.keys(getCameraImages(detections[getDetectionsIndexForTime(selectedTime)])).map((key) => (
                   <Select.Item item={key} key={key}>
                     {key}
                     <Select.ItemIndicator />
@@ -103,7 +113,6 @@ const DetectionViewer = ({ selectedTime, detections, detectionTimes, onImageChan
             onImageClick={(x, y) => {
               console.log("Image clicked at: ", x, y, "of image with dimensions: ", imageDimensions);
             }}
-            encodingType="data:image/png;base64,"
           ></ImageViewer>
         )}
       </Box>
@@ -8,7 +8,7 @@ import FetchDropdown from "../FetchDropdown/FetchDropdown";
 import TimeInput from "../TimeInput/TimeInput";
 import DetectionViewer from "../DetectionViewer/DetectionViewer";
 
-import { base64ToFile, getStoneMinTime, getStoneMaxTime } from "../../utility/CurlingStoneHelper";
+import { getStoneMinTime, getStoneMaxTime } from "../../utility/CurlingStoneHelper";
 
 const VideoDetect = () => {
   const [setupId, setSetupId] = useState("");
@@ -25,8 +25,9 @@ const VideoDetect = () => {
   const [sliderTime, setSliderTime] = useState(0);
   const [selectedDataset, setSelectedDataset] = useState(null);
 
-  const [base64Image, setBase64Image] = useState(null);
+  const [selectedImage, setSelectedImage] = useState(null);
   const [addToDatasetResultMessage, setAddToDatasetResultMessage] = useState("");
+  const [trackingProgress, setTrackingProgress] = useState(null);
 
   //////////////////
   //Helper Functions
@@ -40,7 +41,28 @@ const VideoDetect = () => {
 
       body: JSON.stringify(video_tracking_request),
     });
-    return response.json();
+    const { tracking_id, error } = await response.json();
+    if (!response.ok) {
+      throw new Error(error);
+    }
+
+    // Tracking runs as a background job on the server, poll until it finishes
+    const params = new URLSearchParams({ tracking_id: tracking_id });
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+      const statusResponse = await fetch("/api/video_tracking_status?" + params);
+      const status = await statusResponse.json();
+      setTrackingProgress(status);
+
+      if (status.status === "complete") {
+        break;
+      } else if (status.status === "failed") {
+        throw new Error(status.error);
+      }
+    }
+
+    const resultsResponse = await fetch("/api/video_tracking_results?" + params);
+    return resultsResponse.json();
   };
 
   const addImageToDataset = async ({ image_file, dataset_name }) => {
@@ -82,6 +104,7 @@ const VideoDetect = () => {
   //Callbacks
   ///////////
   const onTrackingRequestClick = () => {
+    setTrackingProgress(null);
     requestVideoTrackingMutation.mutate({
       url: videoLink,
       start_seconds: startTime,
@@ -90,13 +113,15 @@ const VideoDetect = () => {
     });
   };
 
-  const onAddToDatasetClick = () => {
-    if (!base64Image || !selectedDataset) {
+  const onAddToDatasetClick = async () => {
+    if (!selectedImage || !selectedDataset) {
       return;
     }
 
+    // The selected image is a url or a data url, either way fetch gives back the encoded image
+    const blob = await (await fetch(selectedImage)).blob();
     addToDatasetMutation.mutate({
-      image_file: base64ToFile(`data:image/png;base64,${base64Image}`, `frontend_detection.png`),
+      image_file: new File([blob], `frontend_detection.${blob.type.split("/")[1]}`, { type: blob.type }),
       dataset_name: selectedDataset,
     });
   };
@@ -139,6 +164,9 @@ const VideoDetect = () => {
         </HStack>
 
         <Button onClick={onTrackingRequestClick}>Request Video Tracking</Button>
+        {trackingProgress && (
+          <Text color="fg.muted">{`Tracking ${trackingProgress.status}: ${trackingProgress.percent_complete}%`}</Text>
+        )}
       </VStack>
       <VStack>
         <Heading as="h3" size="md">
@@ -176,7 +204,7 @@ const VideoDetect = () => {
           selectedTime={sliderTime}
           detections={detections}
           detectionTimes={detectionTimes}
-          onImageChange={setBase64Image}
+          onImageChange={setSelectedImage}
         />
         <FetchDropdown
           label="Select Dataset To Add To"
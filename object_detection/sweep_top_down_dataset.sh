@@ -0,0 +1 @@
+python ultra_sweep_imgsz.py --weights /docker_data/curling_stone_top_down/train/weights/best.pt --data configs/curling_stone_top_down.yaml --project /docker_data/curling_stone_top_down/sweep
\ No newline at end of file
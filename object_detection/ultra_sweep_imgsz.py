@@ -0,0 +1,75 @@
+import argparse
+from ultralytics import YOLO
+
+
+def main(args):
+
+    # Load model
+    model = YOLO(args.weights)
+
+    # Validate the model at every image size
+    rows = []
+    for imgsz in args.imgsz:
+        results = model.val(data=args.data,
+                            project=args.project,
+                            name=f"imgsz{imgsz}",
+                            imgsz=imgsz,
+                            batch=args.batch,
+                            split="test",
+                            plots=False)
+        # Milliseconds per image for each stage of the pipeline
+        latency = (results.speed["preprocess"] + results.speed["inference"] +
+                   results.speed["postprocess"])
+        rows.append((imgsz, latency, results.box.map50, results.box.map))
+
+    best_map = max(row[3] for row in rows)
+    print(f"\nImage Size Sweep Results:")
+    print(f"{'imgsz':>6} {'ms/image':>9} {'mAP50':>7} {'mAP50-95':>9}")
+    for imgsz, latency, map50, map50_95 in rows:
+        print(f"{imgsz:>6} {latency:>9.2f} {map50:>7.4f} {map50_95:>9.4f}")
+
+    # The fastest image size whose mAP50-95 is within the allowed drop of the best one
+    within_drop = [
+        row for row in rows if best_map - row[3] <= args.max_map_drop
+    ]
+    imgsz, latency, _, map50_95 = min(within_drop, key=lambda row: row[1])
+    print(
+        f"\nRecommended imgsz: {imgsz} ({latency:.2f} ms/image, mAP50-95 {map50_95:.4f}, "
+        f"best {best_map:.4f})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=
+        'Sweep the inference image size of a YOLO model on the test split and report latency against mAP'
+    )
+    parser.add_argument('--weights',
+                        type=str,
+                        required=True,
+                        help='Path to model weights file')
+    parser.add_argument('--data',
+                        type=str,
+                        required=True,
+                        help='Path to dataset YAML file')
+    parser.add_argument('--imgsz',
+                        type=int,
+                        nargs='+',
+                        default=[320, 416, 480, 544, 640, 800],
+                        help='Image sizes to validate the model at')
+    parser.add_argument('--batch',
+                        type=int,
+                        default=1,
+                        help='Batch size, 1 measures single image latency')
+    parser.add_argument(
+        '--max-map-drop',
+        type=float,
+        default=0.01,
+        help='Largest mAP50-95 drop from the best image size to still recommend'
+    )
+    parser.add_argument('--project',
+                        type=str,
+                        default='runs/sweep',
+                        help='Project directory to save results')
+    args = parser.parse_args()
+
+    main(args)